@@ -5,6 +5,7 @@ Database Configuration
 import sqlalchemy as sql
 import sqlalchemy.ext.declarative as declarative
 import sqlalchemy.orm as orm
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from dotenv import load_dotenv
 import os
 
@@ -20,6 +21,27 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    Function to get an async database session (read-only analytics endpoints).
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_async_url(url: str) -> str:
+    """
+    DATABASE_URL with its driver switched to the asyncio one
+    (postgresql -> postgresql+asyncpg, sqlite -> sqlite+aiosqlite).
+    """
+    url = sql.engine.make_url(url)
+    if url.get_backend_name() == "postgresql":
+        url = url.set(drivername="postgresql+asyncpg")
+    elif url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url.render_as_string(hide_password=False)
+
+
 # Load environment variables from .env file
 load_dotenv(".env")
 
@@ -33,4 +55,18 @@ engine = sql.create_engine(DATABASE_URL)
 Base = declarative.declarative_base()
 
 # SessionLocal for database operations
-SessionLocal = orm.sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
+SessionLocal = orm.sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engine for the analytics endpoints: concurrent requests are bounded by
+# this pool instead of the threadpool that runs sync endpoints
+ASYNC_POOL_SIZE = int(os.environ.get("ASYNC_DB_POOL_SIZE", "10"))
+ASYNC_MAX_OVERFLOW = int(os.environ.get("ASYNC_DB_MAX_OVERFLOW", "20"))
+
+async_engine = create_async_engine(
+    get_async_url(DATABASE_URL),
+    **({"pool_size": ASYNC_POOL_SIZE, "max_overflow": ASYNC_MAX_OVERFLOW, "pool_pre_ping": True}
+       if not DATABASE_URL.startswith("sqlite") else {}),
+)
+
+# expire_on_commit=False: rows stay readable after the session closes
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
@@ -1,7 +1,7 @@
 from pydantic import BaseModel
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session, relationship
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Date, Boolean, ForeignKey, DATE
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Date, Boolean, ForeignKey, DATE, Index
 from loguru import logger
 from datetime import datetime, timezone
 from Database.database import Base, engine
@@ -72,6 +72,10 @@ class DimChannel(Base):
 
 class FactUserDailyActivity(Base):
     __tablename__ = "fact_user_daily_activity"
+    __table_args__ = (
+        # Per-user latest activity (incremental latest_user_snapshot refresh)
+        Index("ix_fact_user_daily_activity_user_date", "user_key", "date_key"),
+    )
     fact_user_daily_activity_id = Column(Integer, primary_key=True, autoincrement=True)
     user_key = Column(Integer, ForeignKey("dim_user.user_key"))
     date_key = Column(Integer, ForeignKey("dim_date.date_key"))
@@ -108,6 +112,12 @@ class FactCampaignInteraction(Base):
 
 class FactUserAnalyticsSnapshot(Base):
     __tablename__ = "fact_user_analytics_snapshot"
+    __table_args__ = (
+        # High-risk summary: churn_probability range, counts split by snapshot_date_key
+        Index("ix_fact_user_analytics_snapshot_churn_probability_date", "churn_probability", "snapshot_date_key"),
+        # Per-user latest snapshot (incremental latest_user_snapshot refresh)
+        Index("ix_fact_user_analytics_snapshot_user_date", "user_key", "snapshot_date_key"),
+    )
     fact_user_analytics_snapshot_id = Column(Integer, primary_key=True, autoincrement=True)
     user_key = Column(Integer, ForeignKey("dim_user.user_key"))
     snapshot_date_key = Column(Integer, ForeignKey("dim_date.date_key"))
@@ -139,6 +149,8 @@ class FactUserAnalyticsSnapshot(Base):
 
     # CLV
     clv_value = Column(Float)
+    clv_p10 = Column(Float)
+    clv_p90 = Column(Float)
     clv_band = Column(String)
 
     # Metadata
@@ -273,5 +285,135 @@ class ModelPerformanceMetrics(Base):
     false_negatives = Column(Integer, nullable=True)
     true_positives = Column(Integer, nullable=True)
 
+    # Tuned hyperparameters (JSON), set by the tuning entry point
+    hyperparameters = Column(String, nullable=True)
+
     # Metadata
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
\ No newline at end of file
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class SurvivalCurve(Base):
+    __tablename__ = "survival_curves"
+    __table_args__ = (
+        Index("ix_survival_curves_snapshot_segment_t", "snapshot_date_key", "segment", "t"),
+    )
+    
+    survival_curve_id = Column(Integer, primary_key=True, autoincrement=True)
+    snapshot_date_key = Column(Integer, ForeignKey("dim_date.date_key"))
+    
+    # Kaplan-Meier step function: one row per time where S(t) changes
+    segment = Column(String)  # engagement_level, or 'All Users' for the overall curve
+    t = Column(Integer)  # days since signup
+    survival_prob = Column(Float)  # S(t)
+    
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class RfmQuantileSketch(Base):
+    __tablename__ = "rfm_quantile_sketches"
+    
+    rfm_quantile_sketch_id = Column(Integer, primary_key=True, autoincrement=True)
+    snapshot_date_key = Column(Integer, ForeignKey("dim_date.date_key"))
+    
+    metric = Column(String)  # rfm_recency, rfm_frequency, rfm_monetary
+    sample_count = Column(Integer)  # users summarized by the sketch
+    breakpoints = Column(String)  # JSON list of the 20/40/60/80% quintile values
+    sketch = Column(String)  # serialized KLL sketch (JSON), mergeable with later snapshots
+    
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class PipelineRunStats(Base):
+    __tablename__ = "pipeline_run_stats"
+    __table_args__ = (
+        Index("ix_pipeline_run_stats_stage_started_at", "stage", "started_at"),
+    )
+    
+    pipeline_run_stats_id = Column(Integer, primary_key=True, autoincrement=True)
+    run_id = Column(String)  # groups the stages of one pipeline run
+    stage = Column(String)
+    snapshot_date_key = Column(Integer, nullable=True)
+    
+    started_at = Column(DateTime)
+    wall_seconds = Column(Float)
+    cpu_seconds = Column(Float)
+    peak_memory_mb = Column(Float, nullable=True)  # tracemalloc peak, when enabled
+    max_rss_mb = Column(Float, nullable=True)  # process high-water mark at stage end
+    rows_in = Column(Integer, nullable=True)
+    rows_out = Column(Integer, nullable=True)
+    status = Column(String)  # success / failed
+    error = Column(String, nullable=True)
+    
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+class LatestUserSnapshot(Base):
+    __tablename__ = "latest_user_snapshot"
+    __table_args__ = (
+        # (sort column, user_key) indexes back the keyset-paginated learner lists
+        Index("ix_latest_user_snapshot_churn_probability_user", "churn_probability", "user_key"),
+        Index("ix_latest_user_snapshot_clv_value_user", "clv_value", "user_key"),
+        Index("ix_latest_user_snapshot_rfm_score_user", "rfm_score", "user_key"),
+        Index("ix_latest_user_snapshot_days_since_login_user", "days_since_last_login", "user_key"),
+        Index("ix_latest_user_snapshot_tier_churn_probability", "tier", "churn_probability", "user_key"),
+        Index("ix_latest_user_snapshot_country", "country"),
+    )
+    
+    # One row per user: the user's latest analytics snapshot joined with the
+    # latest daily-activity row and plan tier (rebuilt by ds/latest_snapshot.py)
+    user_key = Column(Integer, ForeignKey("dim_user.user_key"), primary_key=True, autoincrement=False)
+    snapshot_date_key = Column(Integer)
+    user_id_nk = Column(String)
+    country = Column(String)
+    subscription_plan_key = Column(Integer, nullable=True)
+    tier = Column(String, nullable=True)
+    
+    rfm_r_score = Column(Integer)
+    rfm_f_score = Column(Integer)
+    rfm_m_score = Column(Integer)
+    rfm_score = Column(Integer)  # r + f + m, missing scores count as 0
+    rfm_segment = Column(String)
+    engagement_level = Column(String)
+    churn_probability = Column(Float)
+    clv_value = Column(Float)
+    
+    activity_date_key = Column(Integer, nullable=True)  # None when the user has no activity rows
+    days_since_last_login = Column(Integer, nullable=True)
+    
+    refreshed_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class RiskHistogram(Base):
+    __tablename__ = "risk_histogram"
+    __table_args__ = (
+        Index("ix_risk_histogram_bucket_snapshot", "churn_bucket", "snapshot_date_key"),
+    )
+    
+    # Learner counts per snapshot, plan and 0.01-wide churn_probability bucket
+    # (rebuilt by ds/risk_histogram.py), so the high-risk summary can be answered
+    # for slider thresholds on the 0.01 grid without scanning the snapshot fact table
+    risk_histogram_id = Column(Integer, primary_key=True, autoincrement=True)
+    snapshot_date_key = Column(Integer)
+    subscription_plan_key = Column(Integer, nullable=True)  # None when the snapshot's plan is unknown
+    churn_bucket = Column(Integer, nullable=True)  # k: k/100 <= churn_probability < (k+1)/100, None when unscored
+    learner_count = Column(Integer)
+    refreshed_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class CampaignSegmentMix(Base):
+    __tablename__ = "campaign_segment_mix"
+    __table_args__ = (
+        Index("ix_campaign_segment_mix_snapshot_campaign", "snapshot_date_key", "campaign_key"),
+    )
+    
+    # Engagement mix of each campaign's learners (written by the DS campaign stage),
+    # one row per (snapshot, campaign, engagement_level)
+    campaign_segment_mix_id = Column(Integer, primary_key=True, autoincrement=True)
+    snapshot_date_key = Column(Integer, ForeignKey("dim_date.date_key"))
+    campaign_key = Column(Integer, ForeignKey("dim_campaign.campaign_key"))
+    
+    engagement_level = Column(String, nullable=True)
+    learner_count = Column(Integer)
+    learner_pct = Column(Float)
+    is_dominant = Column(Boolean)  # the campaign's most common engagement_level
+    
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
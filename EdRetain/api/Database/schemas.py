@@ -1,6 +1,6 @@
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime, date
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 # --- DIM USER ---
 class DimUserBase(BaseModel):
@@ -23,8 +23,11 @@ class DimUserSchema(DimUserBase):
     user_key: int
     created_at: Optional[datetime]
     updated_at: Optional[datetime]
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class DimUserPage(BaseModel):
+    items: List[DimUserSchema]
+    next_cursor: Optional[str]
 
 # --- DIM DATE ---
 class DimDateBase(BaseModel):
@@ -44,8 +47,7 @@ class DimDateCreate(DimDateBase):
     pass
 
 class DimDateSchema(DimDateBase):
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # --- DIM SUBSCRIPTION PLAN ---
 class DimSubscriptionPlanBase(BaseModel):
@@ -64,8 +66,7 @@ class DimSubscriptionPlanCreate(DimSubscriptionPlanBase):
 
 class DimSubscriptionPlanSchema(DimSubscriptionPlanBase):
     subscription_plan_key: int
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # --- DIM CAMPAIGN ---
 class DimCampaignBase(BaseModel):
@@ -83,8 +84,7 @@ class DimCampaignCreate(DimCampaignBase):
 
 class DimCampaignSchema(DimCampaignBase):
     campaign_key: int
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # --- DIM CHANNEL ---
 class DimChannelBase(BaseModel):
@@ -96,8 +96,7 @@ class DimChannelCreate(DimChannelBase):
 
 class DimChannelSchema(DimChannelBase):
     channel_key: int
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # --- FACT USER DAILY ACTIVITY ---
 class FactUserDailyActivityBase(BaseModel):
@@ -125,8 +124,7 @@ class FactUserDailyActivityCreate(FactUserDailyActivityBase):
 class FactUserDailyActivitySchema(FactUserDailyActivityBase):
     fact_user_daily_activity_id: int
     created_at: Optional[datetime]
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # --- FACT CAMPAIGN INTERACTION ---
 class FactCampaignInteractionBase(BaseModel):
@@ -146,8 +144,7 @@ class FactCampaignInteractionCreate(FactCampaignInteractionBase):
 class FactCampaignInteractionSchema(FactCampaignInteractionBase):
     interaction_id: int
     created_at: Optional[datetime]
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # --- FACT USER ANALYTICS SNAPSHOT ---
 class FactUserAnalyticsSnapshotBase(BaseModel):
@@ -180,6 +177,8 @@ class FactUserAnalyticsSnapshotBase(BaseModel):
 
     # CLV
     clv_value: Optional[float]
+    clv_p10: Optional[float] = None
+    clv_p90: Optional[float] = None
     clv_band: Optional[str]
 
     # Metadata
@@ -190,8 +189,7 @@ class FactUserAnalyticsSnapshotCreate(FactUserAnalyticsSnapshotBase):
 
 class FactUserAnalyticsSnapshotSchema(FactUserAnalyticsSnapshotBase):
     fact_user_analytics_snapshot_id: int
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # --- FEATURE IMPORTANCE ---
@@ -210,8 +208,7 @@ class FeatureImportanceSchema(FeatureImportanceBase):
     feature_importance_id: int
     created_at: Optional[datetime]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # --- DASHBOARD METRICS ---
@@ -244,8 +241,7 @@ class DashboardMetricsSchema(DashboardMetricsBase):
     dashboard_metrics_id: int
     created_at: Optional[datetime]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # --- CHURN REASONS ---
@@ -265,8 +261,7 @@ class ChurnReasonsSchema(ChurnReasonsBase):
     churn_reason_id: int
     created_at: Optional[datetime]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # --- CAMPAIGN PERFORMANCE ---
@@ -300,8 +295,7 @@ class CampaignPerformanceSchema(CampaignPerformanceBase):
     campaign_performance_id: int
     created_at: Optional[datetime]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # --- MODEL PERFORMANCE METRICS ---
@@ -329,6 +323,9 @@ class ModelPerformanceMetricsBase(BaseModel):
     false_negatives: Optional[int]
     true_positives: Optional[int]
 
+    # Tuned hyperparameters (JSON)
+    hyperparameters: Optional[str] = None
+
 
 class ModelPerformanceMetricsCreate(ModelPerformanceMetricsBase):
     pass
@@ -338,5 +335,4 @@ class ModelPerformanceMetricsSchema(ModelPerformanceMetricsBase):
     model_performance_id: int
     created_at: Optional[datetime]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
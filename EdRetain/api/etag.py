@@ -0,0 +1,168 @@
+"""
+Conditional GET (ETag / Last-Modified) for endpoints that only change with a
+new DS snapshot.
+
+Every DS result table has a version read from the database itself: its
+latest snapshot_date_key, its newest created_at / refreshed_at and its row
+count. A response's ETag hashes the path, the sorted query parameters and the
+versions of the tables it is built from, so it is the same in every worker,
+replica and restart, and only changes when the data does; Last-Modified is
+the newest row timestamp of those tables. A request whose If-None-Match
+still matches gets 304 Not Modified from the middleware before the endpoint
+runs: no endpoint query, no serialization.
+
+Versions are kept in-process for CACHE_TTL_SECONDS and dropped early when the
+table is reported as written (the LISTEN thread in response_cache.py calls
+table_versions.invalidate); reloading an unchanged table yields the same ETag.
+
+Usage:
+    app.middleware("http")(conditional_get_middleware({"/dashboard/summary": ("dashboard_metrics",)}))
+"""
+import hashlib
+import threading
+import time
+from datetime import timezone
+from email.utils import format_datetime
+from typing import Dict, Tuple
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy import select, func
+from Database.database import AsyncSessionLocal
+from Database.models import (
+    DashboardMetrics, FeatureImportance, ModelPerformanceMetrics, SurvivalCurve, LatestUserSnapshot
+)
+from response_cache import CACHE_TTL_SECONDS, invalidation_hooks
+
+# Tables that can back a conditional endpoint -> (snapshot key column, row timestamp column)
+VERSION_COLUMNS = {
+    model.__tablename__: (model.snapshot_date_key, model.created_at)
+    for model in (DashboardMetrics, FeatureImportance, ModelPerformanceMetrics, SurvivalCurve)
+}
+VERSION_COLUMNS[LatestUserSnapshot.__tablename__] = (LatestUserSnapshot.snapshot_date_key,
+                                                     LatestUserSnapshot.refreshed_at)
+
+
+def version_columns(table: str) -> list:
+    """
+    Scalar subqueries reading one table's version: latest snapshot key,
+    newest row timestamp and row count.
+    """
+    snapshot_key, modified = VERSION_COLUMNS[table]
+    return [
+        select(func.max(snapshot_key)).scalar_subquery(),
+        select(func.max(modified)).scalar_subquery(),
+        select(func.count()).select_from(snapshot_key.table).scalar_subquery(),
+    ]
+
+
+class TableVersions:
+    """
+    Thread-safe table -> (latest snapshot key, newest row timestamp, row count)
+    map, loaded lazily from the database and dropped by invalidate() or after
+    ttl_seconds.
+    """
+    def __init__(self, ttl_seconds: float = CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._versions = {}  # table -> (version, expires_at)
+        self._lock = threading.Lock()
+
+    def invalidate(self, table: str = None):
+        """
+        Forget the version of table (of every table when None); the next
+        request reads it again.
+        """
+        with self._lock:
+            if table is None:
+                self._versions.clear()
+            else:
+                self._versions.pop(table, None)
+
+    def _cached(self, table: str):
+        with self._lock:
+            entry = self._versions.get(table)
+            if entry is None or entry[1] < time.monotonic():
+                return None
+            return entry[0]
+
+    def _store(self, table: str, version: tuple):
+        with self._lock:
+            self._versions[table] = (version, time.monotonic() + self.ttl_seconds)
+
+    async def get(self, tables: Tuple[str, ...]) -> Dict[str, tuple]:
+        """
+        Current versions of tables, reading the ones not known yet in a
+        single round-trip.
+        """
+        versions = {table: self._cached(table) for table in tables}
+        missing = [table for table, version in versions.items() if version is None]
+        if missing:
+            async with AsyncSessionLocal() as db:
+                row = (await db.execute(
+                    select(*[column for table in missing for column in version_columns(table)])
+                )).one()
+            for i, table in enumerate(missing):
+                versions[table] = tuple(row[3 * i:3 * i + 3])
+                self._store(table, versions[table])
+        return versions
+
+
+table_versions = TableVersions()
+invalidation_hooks.append(table_versions.invalidate)
+
+
+def _etag(path: str, query_items, versions: Dict[str, tuple]) -> str:
+    parts = [path, repr(sorted(query_items))]
+    parts += [f"{table}:{versions[table]!r}" for table in sorted(versions)]
+    return 'W/"' + hashlib.sha1("|".join(parts).encode()).hexdigest() + '"'
+
+
+def _last_modified(versions: Dict[str, tuple]):
+    """
+    Newest row timestamp across the versions (naive values are UTC), None when all tables are empty.
+    """
+    stamps = [v[1] for v in versions.values() if v[1] is not None]
+    if not stamps:
+        return None
+    return max(s if s.tzinfo else s.replace(tzinfo=timezone.utc) for s in stamps)
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    """
+    If-None-Match comparison (weak: the W/ prefix is ignored on both sides).
+    """
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def conditional_get_middleware(path_tables: Dict[str, Tuple[str, ...]]):
+    """
+    HTTP middleware adding ETag / Last-Modified to successful GETs of the
+    paths in path_tables (path -> tables the response is built from) and
+    answering 304 Not Modified when If-None-Match matches.
+    """
+    async def middleware(request: Request, call_next):
+        tables = path_tables.get(request.url.path)
+        if request.method != "GET" or tables is None:
+            return await call_next(request)
+
+        versions = await table_versions.get(tables)
+        headers = {
+            "ETag": _etag(request.url.path, request.query_params.multi_items(), versions),
+            "Cache-Control": "no-cache",
+        }
+        last_modified = _last_modified(versions)
+        if last_modified is not None:
+            headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _matches(if_none_match, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+
+        response = await call_next(request)
+        if response.status_code == 200:
+            response.headers.update(headers)
+        return response
+
+    return middleware
@@ -1,9 +1,14 @@
 from fastapi import FastAPI, HTTPException, Depends, status, Query, Body
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta, date
-from Database.database import get_db
-from sqlalchemy import func, desc
+from Database.database import get_db, get_async_db, engine
+from sqlalchemy import func, desc, select, case
 import random
+import threading
+from bisect import bisect_right
+from contextlib import asynccontextmanager
 from typing import List, Dict, Optional
 
 
@@ -11,10 +16,10 @@ from Database.models import (
     DimUser, DimDate, DimSubscriptionPlan, DimCampaign, DimChannel,
     FactUserDailyActivity, FactCampaignInteraction, FactUserAnalyticsSnapshot,
     FeatureImportance, DashboardMetrics, ChurnReasons, CampaignPerformance,
-    ModelPerformanceMetrics
+    ModelPerformanceMetrics, SurvivalCurve, LatestUserSnapshot, RiskHistogram, CampaignSegmentMix
 )
 from Database.schemas import (
-    DimUserCreate, DimUserSchema,
+    DimUserCreate, DimUserSchema, DimUserPage,
     DimDateCreate, DimDateSchema,
     DimSubscriptionPlanCreate, DimSubscriptionPlanSchema,
     DimCampaignCreate, DimCampaignSchema,
@@ -28,8 +33,47 @@ from Database.schemas import (
     CampaignPerformanceSchema, ModelPerformanceMetricsCreate,
     ModelPerformanceMetricsSchema
 )
+from response_cache import cached_response, start_invalidation_listener
+from etag import conditional_get_middleware
+from export import export_response
+from pagination import keyset_page, keyset_query, keyset_rows, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
-app = FastAPI(title="Project API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Drop cached dashboard responses as soon as the DS pipeline writes a new
+    snapshot; the listener stops with the app.
+    """
+    stop_listener = threading.Event()
+    start_invalidation_listener(engine, stop_listener)
+    yield
+    stop_listener.set()
+
+
+app = FastAPI(title="Project API", lifespan=lifespan)
+
+
+# Endpoints that only change with a new DS snapshot -> tables they are built from.
+# Their GETs carry ETag / Last-Modified and are answered 304 Not Modified, without
+# running the endpoint, while If-None-Match still matches.
+CONDITIONAL_GET_TABLES = {
+    "/dashboard/active-premium-learners": ("dashboard_metrics",),
+    "/dashboard/at-risk-learners": ("dashboard_metrics",),
+    "/dashboard/average-retention-rate": ("dashboard_metrics",),
+    "/dashboard/retention-churn-trend": ("dashboard_metrics",),
+    "/dashboard/learner-segmentation": ("dashboard_metrics",),
+    "/dashboard/top-features-driving-churn": ("feature_importance",),
+    "/dashboard/summary": ("dashboard_metrics", "feature_importance"),
+    "/models/accuracy": ("model_performance_metrics",),
+    "/models/precision": ("model_performance_metrics",),
+    "/models/recall": ("model_performance_metrics",),
+    "/models/auc-roc": ("model_performance_metrics",),
+    "/models/roc-curve": ("model_performance_metrics",),
+    "/models/feature-importance": ("feature_importance",),
+    "/models/segment-retention-probability": ("latest_user_snapshot",),
+    "/models/survival-curve": ("survival_curves",),
+}
+app.middleware("http")(conditional_get_middleware(CONDITIONAL_GET_TABLES))
 
 
 # Page 1
@@ -52,25 +96,89 @@ def get_date_range(
     returns a DateRange object used by dashboard endpoints."""
     return DateRange(date_from=date_from, date_to=date_to)
 
-def get_date_keys_in_range(db: Session, date_range: DateRange):
+def get_date_keys_in_range(date_range: DateRange):
     """Return a subquery of DimDate.date_key values for the given
     calendar date range. Used to limit DashboardMetrics rows to
     the selected period."""
     return (
-        db.query(DimDate.date_key)
-        .filter(
+        select(DimDate.date_key)
+        .where(
             DimDate.full_date >= date_range.date_from,
             DimDate.full_date <= date_range.date_to,
         )
-        .subquery()
+        .scalar_subquery()
+    )
+
+
+async def get_latest_dashboard_row(db: AsyncSession, date_range: DateRange) -> DashboardMetrics:
+    """Most recent DashboardMetrics row within the date range
+    (HTTPException 404 when the period has none)."""
+    latest_row = await db.scalar(
+        select(DashboardMetrics)
+        .where(DashboardMetrics.snapshot_date_key.in_(get_date_keys_in_range(date_range)))
+        .order_by(DashboardMetrics.snapshot_date_key.desc())
+        .limit(1)
     )
 
+    if not latest_row:
+        raise HTTPException(status_code=404, detail="No dashboard metrics for given period")
+
+    return latest_row
+
+
+def _active_premium_card(row: DashboardMetrics) -> Dict:
+    return {
+        "active_premium_learners": row.active_premium_learners,
+        "active_premium_change_pct": row.active_premium_change_pct,
+    }
+
+
+def _at_risk_card(row: DashboardMetrics) -> Dict:
+    return {
+        "at_risk_learners": row.at_risk_learners,
+        "at_risk_change_count": row.at_risk_change_count,
+    }
+
+
+def _retention_card(row: DashboardMetrics) -> Dict:
+    return {
+        "average_retention_rate": row.average_retention_rate,
+        "retention_rate_change_pct": row.retention_rate_change_pct,
+    }
+
+
+def _segmentation_donut(row: DashboardMetrics) -> Dict:
+    return {
+        "highly_engaged": {"count": row.highly_engaged_count, "pct": row.highly_engaged_pct},
+        "medium_engaged": {"count": row.medium_engaged_count, "pct": row.medium_engaged_pct},
+        "at_risk": {"count": row.at_risk_count, "pct": row.at_risk_pct},
+        "dormant": {"count": row.dormant_count, "pct": row.dormant_pct},
+    }
+
+
+def _trend_point(metrics: DashboardMetrics, dim_date: DimDate) -> Dict:
+    return {
+        "date": dim_date.full_date,
+        "month_name": dim_date.month_name,
+        "monthly_retention_rate": metrics.monthly_retention_rate,
+        "monthly_churn_rate": metrics.monthly_churn_rate,
+    }
+
+
+def _feature_bar(r: FeatureImportance) -> Dict:
+    return {
+        "feature_name": r.feature_name,
+        "importance_score": r.importance_score,
+        "importance_rank": r.importance_rank,
+    }
+
 
 # Active premium leaners
 @app.get("/dashboard/active-premium-learners")
-def get_active_premium_learners(
+@cached_response("dashboard_metrics")
+async def get_active_premium_learners(
     date_range: DateRange = Depends(get_date_range),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Card: Active Premium Learners.
@@ -80,29 +188,16 @@ def get_active_premium_learners(
       - active_premium_learners: current count of active premium users.
       - active_premium_change_pct: % change vs previous period (precomputed in DB).
     """
-    date_keys_subq = get_date_keys_in_range(db, date_range)
-
-    latest_row = (
-        db.query(DashboardMetrics)
-        .filter(DashboardMetrics.snapshot_date_key.in_(date_keys_subq))
-        .order_by(DashboardMetrics.snapshot_date_key.desc())
-        .first()
-    )
-
-    if not latest_row:
-        raise HTTPException(status_code=404, detail="No dashboard metrics for given period")
-
-    return {
-        "active_premium_learners": latest_row.active_premium_learners,
-        "active_premium_change_pct": latest_row.active_premium_change_pct,
-    }
+    latest_row = await get_latest_dashboard_row(db, date_range)
+    return _active_premium_card(latest_row)
 
 
 # At risk learners 
 @app.get("/dashboard/at-risk-learners")
-def get_at_risk_learners(
+@cached_response("dashboard_metrics")
+async def get_at_risk_learners(
     date_range: DateRange = Depends(get_date_range),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Card: At-Risk Learners.
@@ -112,29 +207,16 @@ def get_at_risk_learners(
       - at_risk_change_count: change in count vs previous period
         (precomputed and stored in DashboardMetrics).
     """
-    date_keys_subq = get_date_keys_in_range(db, date_range)
-
-    latest_row = (
-        db.query(DashboardMetrics)
-        .filter(DashboardMetrics.snapshot_date_key.in_(date_keys_subq))
-        .order_by(DashboardMetrics.snapshot_date_key.desc())
-        .first()
-    )
-
-    if not latest_row:
-        raise HTTPException(status_code=404, detail="No dashboard metrics for given period")
-
-    return {
-        "at_risk_learners": latest_row.at_risk_learners,
-        "at_risk_change_count": latest_row.at_risk_change_count,
-    }
+    latest_row = await get_latest_dashboard_row(db, date_range)
+    return _at_risk_card(latest_row)
 
 
 # Average retention rate
 @app.get("/dashboard/average-retention-rate")
-def get_average_retention_rate(
+@cached_response("dashboard_metrics")
+async def get_average_retention_rate(
     date_range: DateRange = Depends(get_date_range),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Card: Average Retention Rate.
@@ -143,29 +225,15 @@ def get_average_retention_rate(
       - average_retention_rate: overall retention %.
       - retention_rate_change_pct: change in retention vs previous period.
     """
-    date_keys_subq = get_date_keys_in_range(db, date_range)
-
-    latest_row = (
-        db.query(DashboardMetrics)
-        .filter(DashboardMetrics.snapshot_date_key.in_(date_keys_subq))
-        .order_by(DashboardMetrics.snapshot_date_key.desc())
-        .first()
-    )
-
-    if not latest_row:
-        raise HTTPException(status_code=404, detail="No dashboard metrics for given period")
-
-    return {
-        "average_retention_rate": latest_row.average_retention_rate,
-        "retention_rate_change_pct": latest_row.retention_rate_change_pct,
-    }
+    latest_row = await get_latest_dashboard_row(db, date_range)
+    return _retention_card(latest_row)
 
 
 # Trend of churn and retention rate
 @app.get("/dashboard/retention-churn-trend")
-def get_retention_churn_trend(
+async def get_retention_churn_trend(
     date_range: DateRange = Depends(get_date_range),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Line chart: monthly retention and churn trend.
 
@@ -177,34 +245,24 @@ def get_retention_churn_trend(
       - monthly_retention_rate
       - monthly_churn_rate
     """
-    date_keys_subq = get_date_keys_in_range(db, date_range)
+    date_keys_subq = get_date_keys_in_range(date_range)
 
-    rows = (
-        db.query(DashboardMetrics, DimDate)
+    rows = (await db.execute(
+        select(DashboardMetrics, DimDate)
         .join(DimDate, DashboardMetrics.snapshot_date_key == DimDate.date_key)
-        .filter(DashboardMetrics.snapshot_date_key.in_(date_keys_subq))
+        .where(DashboardMetrics.snapshot_date_key.in_(date_keys_subq))
         .order_by(DimDate.full_date.asc())
-        .all()
-    )
-
-    data = [
-        {
-            "date": dim_date.full_date,
-            "month_name": dim_date.month_name,
-            "monthly_retention_rate": metrics.monthly_retention_rate,
-            "monthly_churn_rate": metrics.monthly_churn_rate,
-        }
-        for metrics, dim_date in rows
-    ]
+    )).all()
 
-    return data
+    return [_trend_point(metrics, dim_date) for metrics, dim_date in rows]
 
 
 # Learners' segmentation
 @app.get("/dashboard/learner-segmentation")
-def get_learner_segmentation(
+@cached_response("dashboard_metrics")
+async def get_learner_segmentation(
     date_range: DateRange = Depends(get_date_range),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Donut chart: Learner segmentation by engagement.
@@ -216,43 +274,15 @@ def get_learner_segmentation(
       - at_risk
       - dormant
     """
-    date_keys_subq = get_date_keys_in_range(db, date_range)
-
-    latest_row = (
-        db.query(DashboardMetrics)
-        .filter(DashboardMetrics.snapshot_date_key.in_(date_keys_subq))
-        .order_by(DashboardMetrics.snapshot_date_key.desc())
-        .first()
-    )
-
-    if not latest_row:
-        raise HTTPException(status_code=404, detail="No dashboard metrics for given period")
-
-    return {
-        "highly_engaged": {
-            "count": latest_row.highly_engaged_count,
-            "pct": latest_row.highly_engaged_pct,
-        },
-        "medium_engaged": {
-            "count": latest_row.medium_engaged_count,
-            "pct": latest_row.medium_engaged_pct,
-        },
-        "at_risk": {
-            "count": latest_row.at_risk_count,
-            "pct": latest_row.at_risk_pct,
-        },
-        "dormant": {
-            "count": latest_row.dormant_count,
-            "pct": latest_row.dormant_pct,
-        },
-    }
+    latest_row = await get_latest_dashboard_row(db, date_range)
+    return _segmentation_donut(latest_row)
 
 
 # Top features driving churn
 @app.get("/dashboard/top-features-driving-churn")
-def get_top_features_driving_churn(
+async def get_top_features_driving_churn(
     date_range: DateRange = Depends(get_date_range),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Bar chart: Top features driving churn.
@@ -264,39 +294,107 @@ def get_top_features_driving_churn(
       - returns feature_name, importance_score and importance_rank
         for each row.
     """
-    date_keys_subq = get_date_keys_in_range(db, date_range)
+    date_keys_subq = get_date_keys_in_range(date_range)
 
-    rows = (
-        db.query(FeatureImportance)
-        .filter(
+    rows = (await db.scalars(
+        select(FeatureImportance)
+        .where(
             FeatureImportance.snapshot_date_key.in_(date_keys_subq),
             FeatureImportance.model_type == "churn_prediction",
         )
         .order_by(FeatureImportance.snapshot_date_key.desc(),
                   FeatureImportance.importance_rank.asc())
-        .all()
-    )
+    )).all()
 
     if not rows:
         raise HTTPException(status_code=404, detail="No feature importance data for given period")
 
-    return [
-        {
-            "feature_name": r.feature_name,
-            "importance_score": r.importance_score,
-            "importance_rank": r.importance_rank,
-        }
-        for r in rows
-    ]
+    return [_feature_bar(r) for r in rows]
+
+
+# Whole dashboard page
+@app.get("/dashboard/summary")
+@cached_response("dashboard_metrics", "feature_importance")
+async def get_dashboard_summary(
+    date_range: DateRange = Depends(get_date_range),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Everything the dashboard page shows, in one payload and two queries.
+
+    1. DashboardMetrics rows of the period joined with DimDate, oldest first:
+       the rows feed the trend line and the last one the KPI cards and the
+       segmentation donut.
+    2. FeatureImportance rows of the churn model's latest snapshot in the
+       period, by importance_rank (the snapshot is picked by a subquery in
+       the same statement).
+
+    Sections use the same fields as the individual /dashboard endpoints.
+    """
+    rows = (await db.execute(
+        select(DashboardMetrics, DimDate)
+        .join(DimDate, DashboardMetrics.snapshot_date_key == DimDate.date_key)
+        .where(
+            DimDate.full_date >= date_range.date_from,
+            DimDate.full_date <= date_range.date_to,
+        )
+        .order_by(DimDate.full_date.asc())
+    )).all()
+
+    if not rows:
+        raise HTTPException(status_code=404, detail="No dashboard metrics for given period")
+
+    latest_feature_key = (
+        select(func.max(FeatureImportance.snapshot_date_key))
+        .join(DimDate, FeatureImportance.snapshot_date_key == DimDate.date_key)
+        .where(
+            DimDate.full_date >= date_range.date_from,
+            DimDate.full_date <= date_range.date_to,
+            FeatureImportance.model_type == "churn_prediction",
+        )
+        .scalar_subquery()
+    )
+    features = (await db.scalars(
+        select(FeatureImportance)
+        .where(
+            FeatureImportance.snapshot_date_key == latest_feature_key,
+            FeatureImportance.model_type == "churn_prediction",
+        )
+        .order_by(FeatureImportance.importance_rank.asc())
+    )).all()
+
+    latest_row = rows[-1][0]
+    return {
+        "snapshot_date_key": latest_row.snapshot_date_key,
+        "active_premium_learners": _active_premium_card(latest_row),
+        "at_risk_learners": _at_risk_card(latest_row),
+        "average_retention_rate": _retention_card(latest_row),
+        "learner_segmentation": _segmentation_donut(latest_row),
+        "retention_churn_trend": [_trend_point(metrics, dim_date) for metrics, dim_date in rows],
+        "top_features_driving_churn": [_feature_bar(r) for r in features],
+    }
+
+
+# Server-side sort keys of the learner lists (all backed by (column, user_key) indexes)
+LEARNER_SORT_COLUMNS = {
+    "churn_probability": LatestUserSnapshot.churn_probability,
+    "clv_value": LatestUserSnapshot.clv_value,
+    "rfm_score": LatestUserSnapshot.rfm_score,
+    "days_inactive": LatestUserSnapshot.days_since_last_login,
+}
 
 
 # Second page, RFM analysis
-@app.get("/learners/rfm-analysis")
-def get_learners_rfm_analysis(
+@app.get("/learners/rfm-analysis", response_class=ORJSONResponse)
+async def get_learners_rfm_analysis(
     country: Optional[str] = Query(None, description="Filter by country"),
     subscription_tier: Optional[str] = Query(None, description="Filter by subscription tier"),
-    db: Session = Depends(get_db),
-) -> List[Dict]:
+    sort_by: str = Query("rfm_score", description=f"One of {list(LEARNER_SORT_COLUMNS)}"),
+    order: str = Query("desc", description="asc or desc"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Learners per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    db: AsyncSession = Depends(get_async_db),
+) -> ORJSONResponse:
     """
     RFM Analysis table endpoint.
 
@@ -304,13 +402,18 @@ def get_learners_rfm_analysis(
       - user profile (DimUser),
       - latest RFM / CLV / churn prediction snapshot (FactUserAnalyticsSnapshot),
       - latest daily activity (FactUserDailyActivity),
-      - subscription plan (DimSubscriptionPlan).
+      - subscription plan (DimSubscriptionPlan),
+    read precombined from LatestUserSnapshot (refreshed by the DS pipeline).
 
     Optional filters:
       * country: restrict learners to a specific DimUser.country (or 'All Countries' on UI to skip).
       * subscription_tier: restrict learners to a specific DimSubscriptionPlan.tier
         (or 'All' on UI to skip).
 
+    Paginated by keyset: returns {"items": [...], "next_cursor": ...}, sorted by
+    sort_by (churn_probability, clv_value, rfm_score, days_inactive) and
+    user_key; pass next_cursor back (with the same sort) for the next page.
+
     Response fields per learner:
       - user_id: natural key / external user identifier.
       - country: learner's country.
@@ -321,92 +424,84 @@ def get_learners_rfm_analysis(
       - last_active_days_ago: days_since_last_login from FactUserDailyActivity.
     """
 
-    # Latest analytics snapshot per user
-    subq_latest_snap = (
-        db.query(
-            FactUserAnalyticsSnapshot.user_key,
-            func.max(FactUserAnalyticsSnapshot.snapshot_date_key).label("latest_key"),
-        )
-        .group_by(FactUserAnalyticsSnapshot.user_key)
-        .subquery()
-    )
-
-    # Latest daily-activity row per user (for days_since_last_login)
-    subq_latest_activity = (
-        db.query(
-            FactUserDailyActivity.user_key,
-            func.max(FactUserDailyActivity.date_key).label("latest_date_key"),
-        )
-        .group_by(FactUserDailyActivity.user_key)
-        .subquery()
-    )
-
-    q = (
-        db.query(
-            DimUser,
-            FactUserAnalyticsSnapshot,
-            DimSubscriptionPlan,
-            FactUserDailyActivity,
-        )
-        .join(subq_latest_snap, DimUser.user_key == subq_latest_snap.c.user_key)
-        .join(
-            FactUserAnalyticsSnapshot,
-            (FactUserAnalyticsSnapshot.user_key == subq_latest_snap.c.user_key)
-            & (FactUserAnalyticsSnapshot.snapshot_date_key == subq_latest_snap.c.latest_key),
-        )
-        .join(
-            DimSubscriptionPlan,
-            FactUserAnalyticsSnapshot.subscription_plan_key
-            == DimSubscriptionPlan.subscription_plan_key,
-        )
-        .join(
-            subq_latest_activity,
-            DimUser.user_key == subq_latest_activity.c.user_key,
-        )
-        .join(
-            FactUserDailyActivity,
-            (FactUserDailyActivity.user_key == subq_latest_activity.c.user_key)
-            & (FactUserDailyActivity.date_key == subq_latest_activity.c.latest_date_key),
-        )
+    latest = LatestUserSnapshot
+    q = select(
+        latest.user_key,
+        latest.user_id_nk,
+        latest.country,
+        latest.rfm_segment,
+        latest.rfm_score,
+        latest.clv_value,
+        latest.churn_probability,
+        latest.days_since_last_login,
+    ).where(
+        latest.subscription_plan_key.isnot(None),
+        latest.activity_date_key.isnot(None),
     )
 
     if country and country != "All Countries":
-        q = q.filter(DimUser.country == country)
+        q = q.where(latest.country == country)
 
     if subscription_tier and subscription_tier != "All":
-        q = q.filter(DimSubscriptionPlan.tier == subscription_tier)
+        q = q.where(latest.tier == subscription_tier)
 
-    rows = q.all()
+    q = keyset_query(q, LEARNER_SORT_COLUMNS, sort_by, order, latest.user_key, limit, cursor)
+    rows = (await db.execute(q)).all()
+    rows, next_cursor = keyset_rows(rows, LEARNER_SORT_COLUMNS, sort_by, order, latest.user_key, limit)
 
     result = []
-    for user, snap, plan, activity in rows:
-        rfm_score = (
-            (snap.rfm_r_score or 0)
-            + (snap.rfm_f_score or 0)
-            + (snap.rfm_m_score or 0)
-        )
+    for row in rows:
         result.append(
             {
-                "user_id": user.user_id_nk,
-                "country": user.country,
-                "segment": snap.rfm_segment,
-                "rfm_score": rfm_score,
-                "clv": snap.clv_value,
-                "churn_risk_pct": snap.churn_probability,
-                "last_active_days_ago": activity.days_since_last_login,
+                "user_id": row.user_id_nk,
+                "country": row.country,
+                "segment": row.rfm_segment,
+                "rfm_score": row.rfm_score,
+                "clv": row.clv_value,
+                "churn_risk_pct": row.churn_probability,
+                "last_active_days_ago": row.days_since_last_login,
             }
         )
 
-    return result
+    return ORJSONResponse({"items": result, "next_cursor": next_cursor})
 
 
 # Third page
+# Must match RISK_HISTOGRAM_BUCKETS in ds/risk_histogram.py
+RISK_HISTOGRAM_BUCKETS = 100
+
+
+def _histogram_bucket(risk_threshold: float) -> Optional[int]:
+    """Histogram bucket equivalent to churn_probability >= risk_threshold, or
+    None when the threshold is not on the histogram's 1/RISK_HISTOGRAM_BUCKETS grid."""
+    bucket = round(risk_threshold * RISK_HISTOGRAM_BUCKETS)
+    if 0 <= bucket <= RISK_HISTOGRAM_BUCKETS and bucket / RISK_HISTOGRAM_BUCKETS == risk_threshold:
+        return bucket
+    return None
+
+
+def _last_7_snapshot_keys(model):
+    """The 7 DimDate keys up to the latest snapshot date that has rows in model's table."""
+    latest_key_subq = (
+        select(func.max(DimDate.date_key))
+        .join(model, model.snapshot_date_key == DimDate.date_key)
+        .scalar_subquery()
+    )
+    return (
+        select(DimDate.date_key)
+        .where(DimDate.date_key <= latest_key_subq)
+        .order_by(DimDate.date_key.desc())
+        .limit(7)
+        .subquery()
+    )
+
+
 # High-risk sumamry
 @app.get("/high-risk/summary")
-def get_high_risk_summary(
+async def get_high_risk_summary(
     risk_threshold: float = Query(0.7, description="Minimum churn_probability to be high-risk"),
     subscription_tier: Optional[str] = Query(None, description="Filter by subscription tier"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Header cards: High-Risk Learners summary.
@@ -417,52 +512,62 @@ def get_high_risk_summary(
       - new_high_risk_recent: how many of those high-risk users entered the
         snapshot in the last 7 date_key values (approx. “this week”).
 
+    Both come from one statement with conditional aggregation. When the
+    threshold is on the 0.01 grid of the slider and the DS pipeline has built
+    RiskHistogram, the counts are summed from the precomputed histogram;
+    otherwise FactUserAnalyticsSnapshot is read once through its
+    (churn_probability, snapshot_date_key) index.
+
     Args:
         risk_threshold: Minimum churn_probability (0–1) for a learner to be
             considered high-risk (default 0.7).
         subscription_tier: Optional DimSubscriptionPlan.tier filter
             (UI may pass 'All Subscriptions' to skip).
 
-        db: SQLAlchemy session dependency.
+        db: SQLAlchemy async session dependency.
 
     Uses:
-        - FactUserAnalyticsSnapshot for churn_probability and snapshot_date_key.
+        - RiskHistogram or FactUserAnalyticsSnapshot for churn_probability and snapshot_date_key.
         - DimSubscriptionPlan for filtering by plan tier.
         - DimDate to identify the latest 7 snapshot dates.
     """
-    q = (
-        db.query(FactUserAnalyticsSnapshot, DimSubscriptionPlan)
-        .join(
-            DimSubscriptionPlan,
-            FactUserAnalyticsSnapshot.subscription_plan_key
-            == DimSubscriptionPlan.subscription_plan_key,
-        )
-        .filter(FactUserAnalyticsSnapshot.churn_probability >= risk_threshold)
+    bucket = _histogram_bucket(risk_threshold)
+    has_histogram = bucket is not None and (
+        await db.scalar(select(RiskHistogram.risk_histogram_id).limit(1)) is not None
     )
-
-    if subscription_tier and subscription_tier != "All Subscriptions":
-        q = q.filter(DimSubscriptionPlan.tier == subscription_tier)
-
-    total_high_risk = q.count()
-
     # “new this week” = users whose snapshot_date_key is in the last 7 days
-    latest_key_subq = (
-        db.query(func.max(DimDate.date_key))
-        .join(FactUserAnalyticsSnapshot,
-              FactUserAnalyticsSnapshot.snapshot_date_key == DimDate.date_key)
-        .scalar_subquery()
-    )
+    if has_histogram:
+        hist = RiskHistogram
+        last_7_days_subq = _last_7_snapshot_keys(hist)
+        q = (
+            select(
+                func.coalesce(func.sum(hist.learner_count), 0),
+                func.coalesce(func.sum(case(
+                    (hist.snapshot_date_key.in_(select(last_7_days_subq.c.date_key)), hist.learner_count),
+                    else_=0,
+                )), 0),
+            )
+            .select_from(hist)
+            .join(DimSubscriptionPlan, hist.subscription_plan_key == DimSubscriptionPlan.subscription_plan_key)
+            .where(hist.churn_bucket >= bucket)
+        )
+    else:
+        snap = FactUserAnalyticsSnapshot
+        last_7_days_subq = _last_7_snapshot_keys(snap)
+        q = (
+            select(
+                func.count(),
+                func.count(case((snap.snapshot_date_key.in_(select(last_7_days_subq.c.date_key)), 1))),
+            )
+            .select_from(snap)
+            .join(DimSubscriptionPlan, snap.subscription_plan_key == DimSubscriptionPlan.subscription_plan_key)
+            .where(snap.churn_probability >= risk_threshold)
+        )
 
-    last_7_days_subq = (
-        db.query(DimDate.date_key)
-        .filter(DimDate.date_key <= latest_key_subq)
-        .order_by(DimDate.date_key.desc())
-        .limit(7)
-        .subquery()
-    )
+    if subscription_tier and subscription_tier != "All Subscriptions":
+        q = q.where(DimSubscriptionPlan.tier == subscription_tier)
 
-    q_new = q.filter(FactUserAnalyticsSnapshot.snapshot_date_key.in_(last_7_days_subq))
-    new_high_risk = q_new.count()
+    total_high_risk, new_high_risk = (await db.execute(q)).one()
 
     return {
         "total_high_risk_learners": total_high_risk,
@@ -551,12 +656,16 @@ def choose_suggested_action(rfm_segment: str) -> str:
     return f"{channel} / {offer}"
 
 
-@app.get("/high-risk/learners")
-def get_high_risk_learners(
+@app.get("/high-risk/learners", response_class=ORJSONResponse)
+async def get_high_risk_learners(
     risk_threshold: float = Query(0.7, description="Minimum churn_probability to include"),
     subscription_tier: Optional[str] = Query(None, description="Filter by subscription tier"),
-    db: Session = Depends(get_db),
-) -> List[Dict]:
+    sort_by: str = Query("churn_probability", description=f"One of {list(LEARNER_SORT_COLUMNS)}"),
+    order: str = Query("desc", description="asc or desc"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Learners per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    db: AsyncSession = Depends(get_async_db),
+) -> ORJSONResponse:
     """
     High-Risk Learner List table.
 
@@ -568,86 +677,107 @@ def get_high_risk_learners(
       - Suggested Action (channel / offer)
 
     Logic:
-      * Finds each user's latest analytics snapshot and latest daily activity.
+      * Reads each user's latest analytics snapshot and latest daily activity
+        from LatestUserSnapshot.
       * Filters learners whose churn_probability >= risk_threshold.
       * Optionally filters by subscription_tier (DimSubscriptionPlan.tier).
       * For each learner, computes a suggested action using RFM segment.
+      * Returns one keyset page {"items": [...], "next_cursor": ...} sorted by
+        sort_by and user_key (see /learners/rfm-analysis).
 
     Args:
         risk_threshold: Minimum churn_probability (0–1) to be included.
         subscription_tier: Optional subscription tier filter
             ('All Subscriptions' on UI means no filtering).
-        db: SQLAlchemy session dependency.
+        db: SQLAlchemy async session dependency.
     """
-    subq_latest_snap = (
-        db.query(
-            FactUserAnalyticsSnapshot.user_key,
-            func.max(FactUserAnalyticsSnapshot.snapshot_date_key).label("latest_key"),
-        )
-        .group_by(FactUserAnalyticsSnapshot.user_key)
-        .subquery()
-    )
-
-    subq_latest_act = (
-        db.query(
-            FactUserDailyActivity.user_key,
-            func.max(FactUserDailyActivity.date_key).label("latest_date_key"),
-        )
-        .group_by(FactUserDailyActivity.user_key)
-        .subquery()
-    )
-
-    q = (
-        db.query(
-            DimUser,
-            FactUserAnalyticsSnapshot,
-            DimSubscriptionPlan,
-            FactUserDailyActivity,
-        )
-        .join(subq_latest_snap, DimUser.user_key == subq_latest_snap.c.user_key)
-        .join(
-            FactUserAnalyticsSnapshot,
-            (FactUserAnalyticsSnapshot.user_key == subq_latest_snap.c.user_key)
-            & (FactUserAnalyticsSnapshot.snapshot_date_key == subq_latest_snap.c.latest_key),
-        )
-        .join(
-            DimSubscriptionPlan,
-            FactUserAnalyticsSnapshot.subscription_plan_key
-            == DimSubscriptionPlan.subscription_plan_key,
-        )
-        .join(subq_latest_act, DimUser.user_key == subq_latest_act.c.user_key)
-        .join(
-            FactUserDailyActivity,
-            (FactUserDailyActivity.user_key == subq_latest_act.c.user_key)
-            & (FactUserDailyActivity.date_key == subq_latest_act.c.latest_date_key),
-        )
-        .filter(FactUserAnalyticsSnapshot.churn_probability >= risk_threshold)
+    latest = LatestUserSnapshot
+    q = select(
+        latest.user_key,
+        latest.user_id_nk,
+        latest.rfm_segment,
+        latest.rfm_score,
+        latest.clv_value,
+        latest.churn_probability,
+        latest.days_since_last_login,
+    ).where(
+        latest.subscription_plan_key.isnot(None),
+        latest.activity_date_key.isnot(None),
+        latest.churn_probability >= risk_threshold,
     )
 
     if subscription_tier and subscription_tier != "All Subscriptions":
-        q = q.filter(DimSubscriptionPlan.tier == subscription_tier)
+        q = q.where(latest.tier == subscription_tier)
 
-    rows = q.all()
+    q = keyset_query(q, LEARNER_SORT_COLUMNS, sort_by, order, latest.user_key, limit, cursor)
+    rows = (await db.execute(q)).all()
+    rows, next_cursor = keyset_rows(rows, LEARNER_SORT_COLUMNS, sort_by, order, latest.user_key, limit)
 
     result: List[Dict] = []
-    for user, snap, plan, activity in rows:
-        suggested_action = choose_suggested_action(snap.rfm_segment)
+    for row in rows:
+        suggested_action = choose_suggested_action(row.rfm_segment)
         result.append(
             {
-                "name": user.user_id_nk,
-                "segment": snap.rfm_segment,
-                "days_inactive": activity.days_since_last_login,
-                "churn_probability": snap.churn_probability,
+                "name": row.user_id_nk,
+                "segment": row.rfm_segment,
+                "days_inactive": row.days_since_last_login,
+                "churn_probability": row.churn_probability,
                 "suggested_action": suggested_action,  # e.g. "Email / Discount"
             }
         )
 
-    return result
+    return ORJSONResponse({"items": result, "next_cursor": next_cursor})
+
+
+HIGH_RISK_EXPORT_FIELDS = ["name", "segment", "days_inactive", "churn_probability", "suggested_action"]
+
+
+def _high_risk_export_row(row) -> Dict:
+    return {
+        "name": row.user_id_nk,
+        "segment": row.rfm_segment,
+        "days_inactive": row.days_since_last_login,
+        "churn_probability": row.churn_probability,
+        "suggested_action": choose_suggested_action(row.rfm_segment),
+    }
+
+
+@app.get("/high-risk/learners/export")
+async def export_high_risk_learners(
+    risk_threshold: float = Query(0.7, description="Minimum churn_probability to include"),
+    subscription_tier: Optional[str] = Query(None, description="Filter by subscription tier"),
+    format: str = Query("ndjson", description="ndjson or csv"),
+):
+    """
+    Download the whole High-Risk Learner List for outreach.
+
+    Same cohort and columns as /high-risk/learners (risk_threshold and
+    subscription_tier filters), highest churn_probability first, but
+    streamed in batches from a server-side cursor as NDJSON (one learner per
+    line) or CSV with a header row, instead of being built in memory.
+    """
+    latest = LatestUserSnapshot
+    q = select(
+        latest.user_id_nk,
+        latest.rfm_segment,
+        latest.days_since_last_login,
+        latest.churn_probability,
+    ).where(
+        latest.subscription_plan_key.isnot(None),
+        latest.activity_date_key.isnot(None),
+        latest.churn_probability >= risk_threshold,
+    )
+
+    if subscription_tier and subscription_tier != "All Subscriptions":
+        q = q.where(latest.tier == subscription_tier)
+
+    q = q.order_by(latest.churn_probability.desc(), latest.user_key.desc())
+    return export_response(q, HIGH_RISK_EXPORT_FIELDS, format, _high_risk_export_row, "high_risk_learners")
 
 
 # Churn reason - Bar chart
 @app.get("/high-risk/reasons-for-churn")
-def get_reasons_for_churn(db: Session = Depends(get_db)) -> list[dict]:
+async def get_reasons_for_churn(db: AsyncSession = Depends(get_async_db)) -> list[dict]:
     """
     Bar chart: Reasons for Churn.
 
@@ -658,16 +788,15 @@ def get_reasons_for_churn(db: Session = Depends(get_db)) -> list[dict]:
 
     This powers the 'Reasons for Churn' bar chart on the High-Risk page.
     """
-    latest_key = db.query(func.max(ChurnReasons.snapshot_date_key)).scalar()
+    latest_key = await db.scalar(select(func.max(ChurnReasons.snapshot_date_key)))
     if latest_key is None:
         return []
 
-    rows = (
-        db.query(ChurnReasons)
-        .filter(ChurnReasons.snapshot_date_key == latest_key)
+    rows = (await db.scalars(
+        select(ChurnReasons)
+        .where(ChurnReasons.snapshot_date_key == latest_key)
         .order_by(ChurnReasons.reason_count.desc())
-        .all()
-    )
+    )).all()
 
     return [
         {
@@ -680,27 +809,27 @@ def get_reasons_for_churn(db: Session = Depends(get_db)) -> list[dict]:
 
 # Churn by tier - Pie chart
 @app.get("/high-risk/churn-by-tier")
-def get_churn_by_tier(
+async def get_churn_by_tier(
     risk_threshold: float = Query(
         ..., description="Minimum churn_probability to be high-risk"
     ),
     subscription_tier: Optional[str] = Query(
         None, description="Optional filter for a single tier"
     ),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ) -> List[Dict]:
     """
     Donut chart: distribution of high-risk learners by subscription tier.
 
     Counts how many high-risk learners (churn_probability >= risk_threshold)
     fall into each subscription plan tier, based on their latest analytics
-    snapshot and current subscription plan.
+    snapshot and current subscription plan (LatestUserSnapshot).
 
     Args:
         risk_threshold: Minimum churn_probability (0–1) to treat as high-risk.
         subscription_tier: Optional tier filter; if provided (and not
             'All Subscriptions'), restricts the cohort to that tier only.
-        db: SQLAlchemy session.
+        db: SQLAlchemy async session.
 
     Returns:
         List of objects with:
@@ -709,40 +838,22 @@ def get_churn_by_tier(
           - pct: share of high-risk learners in that tier (0–100).
     """
 
-    # latest analytics snapshot per user
-    subq_latest_snap = (
-        db.query(
-            FactUserAnalyticsSnapshot.user_key,
-            func.max(FactUserAnalyticsSnapshot.snapshot_date_key).label("latest_key"),
-        )
-        .group_by(FactUserAnalyticsSnapshot.user_key)
-        .subquery()
-    )
-
+    latest = LatestUserSnapshot
     q = (
-        db.query(
-            DimSubscriptionPlan.tier.label("tier"),
-            func.count(FactUserAnalyticsSnapshot.user_key).label("count"),
+        select(
+            latest.tier.label("tier"),
+            func.count(latest.user_key).label("count"),
         )
-        .join(
-            subq_latest_snap,
-            FactUserAnalyticsSnapshot.user_key == subq_latest_snap.c.user_key,
-        )
-        .join(
-            DimSubscriptionPlan,
-            FactUserAnalyticsSnapshot.subscription_plan_key
-            == DimSubscriptionPlan.subscription_plan_key,
-        )
-        .filter(
-            FactUserAnalyticsSnapshot.snapshot_date_key == subq_latest_snap.c.latest_key,
-            FactUserAnalyticsSnapshot.churn_probability >= risk_threshold,
+        .where(
+            latest.subscription_plan_key.isnot(None),
+            latest.churn_probability >= risk_threshold,
         )
     )
 
     if subscription_tier and subscription_tier != "All Subscriptions":
-        q = q.filter(DimSubscriptionPlan.tier == subscription_tier)
+        q = q.where(latest.tier == subscription_tier)
 
-    rows = q.group_by(DimSubscriptionPlan.tier).all()
+    rows = (await db.execute(q.group_by(latest.tier))).all()
     total = sum(r.count for r in rows) or 1
 
     return [
@@ -757,8 +868,8 @@ def get_churn_by_tier(
 
 # Fourth page
 @app.get("/campaigns/overview")
-def get_campaigns_overview(
-    db: Session = Depends(get_db),
+async def get_campaigns_overview(
+    db: AsyncSession = Depends(get_async_db),
 ) -> List[Dict]:
     """
     Active & Recent Campaigns table.
@@ -767,7 +878,9 @@ def get_campaigns_overview(
     campaign, including:
       - campaign: campaign name.
       - target_segment: dominant engagement_level of learners who
-        interacted with the campaign.
+        interacted with the campaign ('Unknown' when not computed).
+      - segment_mix: every engagement_level of those learners with
+        count and pct (share 0–100), largest first.
       - launch_date: campaign start date from DimCampaign / DimDate.
       - open_rate_pct: campaign-level open rate from CampaignPerformance.
       - retention_lift_pct: retention lift vs. control from CampaignPerformance.
@@ -776,62 +889,63 @@ def get_campaigns_overview(
     Joins:
       * CampaignPerformance → DimCampaign (by campaign_key) for campaign metadata.
       * DimCampaign → DimDate (by start_date_key) for launch date.
-      * DimCampaign → FactUserDailyActivity (by campaign_key) to find
-        users in the campaign.
-      * FactUserDailyActivity → FactUserAnalyticsSnapshot (by user_key and date_key)
-        to read engagement_level.
-
-    Grouping is done by campaign and engagement_level to derive one
-    engagement-based target segment per campaign row.
+      * CampaignPerformance → CampaignSegmentMix (by campaign_key and
+        snapshot_date_key), precomputed by the DS campaign stage from the
+        campaign's daily activity and the learners' analytics snapshots.
     """
 
-    rows = (
-        db.query(
-            CampaignPerformance,
-            DimCampaign,
-            DimDate,
-            FactUserAnalyticsSnapshot.engagement_level,
+    perf = CampaignPerformance
+    mix = CampaignSegmentMix
+    rows = (await db.execute(
+        select(
+            perf.campaign_performance_id,
+            perf.campaign_name,
+            DimCampaign.campaign_name.label("dim_campaign_name"),
+            DimDate.full_date,
+            perf.open_rate,
+            perf.retention_lift,
+            perf.status,
+            mix.engagement_level,
+            mix.learner_count,
+            mix.learner_pct,
+            mix.is_dominant,
         )
-        .join(DimCampaign, CampaignPerformance.campaign_key == DimCampaign.campaign_key)
+        .join(DimCampaign, perf.campaign_key == DimCampaign.campaign_key)
         .join(DimDate, DimCampaign.start_date_key == DimDate.date_key)
         .join(
-            FactUserDailyActivity,
-            FactUserDailyActivity.campaign_key == DimCampaign.campaign_key,
+            mix,
+            (mix.campaign_key == perf.campaign_key) & (mix.snapshot_date_key == perf.snapshot_date_key),
+            isouter=True,
         )
-        .join(
-            FactUserAnalyticsSnapshot,
-            (FactUserAnalyticsSnapshot.user_key == FactUserDailyActivity.user_key)
-            & (FactUserAnalyticsSnapshot.snapshot_date_key == FactUserDailyActivity.date_key),
-        )
-        .group_by(
-            CampaignPerformance.campaign_performance_id,
-            DimCampaign.campaign_key,
-            DimDate.date_key,
-            FactUserAnalyticsSnapshot.engagement_level,
-        )
-        .order_by(DimDate.full_date.desc())
-        .all()
-    )
+        .order_by(DimDate.full_date.desc(), perf.campaign_performance_id, mix.learner_count.desc())
+    )).all()
 
-    result: List[Dict] = []
-    for perf, camp, date, engagement_level in rows:
-        result.append(
-            {
-                "campaign": perf.campaign_name or camp.campaign_name,
-                "target_segment": engagement_level or "Unknown",
-                "launch_date": date.full_date.isoformat(),
-                "open_rate_pct": perf.open_rate,
-                "retention_lift_pct": perf.retention_lift,
-                "status": perf.status,
+    campaigns: Dict[int, Dict] = {}
+    for r in rows:
+        campaign = campaigns.get(r.campaign_performance_id)
+        if campaign is None:
+            campaign = campaigns[r.campaign_performance_id] = {
+                "campaign": r.campaign_name or r.dim_campaign_name,
+                "target_segment": "Unknown",
+                "segment_mix": [],
+                "launch_date": r.full_date.isoformat(),
+                "open_rate_pct": r.open_rate,
+                "retention_lift_pct": r.retention_lift,
+                "status": r.status,
             }
-        )
+        if r.learner_count is None:
+            continue
+        segment = r.engagement_level or "Unknown"
+        campaign["segment_mix"].append({"segment": segment, "count": r.learner_count, "pct": r.learner_pct})
+        if r.is_dominant:
+            campaign["target_segment"] = segment
 
-    return result
+    return list(campaigns.values())
 
 
 @app.get("/campaigns/performance-comparison")
-def get_campaign_performance_comparison(
-    db: Session = Depends(get_db),
+async def get_campaign_performance_comparison(
+    db: AsyncSession = Depends(get_async_db),
 ) -> List[Dict]:
     """
     Campaign Performance Comparison chart (Lift vs. Churn Rate).
@@ -851,8 +965,8 @@ def get_campaign_performance_comparison(
       - blue bar = churn_rate_pct.
       - green bar = retention_lift_pct.
     """
-    rows = (
-        db.query(
+    rows = (await db.execute(
+        select(
             DimCampaign.campaign_name.label("campaign_name"),
             CampaignPerformance.campaign_retention_rate.label("campaign_retention_rate"),
             CampaignPerformance.control_retention_rate.label("control_retention_rate"),
@@ -860,8 +974,7 @@ def get_campaign_performance_comparison(
         )
         .join(CampaignPerformance, CampaignPerformance.campaign_key == DimCampaign.campaign_key)
         .order_by(DimCampaign.campaign_name.asc())
-        .all()
-    )
+    )).all()
 
     result: List[Dict] = []
     for r in rows:
@@ -882,9 +995,9 @@ def get_campaign_performance_comparison(
 # Fifth page
 # Accuracy
 @app.get("/models/accuracy")
-def get_model_accuracy(
+async def get_model_accuracy(
     model_type: str = "churn_prediction",
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ) -> Dict:
     """
     Model Accuracy card.
@@ -899,13 +1012,12 @@ def get_model_accuracy(
     the small up/down delta indicator.
     """
 
-    rows = (
-        db.query(ModelPerformanceMetrics)
-        .filter(ModelPerformanceMetrics.model_type == model_type)
+    rows = (await db.scalars(
+        select(ModelPerformanceMetrics)
+        .where(ModelPerformanceMetrics.model_type == model_type)
         .order_by(desc(ModelPerformanceMetrics.snapshot_date_key))
         .limit(2)
-        .all()
-    )
+    )).all()
 
     if not rows:
         return {"current_accuracy_pct": None, "accuracy_change_pct": None}
@@ -928,9 +1040,9 @@ def get_model_accuracy(
 
 # Precision
 @app.get("/models/precision")
-def get_model_precision(
+async def get_model_precision(
     model_type: str = "churn_prediction",
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ) -> Dict:
     """
     Precision card.
@@ -944,13 +1056,12 @@ def get_model_precision(
     This card shows how often positive predictions are actually correct
     for the churn model, plus the recent improvement or decline.
     """
-    rows = (
-        db.query(ModelPerformanceMetrics)
-        .filter(ModelPerformanceMetrics.model_type == model_type)
+    rows = (await db.scalars(
+        select(ModelPerformanceMetrics)
+        .where(ModelPerformanceMetrics.model_type == model_type)
         .order_by(desc(ModelPerformanceMetrics.snapshot_date_key))
         .limit(2)
-        .all()
-    )
+    )).all()
 
     if not rows:
         return {"current_precision_pct": None, "precision_change_pct": None}
@@ -973,9 +1084,9 @@ def get_model_precision(
 
 # Recall
 @app.get("/models/recall")
-def get_model_recall(
+async def get_model_recall(
     model_type: str = "churn_prediction",
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ) -> Dict:
     """
     Recall card.
@@ -988,13 +1099,12 @@ def get_model_recall(
     Recall here measures how many actual churners the model correctly
     flags, and the delta shows recent trend in sensitivity.
     """
-    rows = (
-        db.query(ModelPerformanceMetrics)
-        .filter(ModelPerformanceMetrics.model_type == model_type)
+    rows = (await db.scalars(
+        select(ModelPerformanceMetrics)
+        .where(ModelPerformanceMetrics.model_type == model_type)
         .order_by(desc(ModelPerformanceMetrics.snapshot_date_key))
         .limit(2)
-        .all()
-    )
+    )).all()
 
     if not rows:
         return {"current_recall_pct": None, "recall_change_pct": None}
@@ -1017,9 +1127,9 @@ def get_model_recall(
 
 # AUC-ROC
 @app.get("/models/auc-roc")
-def get_model_auc_roc(
+async def get_model_auc_roc(
     model_type: str = "churn_prediction",
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ) -> Dict:
     """
     AUC-ROC Score card.
@@ -1035,13 +1145,12 @@ def get_model_auc_roc(
     across all thresholds, together with its recent improvement.
     """
 
-    rows = (
-        db.query(ModelPerformanceMetrics)
-        .filter(ModelPerformanceMetrics.model_type == model_type)
+    rows = (await db.scalars(
+        select(ModelPerformanceMetrics)
+        .where(ModelPerformanceMetrics.model_type == model_type)
         .order_by(desc(ModelPerformanceMetrics.snapshot_date_key))
         .limit(2)
-        .all()
-    )
+    )).all()
 
     if not rows:
         return {"current_auc_roc": None, "auc_roc_change": None}
@@ -1064,8 +1173,8 @@ def get_model_auc_roc(
 
 # Feature Importance
 @app.get("/models/feature-importance")
-def get_model_feature_importance(
-    db: Session = Depends(get_db),
+async def get_model_feature_importance(
+    db: AsyncSession = Depends(get_async_db),
 ) -> List[Dict]:
     """
     Feature Importance horizontal bar chart.
@@ -1081,23 +1190,21 @@ def get_model_feature_importance(
     The frontend uses this list to draw a horizontal bar chart where each bar
     represents a feature and its contribution to the churn model.
     """
-    latest_key = (
-        db.query(func.max(FeatureImportance.snapshot_date_key))
-        .filter(FeatureImportance.model_type == "churn_prediction")
-        .scalar()
+    latest_key = await db.scalar(
+        select(func.max(FeatureImportance.snapshot_date_key))
+        .where(FeatureImportance.model_type == "churn_prediction")
     )
     if latest_key is None:
         return []
 
-    rows = (
-        db.query(FeatureImportance)
-        .filter(
+    rows = (await db.scalars(
+        select(FeatureImportance)
+        .where(
             FeatureImportance.snapshot_date_key == latest_key,
             FeatureImportance.model_type == "churn_prediction",
         )
         .order_by(FeatureImportance.importance_rank.asc())
-        .all()
-    )
+    )).all()
 
     return [
         {
@@ -1110,9 +1217,9 @@ def get_model_feature_importance(
 
 # Needs to be reviewed for final milestone
 @app.get("/models/roc-curve")
-def get_model_roc_curve(
+async def get_model_roc_curve(
     model_type: str = "churn_prediction",
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ) -> List[Dict]:
     """
     Churn Prediction Accuracy (ROC Curve).
@@ -1134,11 +1241,11 @@ def get_model_roc_curve(
     own diagonal baseline for comparison.
     """
 
-    latest = (
-        db.query(ModelPerformanceMetrics)
-        .filter(ModelPerformanceMetrics.model_type == model_type)
+    latest = await db.scalar(
+        select(ModelPerformanceMetrics)
+        .where(ModelPerformanceMetrics.model_type == model_type)
         .order_by(desc(ModelPerformanceMetrics.snapshot_date_key))
-        .first()
+        .limit(1)
     )
     if not latest or latest.auc_roc is None:
         # fallback: diagonal line (random classifier)
@@ -1159,8 +1266,8 @@ def get_model_roc_curve(
 
 # Segment-retention-probability
 @app.get("/models/segment-retention-probability")
-def get_segment_retention_probability(
-    db: Session = Depends(get_db),
+async def get_segment_retention_probability(
+    db: AsyncSession = Depends(get_async_db),
 ) -> List[Dict]:
     """
     Segment-wise Retention Probability bar chart.
@@ -1170,9 +1277,8 @@ def get_segment_retention_probability(
     most recent snapshot per user.
 
     Steps:
-      1. Find the latest snapshot_date_key for each user.
-      2. Join back to FactUserAnalyticsSnapshot on (user_key, latest_key).
-      3. Group by engagement_level and compute:
+      1. Read the latest snapshot of each user from LatestUserSnapshot.
+      2. Group by engagement_level and compute:
            retention_prob = avg(1 - churn_probability).
 
     Returns a list of:
@@ -1183,29 +1289,13 @@ def get_segment_retention_probability(
     segments are to stay subscribed.
     """
 
-    # latest snapshot per user
-    subq_latest = (
-        db.query(
-            FactUserAnalyticsSnapshot.user_key,
-            func.max(FactUserAnalyticsSnapshot.snapshot_date_key).label("latest_key"),
+    rows = (await db.execute(
+        select(
+            LatestUserSnapshot.engagement_level.label("segment"),
+            func.avg(1.0 - LatestUserSnapshot.churn_probability).label("retention_prob"),
         )
-        .group_by(FactUserAnalyticsSnapshot.user_key)
-        .subquery()
-    )
-
-    rows = (
-        db.query(
-            FactUserAnalyticsSnapshot.engagement_level.label("segment"),
-            func.avg(1.0 - FactUserAnalyticsSnapshot.churn_probability).label("retention_prob"),
-        )
-        .join(
-            subq_latest,
-            (FactUserAnalyticsSnapshot.user_key == subq_latest.c.user_key)
-            & (FactUserAnalyticsSnapshot.snapshot_date_key == subq_latest.c.latest_key),
-        )
-        .group_by(FactUserAnalyticsSnapshot.engagement_level)
-        .all()
-    )
+        .group_by(LatestUserSnapshot.engagement_level)
+    )).all()
 
     return [
         {
@@ -1218,20 +1308,20 @@ def get_segment_retention_probability(
 
 # Survival curve
 @app.get("/models/survival-curve")
-def get_survival_curve(
-    db: Session = Depends(get_db),
+async def get_survival_curve(
+    segment: str = Query("All Users", description="engagement_level, or 'All Users' for the overall curve"),
+    db: AsyncSession = Depends(get_async_db),
 ) -> List[Dict]:
     """
     Survival Curve (Expected Subscription Duration).
 
-    Approximates a global subscription survival curve using summary survival
-    information from FactUserAnalyticsSnapshot:
+    Serves the Kaplan-Meier step function stored by the DS survival stage in
+    survival_curves for the latest snapshot, in one indexed lookup on
+    (snapshot_date_key, segment, t).
 
-      - Computes the average survival_median_time_to_downgrade (in days) over
-        all users and converts it to months.
-      - Assumes an exponential-like survival process where S(median) ≈ 0.5.
-      - Evaluates survival at fixed time points (months = [0, 3, 6, 9, 12, 15,
-        18, 21, 24]) to produce a step-like survival curve.
+    The step function is evaluated at fixed time points (months = [0, 3, 6, 9,
+    12, 15, 18, 21, 24], 30 days per month): S(t) is the last stored value at
+    or before t, and 1.0 before the first point.
 
     For each time point, returns:
       - months: time since subscription start (x-axis).
@@ -1241,27 +1331,25 @@ def get_survival_curve(
     The frontend can plot these as a shaded area chart to visualize how quickly
     the subscription cohort decays over time.
     """
+    latest_key = select(func.max(SurvivalCurve.snapshot_date_key)).scalar_subquery()
+    points = (await db.execute(
+        select(SurvivalCurve.t, SurvivalCurve.survival_prob)
+        .where(
+            SurvivalCurve.snapshot_date_key == latest_key,
+            SurvivalCurve.segment == segment,
+        )
+        .order_by(SurvivalCurve.t)
+    )).all()
+    if not points:
+        raise HTTPException(status_code=404, detail=f"No survival curve for segment '{segment}'")
 
-    # get median-of-medians as global scale (in months)
-    agg = db.query(
-        func.avg(FactUserAnalyticsSnapshot.survival_median_time_to_downgrade)
-    ).one()
-    median_days = agg[0] or 180.0  # fallback 6 months if null
-    median_months = median_days / 30.0
-
+    days = [p.t for p in points]
     time_points = [0, 3, 6, 9, 12, 15, 18, 21, 24]
 
-    def approx_survival(t_months: float) -> float:
-        # simple exponential-like drop anchored at median
-        # S(median) ≈ 0.5
-        if t_months <= 0:
-            return 1.0
-        lam = (0.5) ** (1.0 / median_months)
-        return lam ** t_months
-
     curve: List[Dict] = []
     for m in time_points:
-        s = approx_survival(m)
+        idx = bisect_right(days, m * 30) - 1
+        s = points[idx].survival_prob if idx >= 0 else 1.0
         curve.append(
             {
                 "months": m,
@@ -1280,11 +1368,26 @@ def get_survival_curve(
 
 
 # Additional endpoints that are not needed yet
+def rows_as_dicts(rows) -> List[Dict]:
+    """Column rows -> dicts keyed by column name. List endpoints select plain
+    columns and return them through ORJSONResponse directly, skipping ORM
+    entities and per-row response_model validation (response_model documents
+    the shape)."""
+    return [dict(row._mapping) for row in rows]
+
+
 # -------- DIMUSER CRUD --------
-@app.get("/users", response_model=list[DimUserSchema])
-def get_users(db: Session = Depends(get_db)):
-    users = db.query(DimUser).all()
-    return users
+@app.get("/users", response_model=DimUserPage, response_class=ORJSONResponse)
+def get_users(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    db: Session = Depends(get_db),
+):
+    users, next_cursor = keyset_page(
+        db.query(*DimUser.__table__.columns), {"user_key": DimUser.user_key}, "user_key", "asc",
+        DimUser.user_key, limit, cursor
+    )
+    return ORJSONResponse({"items": rows_as_dicts(users), "next_cursor": next_cursor})
 
 @app.post("/users", response_model=DimUserSchema, status_code=status.HTTP_201_CREATED)
 def add_user(user: DimUserCreate, db: Session = Depends(get_db)):
@@ -1315,9 +1418,9 @@ def delete_user(user_key: int, db: Session = Depends(get_db)):
     return {"message": "User deleted successfully"}
 
 # -------- PLANS CRUD --------
-@app.get("/plans", response_model=list[DimSubscriptionPlanSchema])
+@app.get("/plans", response_model=list[DimSubscriptionPlanSchema], response_class=ORJSONResponse)
 def get_plans(db: Session = Depends(get_db)):
-    return db.query(DimSubscriptionPlan).all()
+    return ORJSONResponse(rows_as_dicts(db.query(*DimSubscriptionPlan.__table__.columns).all()))
 
 @app.post("/plans", response_model=DimSubscriptionPlanSchema, status_code=status.HTTP_201_CREATED)
 def add_plan(plan: DimSubscriptionPlanCreate, db: Session = Depends(get_db)):
@@ -1348,9 +1451,9 @@ def delete_plan(subscription_plan_key: int, db: Session = Depends(get_db)):
     return {"success": True, "message": "Plan deleted successfully"}
 
 # -------- DIMDATE CRUD --------
-@app.get("/dates", response_model=list[DimDateSchema])
+@app.get("/dates", response_model=list[DimDateSchema], response_class=ORJSONResponse)
 def get_dates(db: Session = Depends(get_db)):
-    return db.query(DimDate).all()
+    return ORJSONResponse(rows_as_dicts(db.query(*DimDate.__table__.columns).all()))
 
 @app.post("/dates", response_model=DimDateSchema, status_code=status.HTTP_201_CREATED)
 def add_date(date: DimDateCreate, db: Session = Depends(get_db)):
@@ -0,0 +1,141 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+A page is read with ORDER BY (sort column, user_key) and LIMIT, starting
+strictly after the last row of the previous page, so every page is a bounded
+range scan of the (sort column, user_key) index instead of an OFFSET that
+re-reads all earlier rows.
+
+The cursor handed to clients is opaque: URL-safe base64 of the sort column,
+order and the (sort value, user_key) of the last row returned. NULL sort
+values are ordered as the largest values (PostgreSQL's default: last when
+ascending, first when descending), which keeps both orders index-backed.
+
+keyset_page reads a page through a sync Query; async endpoints build the
+statement with keyset_query, await it and split the rows with keyset_rows.
+"""
+import base64
+import json
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, tuple_
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+SORT_ORDERS = ("asc", "desc")
+
+
+def encode_cursor(sort: str, order: str, value, key) -> str:
+    payload = json.dumps({"s": sort, "o": order, "v": value, "k": key}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: str) -> Tuple:
+    """
+    (sort value, key) stored in cursor. Raises HTTPException 400 when the cursor
+    is malformed or was issued for another sort column / order.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if payload["s"] != sort or payload["o"] != order:
+            raise HTTPException(status_code=400, detail="Cursor does not match sort_by / order")
+        return payload["v"], payload["k"]
+    except HTTPException:
+        raise
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _after(sort_column, key_column, order: str, value, key):
+    """
+    WHERE clause selecting the rows after (value, key) in the page order.
+    """
+    if order == "asc":
+        if value is None:
+            return and_(sort_column.is_(None), key_column > key)
+        return or_(tuple_(sort_column, key_column) > tuple_(value, key), sort_column.is_(None))
+    if value is None:
+        return or_(and_(sort_column.is_(None), key_column < key), sort_column.isnot(None))
+    return tuple_(sort_column, key_column) < tuple_(value, key)
+
+
+def keyset_query(
+    query,
+    sort_columns: Dict,
+    sort_by: str,
+    order: str,
+    key_column,
+    limit: int,
+    cursor: Optional[str] = None,
+):
+    """
+    Restrict query (Query or select()) to one page ordered by
+    sort_columns[sort_by] then key_column, plus one extra row that tells
+    whether another page exists. Pass the fetched rows to keyset_rows.
+
+    Args:
+        query: Filtered query; its rows must expose the sort and key columns
+            as attributes named like the columns.
+        sort_columns: Allowed sort names -> column.
+        sort_by, order: Requested sort (HTTPException 400 when not allowed).
+        key_column: Unique tie-breaker (user_key).
+        limit: Page size.
+        cursor: next_cursor of the previous page, None for the first page.
+    """
+    if sort_by not in sort_columns:
+        raise HTTPException(status_code=400, detail=f"sort_by must be one of {list(sort_columns)}")
+    if order not in SORT_ORDERS:
+        raise HTTPException(status_code=400, detail=f"order must be one of {list(SORT_ORDERS)}")
+
+    sort_column = sort_columns[sort_by]
+    if cursor:
+        value, key = decode_cursor(cursor, sort_by, order)
+        query = query.filter(_after(sort_column, key_column, order, value, key))
+
+    if order == "asc":
+        ordering = (sort_column.asc().nulls_last(), key_column.asc())
+    else:
+        ordering = (sort_column.desc().nulls_first(), key_column.desc())
+
+    return query.order_by(*ordering).limit(limit + 1)
+
+
+def keyset_rows(
+    rows: List,
+    sort_columns: Dict,
+    sort_by: str,
+    order: str,
+    key_column,
+    limit: int,
+) -> Tuple[List, Optional[str]]:
+    """
+    Split the rows of a keyset_query into (page rows, next_cursor);
+    next_cursor is None on the last page.
+    """
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    sort_column = sort_columns[sort_by]
+    next_cursor = encode_cursor(sort_by, order, getattr(last, sort_column.key), getattr(last, key_column.key))
+    return rows, next_cursor
+
+
+def keyset_page(
+    query,
+    sort_columns: Dict,
+    sort_by: str,
+    order: str,
+    key_column,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List, Optional[str]]:
+    """
+    Read one page of a (sync) Query: keyset_query + keyset_rows.
+
+    Returns:
+        (rows, next_cursor); next_cursor is None on the last page.
+    """
+    rows = keyset_query(query, sort_columns, sort_by, order, key_column, limit, cursor).all()
+    return keyset_rows(rows, sort_columns, sort_by, order, key_column, limit)
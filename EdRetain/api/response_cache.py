@@ -0,0 +1,226 @@
+"""
+In-process response cache for read-only endpoints.
+
+Endpoint results are cached per (endpoint, query parameters) with a TTL and
+LRU eviction. Every entry is tagged with the DS result tables it is built
+from; when the DS pipeline writes one of them it sends a PostgreSQL NOTIFY on
+RESULT_TABLES_CHANNEL (see ds/helpers.py), and a background LISTEN thread
+drops the table's entries, so a new snapshot is visible on the next request
+while repeat requests in between cost no database round-trip.
+
+The TTL bounds staleness when notifications cannot be received (non-PostgreSQL
+databases, or while the listener reconnects).
+
+Usage:
+    @app.get("/dashboard/at-risk-learners")
+    @cached_response("dashboard_metrics")
+    async def get_at_risk_learners(date_range: DateRange = Depends(get_date_range),
+                                   db: AsyncSession = Depends(get_async_db)):
+        ...
+"""
+import functools
+import inspect
+import json
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+# Must match RESULT_TABLES_CHANNEL in ds/helpers.py
+RESULT_TABLES_CHANNEL = "result_tables_updated"
+
+CACHE_TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "300"))
+CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+LISTEN_POLL_SECONDS = 5
+LISTEN_RETRY_SECONDS = 10
+
+
+class ResponseCache:
+    """
+    Thread-safe TTL + LRU cache whose entries are tagged with table names.
+    """
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl_seconds: float = CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (tables, expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Cached value for key, or None when missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key, tables: tuple, value):
+        with self._lock:
+            self._entries[key] = (tuple(tables), time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, table: str = None) -> int:
+        """
+        Drop the entries built from table (every entry when table is None).
+
+        Returns:
+            Number of entries removed.
+        """
+        with self._lock:
+            if table is None:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                keys = [k for k, entry in self._entries.items() if table in entry[0]]
+                for k in keys:
+                    del self._entries[k]
+                removed = len(keys)
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+response_cache = ResponseCache()
+
+# Extra callbacks run with the table name (None: every table) whenever
+# response_cache is invalidated by the listener, e.g. etag.table_versions.invalidate
+invalidation_hooks = []
+
+
+def _invalidate(table: str = None) -> int:
+    removed = response_cache.invalidate(table)
+    for hook in invalidation_hooks:
+        hook(table)
+    return removed
+
+
+def _key_part(value):
+    """
+    Hashable form of one endpoint argument (value objects such as DateRange by their fields).
+    """
+    if hasattr(value, "__dict__"):
+        return tuple(sorted(vars(value).items()))
+    return value
+
+
+def cached_response(*tables: str):
+    """
+    Cache an endpoint's result in response_cache until one of tables changes
+    or the TTL ends.
+
+    The key is the endpoint name plus every argument except the database
+    session. Exceptions (e.g. HTTPException 404) are not cached. Works on
+    both sync and async endpoints.
+    """
+    def decorator(func):
+        def cache_key(kwargs):
+            return (func.__name__, tuple(
+                (name, _key_part(value)) for name, value in sorted(kwargs.items())
+                if not isinstance(value, (Session, AsyncSession))
+            ))
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                key = cache_key(kwargs)
+                result = response_cache.get(key)
+                if result is None:
+                    result = await func(*args, **kwargs)
+                    response_cache.set(key, tables, result)
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = cache_key(kwargs)
+            result = response_cache.get(key)
+            if result is None:
+                result = func(*args, **kwargs)
+                response_cache.set(key, tables, result)
+            return result
+        return wrapper
+    return decorator
+
+
+def _handle_notification(payload: str):
+    try:
+        table = json.loads(payload).get("table")
+    except ValueError:
+        table = None
+    removed = _invalidate(table)
+    logger.info(f"[listen_for_result_updates] {table or 'unknown table'} updated, dropped {removed} cached responses")
+
+
+def listen_for_result_updates(engine, stop_event: threading.Event = None):
+    """
+    Block on LISTEN RESULT_TABLES_CHANNEL and invalidate cached responses of
+    every table the DS pipeline reports as written. Reconnects on errors and
+    then clears the whole cache, since notifications may have been missed.
+    """
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        raw = None
+        try:
+            raw = engine.raw_connection()
+            # A LISTENing connection must never go back to the pool
+            raw.detach()
+            connection = raw.driver_connection
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {RESULT_TABLES_CHANNEL}")
+            logger.info(f"[listen_for_result_updates] Listening on {RESULT_TABLES_CHANNEL}")
+
+            while not stop_event.is_set():
+                if select.select([connection], [], [], LISTEN_POLL_SECONDS) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    _handle_notification(connection.notifies.pop(0).payload)
+        except Exception as e:
+            logger.warning(f"[listen_for_result_updates] Listener failed, retrying in {LISTEN_RETRY_SECONDS}s: {e}")
+            _invalidate()
+            stop_event.wait(LISTEN_RETRY_SECONDS)
+        finally:
+            if raw is not None:
+                try:
+                    raw.close()
+                except Exception:
+                    pass
+
+
+def start_invalidation_listener(engine, stop_event: threading.Event = None) -> threading.Thread:
+    """
+    Run listen_for_result_updates in a daemon thread until stop_event is set
+    (PostgreSQL only; other databases rely on the TTL). Returns the thread,
+    or None when not started.
+    """
+    if engine.dialect.name != "postgresql":
+        logger.info(f"[start_invalidation_listener] {engine.dialect.name} has no LISTEN/NOTIFY, "
+                    f"cached responses expire after {response_cache.ttl_seconds:.0f}s")
+        return None
+    thread = threading.Thread(target=listen_for_result_updates, args=(engine, stop_event),
+                              name="response-cache-listener", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,32 @@
+"""
+Test setup for the API modules.
+
+The modules import flat (from pagination import ...) from api/ and bind the
+sync and async engines to DATABASE_URL at import time, so both are set here,
+before any test module is collected: every run gets a throwaway SQLite
+database (the async engine goes through aiosqlite).
+
+Usage (from api/):
+    python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+import pytest
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="edretain-api-tests-"), "api.db")
+
+from Database.database import engine, SessionLocal  # noqa: E402
+from Database.models import Base  # noqa: E402  (the models declare their own Base)
+
+
+@pytest.fixture
+def db():
+    """Sync session over an empty schema, recreated for every test."""
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    yield session
+    session.close()
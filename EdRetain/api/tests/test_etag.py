@@ -0,0 +1,117 @@
+"""
+Conditional GET middleware: ETag / Last-Modified from table state and 304 on If-None-Match.
+"""
+from datetime import datetime
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from Database.models import DashboardMetrics, FeatureImportance, SurvivalCurve
+from etag import conditional_get_middleware, table_versions
+from response_cache import _invalidate
+
+PATH = "/dashboard/summary"
+
+
+@pytest.fixture
+def client(db):
+    db.add_all([
+        DashboardMetrics(snapshot_date_key=20250101, created_at=datetime(2025, 1, 1, 6, 0)),
+        FeatureImportance(snapshot_date_key=20250101, model_type="churn_prediction", feature_name="logins_90d",
+                          created_at=datetime(2025, 1, 1, 7, 30)),
+    ])
+    db.commit()
+    table_versions.invalidate()
+
+    app = FastAPI()
+    app.state.calls = 0
+    app.middleware("http")(conditional_get_middleware({PATH: ("dashboard_metrics", "feature_importance")}))
+
+    @app.get(PATH)
+    def summary():
+        app.state.calls += 1
+        return {"ok": True}
+
+    @app.get("/users")
+    def users():
+        return []
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def _get(client, if_none_match=None, **params):
+    headers = {"If-None-Match": if_none_match} if if_none_match else {}
+    return client.get(PATH, params=params, headers=headers)
+
+
+def test_matching_if_none_match_is_answered_without_the_endpoint(client):
+    first = _get(client, date_from="2025-01-01")
+    assert first.status_code == 200
+    assert first.headers["ETag"].startswith('W/"')
+    assert first.headers["Last-Modified"] == "Wed, 01 Jan 2025 07:30:00 GMT"
+
+    again = _get(client, first.headers["ETag"], date_from="2025-01-01")
+    assert again.status_code == 304
+    assert again.headers["ETag"] == first.headers["ETag"]
+    assert client.app.state.calls == 1
+
+    # Weak comparison, lists and the strong form of the same tag
+    opaque = first.headers["ETag"].removeprefix("W/")
+    assert _get(client, f'"other", {opaque}', date_from="2025-01-01").status_code == 304
+    assert _get(client, '"other"', date_from="2025-01-01").status_code == 200
+
+
+def test_etag_depends_on_query_parameters_not_their_order(client):
+    a = _get(client, date_from="2025-01-01", date_to="2025-02-01").headers["ETag"]
+    b = client.get(f"{PATH}?date_to=2025-02-01&date_from=2025-01-01").headers["ETag"]
+    c = _get(client, date_from="2025-01-02", date_to="2025-02-01").headers["ETag"]
+    assert a == b != c
+
+
+def test_etag_is_stable_until_the_data_changes(client, db):
+    etag = _get(client).headers["ETag"]
+
+    # Reloading unchanged versions (TTL expiry, another worker, a restart) keeps the tag
+    table_versions.invalidate()
+    assert _get(client, etag).status_code == 304
+
+    # Writes to a table the endpoint is not built from do not change it
+    db.add(SurvivalCurve(snapshot_date_key=20250102, segment="All Users", t=0, survival_prob=1.0))
+    db.commit()
+    _invalidate("survival_curves")
+    assert _get(client, etag).status_code == 304
+
+    db.add(DashboardMetrics(snapshot_date_key=20250102, created_at=datetime(2025, 1, 2, 6, 0)))
+    db.commit()
+    _invalidate("dashboard_metrics")
+    changed = _get(client, etag)
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.headers["Last-Modified"] == "Thu, 02 Jan 2025 06:00:00 GMT"
+
+
+def test_replacing_rows_changes_the_etag(client, db):
+    etag = _get(client).headers["ETag"]
+
+    db.query(FeatureImportance).delete()
+    db.commit()
+    _invalidate("feature_importance")
+
+    assert _get(client, etag).status_code == 200
+
+
+def test_other_paths_and_methods_are_passed_through(client):
+    assert "ETag" not in client.get("/users").headers
+    assert client.post(PATH).status_code == 405
+
+
+def test_empty_tables_have_no_last_modified(client, db):
+    db.query(DashboardMetrics).delete()
+    db.query(FeatureImportance).delete()
+    db.commit()
+    table_versions.invalidate()
+
+    response = _get(client)
+    assert response.status_code == 200
+    assert "ETag" in response.headers
+    assert "Last-Modified" not in response.headers
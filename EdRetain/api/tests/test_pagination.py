@@ -0,0 +1,85 @@
+"""
+Keyset pagination: cursor round-trips and page order with NULL and tied sort values.
+"""
+import pytest
+from fastapi import HTTPException
+from Database.models import LatestUserSnapshot
+from pagination import decode_cursor, encode_cursor, keyset_page
+
+SORT_COLUMNS = {
+    "churn_probability": LatestUserSnapshot.churn_probability,
+    "days_since_last_login": LatestUserSnapshot.days_since_last_login,
+}
+
+# Ties, NULLs and a zero, so paging has to use the user_key tie-breaker and the NULL branches of _after
+CHURN = [0.9, None, 0.5, 0.5, 0.0, None, 0.9, 0.1, 0.5, None, 0.3, 0.0]
+DAYS = [3, 3, None, 0, 7, 3, None, None, 1, 0, 12, 3]
+
+
+@pytest.fixture
+def learners(db):
+    db.add_all(
+        LatestUserSnapshot(user_key=k, snapshot_date_key=20250101, churn_probability=p, days_since_last_login=d)
+        for k, (p, d) in enumerate(zip(CHURN, DAYS), start=1)
+    )
+    db.commit()
+    return db
+
+
+def _expected(values, order: str):
+    """
+    user_keys in page order: NULLs are the largest values (last ascending, first descending).
+    """
+    keyed = [(v is None, v or 0, k) for k, v in enumerate(values, start=1)]
+    return [k for _, _, k in sorted(keyed, reverse=order == "desc")]
+
+
+def _all_pages(db, sort_by: str, order: str, limit: int):
+    keys, cursor, pages = [], None, 0
+    while True:
+        rows, cursor = keyset_page(
+            db.query(LatestUserSnapshot), SORT_COLUMNS, sort_by, order, LatestUserSnapshot.user_key, limit, cursor
+        )
+        assert len(rows) <= limit
+        keys += [row.user_key for row in rows]
+        pages += 1
+        if cursor is None:
+            return keys, pages
+
+
+@pytest.mark.parametrize("sort_by,values", [("churn_probability", CHURN), ("days_since_last_login", DAYS)])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+@pytest.mark.parametrize("limit", [1, 2, 5, 12, 50])
+def test_pages_cover_every_row_once_in_order(learners, sort_by, values, order, limit):
+    keys, pages = _all_pages(learners, sort_by, order, limit)
+
+    assert keys == _expected(values, order)
+    assert pages == max(1, -(-len(values) // limit))
+
+
+@pytest.mark.parametrize("value", [0.25, 0, None, "text"])
+def test_cursor_round_trip(value):
+    cursor = encode_cursor("churn_probability", "desc", value, 42)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor, "churn_probability", "desc") == (value, 42)
+
+
+@pytest.mark.parametrize("cursor,sort_by,order", [
+    (encode_cursor("churn_probability", "desc", 0.5, 1), "churn_probability", "asc"),
+    (encode_cursor("churn_probability", "desc", 0.5, 1), "clv_value", "desc"),
+    ("not-a-cursor", "churn_probability", "desc"),
+    ("", "churn_probability", "desc"),
+])
+def test_bad_cursor_is_a_400(cursor, sort_by, order):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, sort_by, order)
+    assert error.value.status_code == 400
+
+
+def test_unknown_sort_or_order_is_a_400(learners):
+    for sort_by, order in [("clv_value", "asc"), ("churn_probability", "up")]:
+        with pytest.raises(HTTPException) as error:
+            keyset_page(learners.query(LatestUserSnapshot), SORT_COLUMNS, sort_by, order,
+                        LatestUserSnapshot.user_key, 10)
+        assert error.value.status_code == 400
@@ -0,0 +1,194 @@
+"""
+Backfill point-in-time RFM snapshots over a date range.
+
+rfm_to_snapshot always builds today's snapshot. This rebuilds the history
+after a model or logic change without faking the clock:
+- the activity table is read once, sorted by (user_key, date_key), and shared
+  read-only with the worker processes (fork start method, copy-on-write)
+- each worker builds one snapshot from the activity with date_key <= snapshot
+  only: latest record per user for recency / frequency / plan, billing periods
+  paid so far for monetary, sketch-based R/F/M scores and segment labels
+- finished snapshots are written by the parent through save_results_bulk
+  (delete + COPY in one transaction per date), so an interrupted run resumes
+  by skipping the dates that are already stored
+
+Usage (from ds/):
+    python backfill.py --start 2025-09-01 --end 2025-11-20 --jobs 8
+"""
+import argparse
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from loguru import logger
+from sqlalchemy import select
+from Database.database import engine, SessionLocal
+from Database.models import FactUserDailyActivity, DimSubscriptionPlan, FactUserAnalyticsSnapshot
+from helpers import save_results_bulk, ensure_snapshot_date
+from latest_snapshot import refresh_latest_user_snapshot
+from profiling import profiled
+from rfm_scoring import (
+    sketch_chunk, score_rfm, assign_segment_labels, assign_engagement_level
+)
+
+MODEL_VERSION = 'v1.0'
+
+# Worker-process state, set once per process by _init_backfill_worker
+_ACTIVITY = None
+
+
+def load_backfill_activity(end_date_key: int) -> pd.DataFrame:
+    """
+    Activity columns needed for RFM up to end_date_key, with the plan's price and
+    billing period key, sorted by (user_key, date_key).
+    """
+    activity = FactUserDailyActivity
+    plan = DimSubscriptionPlan
+    query = select(
+        activity.user_key,
+        activity.date_key,
+        activity.subscription_plan_key,
+        activity.days_since_last_login,
+        activity.active_days_last_30d,
+        plan.base_price,
+        plan.billing_cycle,
+    ).join(
+        plan, activity.subscription_plan_key == plan.subscription_plan_key, isouter=True
+    ).where(
+        activity.date_key <= end_date_key
+    )
+    with engine.connect() as conn:
+        df = pd.read_sql(query, conn)
+
+    # Billing period of each record: YYYYMM for monthly plans, YYYY for yearly ones
+    billing_cycle = df['billing_cycle'].astype(str).str.lower()
+    is_yearly = billing_cycle.str.contains('year|annual') & ~billing_cycle.str.contains('month')
+    df['billing_period'] = np.where(is_yearly, df['date_key'] // 10000, df['date_key'] // 100)
+    df = df.drop(columns='billing_cycle').sort_values(['user_key', 'date_key'], kind='stable')
+
+    logger.info(f"[load_backfill_activity] Loaded {len(df):,} activity rows through {end_date_key}")
+    return df.reset_index(drop=True)
+
+
+def build_point_in_time_snapshot(activity_df: pd.DataFrame, snapshot_date_key: int) -> pd.DataFrame:
+    """
+    RFM snapshot as of snapshot_date_key from activity sorted by (user_key, date_key).
+    """
+    df = activity_df[activity_df['date_key'].to_numpy() <= snapshot_date_key]
+
+    latest = df.drop_duplicates('user_key', keep='last')
+    snapshot = pd.DataFrame({
+        'user_key': latest['user_key'].to_numpy(),
+        'snapshot_date_key': snapshot_date_key,
+        'subscription_plan_key': latest['subscription_plan_key'].to_numpy(),
+        'rfm_recency': latest['days_since_last_login'].to_numpy(),
+        'rfm_frequency': latest['active_days_last_30d'].to_numpy(),
+    })
+
+    paid = df[df['base_price'] > 0].drop_duplicates(['user_key', 'subscription_plan_key', 'billing_period'])
+    revenue = paid.groupby('user_key')['base_price'].sum()
+    snapshot['rfm_monetary'] = snapshot['user_key'].map(revenue).fillna(0.0).to_numpy()
+
+    if snapshot.empty:
+        return snapshot
+
+    snapshot = score_rfm(snapshot, sketch_chunk(snapshot))
+    snapshot['segment_label'] = assign_segment_labels(snapshot)
+    snapshot['engagement_level'] = assign_engagement_level(snapshot['segment_label'])
+    snapshot['model_version'] = MODEL_VERSION
+    return snapshot
+
+
+def _init_backfill_worker(activity_df):
+    global _ACTIVITY
+    _ACTIVITY = activity_df
+
+
+def _backfill_one(snapshot_date_key: int) -> pd.DataFrame:
+    return build_point_in_time_snapshot(_ACTIVITY, snapshot_date_key)
+
+
+def date_keys_between(start_date: str, end_date: str) -> list:
+    """
+    YYYYMMDD keys of every day from start_date to end_date (YYYY-MM-DD, inclusive).
+    """
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    return [int((start + timedelta(days=i)).strftime("%Y%m%d")) for i in range((end - start).days + 1)]
+
+
+def stored_snapshot_keys(date_keys: list) -> set:
+    """
+    Snapshot keys in date_keys that already have rows (i.e. were fully written).
+    """
+    snap = FactUserAnalyticsSnapshot
+    query = select(snap.snapshot_date_key).where(snap.snapshot_date_key.in_(date_keys)).distinct()
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(query)}
+
+
+@profiled()
+def backfill_snapshots(start_date: str, end_date: str, n_jobs: int = None, force: bool = False) -> list:
+    """
+    Build and store point-in-time snapshots for every date in the range.
+
+    Args:
+        start_date, end_date: Inclusive range, YYYY-MM-DD.
+        n_jobs: Worker processes (default: all cores).
+        force: Rebuild dates that are already stored instead of skipping them.
+
+    Returns:
+        Snapshot keys written by this run.
+    """
+    date_keys = date_keys_between(start_date, end_date)
+    if not force:
+        done = stored_snapshot_keys(date_keys)
+        if done:
+            logger.info(f"[backfill_snapshots] Skipping {len(done)} dates already stored")
+        date_keys = [k for k in date_keys if k not in done]
+    if not date_keys:
+        logger.info("[backfill_snapshots] Nothing to backfill")
+        return []
+
+    activity_df = load_backfill_activity(max(date_keys))
+    with SessionLocal() as session:
+        for snapshot_date_key in date_keys:
+            ensure_snapshot_date(session, snapshot_date_key)
+
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(date_keys))
+    # fork shares the activity frame copy-on-write instead of pickling it per worker
+    context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    logger.info(f"[backfill_snapshots] Backfilling {len(date_keys)} dates on {n_jobs} processes")
+
+    written = []
+    with ProcessPoolExecutor(max_workers=n_jobs, mp_context=context, initializer=_init_backfill_worker,
+                             initargs=(activity_df,)) as pool:
+        futures = {pool.submit(_backfill_one, k): k for k in date_keys}
+        for future in as_completed(futures):
+            snapshot_date_key = futures[future]
+            snapshot_df = future.result()
+            if snapshot_df.empty:
+                logger.warning(f"[backfill_snapshots] No activity on or before {snapshot_date_key}, skipped")
+                continue
+            save_results_bulk(snapshot_df, 'fact_user_analytics_snapshot', snapshot_date_key)
+            written.append(snapshot_date_key)
+            logger.info(f"[backfill_snapshots] {len(written)}/{len(date_keys)} dates written")
+
+    # Past dates do not refresh the latest-snapshot table on write; users that
+    # only exist in backfilled snapshots are picked up here
+    if written:
+        refresh_latest_user_snapshot()
+    return sorted(written)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill point-in-time RFM snapshots over a date range.")
+    parser.add_argument("--start", required=True, help="First snapshot date (YYYY-MM-DD)")
+    parser.add_argument("--end", required=True, help="Last snapshot date (YYYY-MM-DD)")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="Rebuild dates that are already stored")
+    args = parser.parse_args()
+
+    backfill_snapshots(args.start, args.end, n_jobs=args.jobs, force=args.force)
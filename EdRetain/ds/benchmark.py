@@ -0,0 +1,452 @@
+"""
+Benchmark suite for the DS pipeline on seeded synthetic populations.
+
+Synthetic activity is drawn with the distributions of
+Database/data_generator.py (70% active days, the same per-field ranges, a
+random plan per record, 30-80% of users active per day as in the ETL) fully
+vectorized with NumPy, so 1M users are generated in seconds and no database
+is needed. The user-level inputs (RFM, activity features, churn probability,
+tenure) are derived from that activity the same way the pipeline derives them.
+
+Every benchmark times one DS function on the population of each size:
+- wall time (best of `repeat` runs)
+- peak Python memory via tracemalloc (one extra traced run)
+- throughput in users per second
+
+Results are compared with a stored baseline JSON; a benchmark regresses when
+its time or peak memory exceeds the baseline by more than the tolerance.
+Store a baseline from the reference machine with --update-baseline.
+
+Usage (from ds/):
+    python benchmark.py                                   # 10k, 100k and 1M users
+    python benchmark.py --sizes 10000 100000 --only rfm churn
+    python benchmark.py --sizes 10000 100000 --update-baseline
+"""
+import os
+
+# The benchmarked functions never connect; the engine still needs a URL at import,
+# and stage stats of @profiled functions are not written anywhere
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("PIPELINE_RECORD_STATS", "0")
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+from loguru import logger
+from Database.data_generator import generate_subscription_plan
+from backfill import build_point_in_time_snapshot
+from churn_model import ACTIVITY_DEFAULTS, build_features, engagement_scale, fit_churn_model, label_churn, score_churn
+from churn_reasons import aggregate_churn_reasons, attribute_primary_reason
+from clv import simulate_clv, assign_clv_band
+from ds_models import compute_basic_rfm
+from helpers import calculate_total_lifetime_revenue
+from rfm_scoring import calculate_rfm_scores
+from segmentation import RECOMMENDED_K, prepare_features, make_kmeans, assign_cluster_labels
+from survival import define_churn_event, fit_km_curves, fit_cox, predict_survival_metrics
+
+SIZES = (10_000, 100_000, 1_000_000)
+# The ETL generates 90 days; 30 keep the 1M-user activity frame (~16M rows) in memory
+DEFAULT_DAYS = 30
+DEFAULT_SEED = 42
+DEFAULT_TOLERANCE = 0.25
+# Differences below this are timer noise, never a regression
+MIN_SECONDS_DELTA = 0.05
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+# Share of users active on a given day: the ETL samples 300-800 of its 1,000 users
+DAILY_ACTIVE_SHARE = (0.3, 0.8)
+ACTIVE_DAY_PROBABILITY = 0.7
+
+# (low, high) inclusive ranges of generate_user_daily_activity for active / inactive records
+ACTIVE_RANGES = {
+    'logins_count': (1, 5),
+    'sessions_count': (1, 8),
+    'minutes_watched': (10, 300),
+    'lessons_completed': (0, 10),
+    'quizzes_attempted': (0, 5),
+    'distinct_courses_accessed': (1, 3),
+    'active_days_last_30d': (1, 30),
+    'days_since_last_login': (0, 7),
+}
+INACTIVE_RANGES = {
+    'active_days_last_30d': (0, 15),
+    'days_since_last_login': (8, 90),
+}
+
+
+def generate_activity(n_users: int, n_days: int = DEFAULT_DAYS, seed: int = DEFAULT_SEED,
+                      end_date: datetime = None) -> pd.DataFrame:
+    """
+    Seeded synthetic daily activity merged with plan price and billing cycle
+    (the layout of load_user_activity_and_subscription_dfs), sorted by
+    (user_key, date_key).
+    """
+    rng = np.random.default_rng(seed)
+    end_date = end_date or datetime(2025, 11, 20)
+    dates = [end_date - timedelta(days=n_days - 1 - i) for i in range(n_days)]
+
+    user_parts, date_parts = [], []
+    for date, share in zip(dates, rng.uniform(*DAILY_ACTIVE_SHARE, size=n_days)):
+        users = np.flatnonzero(rng.random(n_users) < share).astype(np.int32) + 1
+        user_parts.append(users)
+        date_parts.append(np.full(len(users), int(date.strftime("%Y%m%d")), dtype=np.int32))
+
+    user_key = np.concatenate(user_parts)
+    n_rows = len(user_key)
+    is_active = rng.random(n_rows) < ACTIVE_DAY_PROBABILITY
+
+    df = pd.DataFrame({
+        'user_key': user_key,
+        'date_key': np.concatenate(date_parts),
+        'subscription_plan_key': rng.integers(1, 6, size=n_rows, dtype=np.int8),
+    })
+    for column, (low, high) in ACTIVE_RANGES.items():
+        values = rng.integers(low, high + 1, size=n_rows, dtype=np.int16)
+        if column in INACTIVE_RANGES:
+            inactive_low, inactive_high = INACTIVE_RANGES[column]
+            inactive = rng.integers(inactive_low, inactive_high + 1, size=n_rows, dtype=np.int16)
+        else:
+            inactive = np.zeros(n_rows, dtype=np.int16)
+        df[column] = np.where(is_active, values, inactive)
+    df['is_inactive_7d_flag'] = df['days_since_last_login'] > 7
+    df['active_courses_count'] = df['distinct_courses_accessed']
+    df['completed_courses_total'] = df['lessons_completed']
+
+    plans = pd.DataFrame(generate_subscription_plan()).set_index('subscription_plan_key')
+    plan_key = df['subscription_plan_key']
+    df['base_price'] = plan_key.map(plans['base_price']).to_numpy()
+    df['billing_cycle'] = pd.Categorical(plan_key.map(plans['billing_cycle']))
+
+    # Billing period as load_backfill_activity derives it: YYYY for annual plans, YYYYMM otherwise
+    is_yearly = plan_key.isin(plans.index[plans['billing_cycle'].str.lower() == 'annual']).to_numpy()
+    df['billing_period'] = np.where(is_yearly, df['date_key'] // 10000, df['date_key'] // 100)
+
+    df = df.sort_values(['user_key', 'date_key'], kind='stable').reset_index(drop=True)
+    logger.info(f"[generate_activity] Generated {n_rows:,} activity rows for {n_users:,} users over {n_days} days")
+    return df
+
+
+def build_user_frame(activity_df: pd.DataFrame, seed: int = DEFAULT_SEED) -> pd.DataFrame:
+    """
+    One row per user with the scored RFM snapshot, the churn-model activity
+    features, a provisional churn probability and tenure (days since signup).
+    """
+    rng = np.random.default_rng(seed)
+    snapshot_date_key = int(activity_df['date_key'].max())
+    users = build_point_in_time_snapshot(activity_df, snapshot_date_key)
+
+    grouped = activity_df.groupby('user_key')
+    features = pd.DataFrame({
+        'logins_90d': grouped['logins_count'].sum(),
+        'sessions_90d': grouped['sessions_count'].sum(),
+        'minutes_watched_90d': grouped['minutes_watched'].sum(),
+        'lessons_completed_90d': grouped['lessons_completed'].sum(),
+        'quizzes_attempted_90d': grouped['quizzes_attempted'].sum(),
+        'courses_accessed': grouped['distinct_courses_accessed'].max(),
+        'avg_active_days_30d': grouped['active_days_last_30d'].mean(),
+        'inactive_7d_count': grouped['is_inactive_7d_flag'].sum(),
+        'active_courses': grouped['active_courses_count'].max(),
+        'completed_courses': grouped['completed_courses_total'].max(),
+        'max_subscription_plan_key': grouped['subscription_plan_key'].max(),
+    })
+    users = users.merge(features, left_on='user_key', right_index=True, how='left')
+    users['days_since_last_login'] = users['rfm_recency']
+    users['has_downgraded'] = (users['subscription_plan_key'] < users['max_subscription_plan_key']).astype(int)
+    users = users.drop(columns='max_subscription_plan_key').fillna(ACTIVITY_DEFAULTS)
+
+    # Replaced by the churn benchmark's scores; drawn here so every benchmark can run alone
+    users['churn_probability'] = rng.beta(2, 5, size=len(users))
+    users['is_free_tier'] = (users['subscription_plan_key'] == 1).astype(int)
+    users['is_premium_tier'] = users['subscription_plan_key'].isin([4, 5]).astype(int)
+    # Signup dates of generate_user are uniform over the last 3 years
+    users['duration'] = rng.integers(1, 3 * 365 + 1, size=len(users))
+    return users
+
+
+def _premium(ctx: dict) -> pd.DataFrame:
+    users = ctx['users']
+    return users[users['subscription_plan_key'] > 1]
+
+
+def bench_revenue(ctx: dict) -> int:
+    return len(calculate_total_lifetime_revenue(ctx['activity']))
+
+
+def bench_basic_rfm(ctx: dict) -> int:
+    return len(compute_basic_rfm(ctx['activity']))
+
+
+def bench_point_in_time_rfm(ctx: dict) -> int:
+    return len(build_point_in_time_snapshot(ctx['activity'], int(ctx['activity']['date_key'].max())))
+
+
+def bench_rfm_scores(ctx: dict) -> int:
+    users = ctx['users']
+    scored, _ = calculate_rfm_scores(users[['user_key', 'rfm_recency', 'rfm_frequency', 'rfm_monetary']],
+                                     int(users['snapshot_date_key'].iloc[0]))
+    return len(scored)
+
+
+def bench_churn_features(ctx: dict) -> int:
+    df = _premium(ctx)
+    return len(build_features(df, engagement_scale(df)))
+
+
+def bench_churn_train(ctx: dict) -> int:
+    df = _premium(ctx)
+    scale = engagement_scale(df)
+    model, _, _ = fit_churn_model(build_features(df, scale), label_churn(df))
+    ctx['churn_model'] = (model, scale)
+    return len(df)
+
+
+def bench_churn_score(ctx: dict) -> int:
+    if 'churn_model' not in ctx:
+        bench_churn_train(ctx)
+    model, scale = ctx['churn_model']
+    scores = score_churn(model, ctx['users'], scale)
+    ctx['users']['churn_probability'] = scores['churn_probability'].to_numpy()
+    return len(scores)
+
+
+def bench_churn_reasons(ctx: dict) -> int:
+    df = _premium(ctx)
+    codes = attribute_primary_reason(df)
+    aggregate_churn_reasons(df, codes, int(df['snapshot_date_key'].iloc[0]))
+    return len(df)
+
+
+def bench_kmeans(ctx: dict) -> int:
+    users = ctx['users']
+    kmeans = make_kmeans(RECOMMENDED_K)
+    kmeans.fit_predict(prepare_features(users))
+    assign_cluster_labels(users)
+    return len(users)
+
+
+def bench_survival_km(ctx: dict) -> int:
+    df = _premium(ctx).assign(event=lambda d: define_churn_event(d))
+    fit_km_curves(df)
+    return len(df)
+
+
+def bench_survival_cox(ctx: dict) -> int:
+    df = _premium(ctx).assign(event=lambda d: define_churn_event(d))
+    metrics = predict_survival_metrics(fit_cox(df), df)
+    ctx['survival'] = metrics
+    return len(metrics)
+
+
+def bench_clv(ctx: dict) -> int:
+    df = _premium(ctx)
+    if 'survival' in ctx:
+        df = df.merge(ctx['survival'], on='user_key', how='left')
+    else:
+        df = df.assign(survival_median_time_to_downgrade=np.nan)
+    clv_df = simulate_clv(df)
+    assign_clv_band(clv_df['clv_value'])
+    return len(clv_df)
+
+
+# name -> (function, largest population it runs on; None = every size).
+# Order matters: churn scoring feeds the later stages, as in the pipeline.
+BENCHMARKS = {
+    'revenue.calculate_total_lifetime_revenue': (bench_revenue, 100_000),
+    'rfm.compute_basic_rfm': (bench_basic_rfm, None),
+    'rfm.build_point_in_time_snapshot': (bench_point_in_time_rfm, None),
+    'rfm.calculate_rfm_scores': (bench_rfm_scores, None),
+    'churn.build_features': (bench_churn_features, None),
+    'churn.fit_churn_model': (bench_churn_train, None),
+    'churn.score_churn': (bench_churn_score, None),
+    'churn.churn_reasons': (bench_churn_reasons, None),
+    'kmeans.fit_predict': (bench_kmeans, None),
+    'survival.fit_km_curves': (bench_survival_km, None),
+    'survival.cox_metrics': (bench_survival_cox, None),
+    'clv.simulate_clv': (bench_clv, None),
+}
+
+
+def measure(func, ctx: dict, repeat: int = 1, trace_memory: bool = True) -> dict:
+    """
+    Best wall time of `repeat` runs and, optionally, the tracemalloc peak of one more run.
+    """
+    timings = []
+    rows_out = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows_out = func(ctx)
+        timings.append(time.perf_counter() - start)
+
+    peak_memory_mb = None
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            func(ctx)
+            peak_memory_mb = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+        finally:
+            tracemalloc.stop()
+
+    wall_seconds = min(timings)
+    return {
+        'wall_seconds': round(wall_seconds, 4),
+        'peak_memory_mb': peak_memory_mb,
+        'rows_out': rows_out,
+    }
+
+
+def run_benchmarks(sizes=SIZES, only: list = None, n_days: int = DEFAULT_DAYS, seed: int = DEFAULT_SEED,
+                   repeat: int = 1, trace_memory: bool = True) -> dict:
+    """
+    Run the selected benchmarks on every population size.
+
+    Args:
+        sizes: Numbers of users.
+        only: Benchmark name prefixes to run (e.g. ['rfm', 'churn.score_churn']); all when None.
+        n_days: Days of synthetic activity.
+        seed: Seed of the synthetic population.
+        repeat: Timed runs per benchmark (the best is kept).
+        trace_memory: Measure peak memory with an extra tracemalloc run.
+
+    Returns:
+        {"<benchmark>@<users>": {wall_seconds, peak_memory_mb, rows_out, users,
+        activity_rows, users_per_second}}
+    """
+    selected = {
+        name: spec for name, spec in BENCHMARKS.items()
+        if not only or any(name == o or name.startswith(f"{o}.") for o in only)
+    }
+    results = {}
+    for n_users in sizes:
+        activity = generate_activity(n_users, n_days, seed)
+        ctx = {'activity': activity, 'users': build_user_frame(activity, seed)}
+
+        for name, (func, max_users) in selected.items():
+            if max_users is not None and n_users > max_users:
+                logger.info(f"[run_benchmarks] Skipping {name} above {max_users:,} users")
+                continue
+            result = measure(func, ctx, repeat, trace_memory)
+            result.update({
+                'users': n_users,
+                'activity_rows': len(activity),
+                'users_per_second': round(n_users / result['wall_seconds'], 1) if result['wall_seconds'] else None,
+            })
+            results[f"{name}@{n_users}"] = result
+            logger.info(f"[run_benchmarks] {name} @ {n_users:,} users: {result['wall_seconds']:.3f}s, "
+                        f"{result['users_per_second']:,} users/s, peak {result['peak_memory_mb']} MB")
+    return results
+
+
+def load_baseline(path: str = BASELINE_PATH) -> dict:
+    """
+    Stored baseline results, or {} when there is none yet.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get('results', {})
+
+
+def save_baseline(results: dict, path: str = BASELINE_PATH, merge: bool = True):
+    """
+    Store results as the baseline; with merge, entries not re-run are kept.
+    """
+    stored = load_baseline(path) if merge else {}
+    with open(path, 'w') as f:
+        json.dump({
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'machine': {
+                'platform': platform.platform(),
+                'python': platform.python_version(),
+                'cpu_count': os.cpu_count(),
+            },
+            'results': {**stored, **results},
+        }, f, indent=2, sort_keys=True)
+    logger.info(f"[save_baseline] Stored {len(results)} results in {path}")
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """
+    Benchmarks whose wall time or peak memory grew by more than tolerance.
+
+    Returns:
+        List of dicts with benchmark, metric, baseline, current and change (ratio - 1).
+    """
+    regressions = []
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if not reference:
+            continue
+        for metric in ('wall_seconds', 'peak_memory_mb'):
+            current, before = result.get(metric), reference.get(metric)
+            if current is None or not before:
+                continue
+            if metric == 'wall_seconds' and current - before < MIN_SECONDS_DELTA:
+                continue
+            change = current / before - 1
+            if change > tolerance:
+                regressions.append({
+                    'benchmark': key, 'metric': metric, 'baseline': before, 'current': current,
+                    'change': round(change, 3),
+                })
+    return regressions
+
+
+def format_report(results: dict, baseline: dict) -> str:
+    """
+    Plain-text table of the results with the change against the baseline.
+    """
+    lines = [f"{'benchmark':<50} {'seconds':>10} {'users/s':>14} {'peak MB':>10} {'vs baseline':>12}"]
+    for key, result in results.items():
+        before = baseline.get(key, {}).get('wall_seconds')
+        change = f"{result['wall_seconds'] / before - 1:+.1%}" if before else "-"
+        peak = result['peak_memory_mb'] if result['peak_memory_mb'] is not None else "-"
+        lines.append(f"{key:<50} {result['wall_seconds']:>10.3f} {result['users_per_second'] or 0:>14,.0f} "
+                     f"{peak:>10} {change:>12}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the DS pipeline on seeded synthetic populations.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="Population sizes (users)")
+    parser.add_argument("--only", nargs="+", default=None,
+                        help="Benchmark names or prefixes, e.g. rfm churn.score_churn")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help="Days of synthetic activity")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Seed of the synthetic population")
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per benchmark (best is kept)")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc peak-memory run")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON path")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed relative growth before a regression is flagged")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--output", default=None, help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.only, args.days, args.seed, args.repeat, not args.no_memory)
+    baseline = load_baseline(args.baseline)
+    print(format_report(results, baseline))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.update_baseline:
+        save_baseline(results, args.baseline)
+        sys.exit(0)
+
+    if not baseline:
+        logger.warning(f"[benchmark] No baseline at {args.baseline}; run with --update-baseline to store one")
+        sys.exit(0)
+
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    for r in regressions:
+        logger.error(f"[benchmark] Regression in {r['benchmark']}: {r['metric']} "
+                     f"{r['baseline']} -> {r['current']} ({r['change']:+.1%})")
+    if regressions:
+        sys.exit(1)
+    logger.info(f"[benchmark] No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
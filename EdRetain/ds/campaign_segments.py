@@ -0,0 +1,65 @@
+"""
+Engagement-segment mix of each campaign's learners.
+
+The campaigns overview shows every campaign with the dominant engagement
+segment of the learners it reached. Deriving that per request means joining
+the whole daily-activity fact table to the analytics snapshots; the campaign
+stage computes it once per run instead and stores it in campaign_segment_mix
+(one row per campaign and engagement_level, with counts, shares and the
+dominant flag), which the API joins to campaign_performance.
+
+A learner counts towards a campaign's segment when a daily-activity row is
+attributed to the campaign and the learner has an analytics snapshot on that
+date; the segment is that snapshot's engagement_level.
+"""
+import pandas as pd
+from loguru import logger
+from sqlalchemy import select, func
+from Database.database import engine
+from Database.models import FactUserDailyActivity, FactUserAnalyticsSnapshot
+
+
+def load_campaign_segment_counts() -> pd.DataFrame:
+    """
+    Distinct learners per (campaign_key, engagement_level).
+    """
+    activity = FactUserDailyActivity
+    snap = FactUserAnalyticsSnapshot
+    query = (
+        select(
+            activity.campaign_key,
+            snap.engagement_level,
+            func.count(func.distinct(activity.user_key)).label("learner_count"),
+        )
+        .join(
+            snap,
+            (snap.user_key == activity.user_key) & (snap.snapshot_date_key == activity.date_key),
+        )
+        .where(activity.campaign_key.isnot(None))
+        .group_by(activity.campaign_key, snap.engagement_level)
+    )
+    with engine.connect() as conn:
+        return pd.read_sql(query, conn)
+
+
+def compute_campaign_segment_mix(snapshot_date_key: int) -> pd.DataFrame:
+    """
+    campaign_segment_mix rows for snapshot_date_key: learner_count and
+    learner_pct (share of the campaign's learners, 0-100) per engagement_level,
+    and is_dominant for the most common level (ties broken by name).
+    """
+    mix = load_campaign_segment_counts()
+    if mix.empty:
+        logger.warning("[compute_campaign_segment_mix] No campaign activity with snapshots found")
+        return mix
+
+    mix = mix.sort_values(["campaign_key", "learner_count", "engagement_level"],
+                          ascending=[True, False, True], na_position="last", kind="stable")
+    totals = mix.groupby("campaign_key")["learner_count"].transform("sum")
+    mix["learner_pct"] = mix["learner_count"] / totals * 100.0
+    mix["is_dominant"] = ~mix["campaign_key"].duplicated()
+    mix["snapshot_date_key"] = snapshot_date_key
+
+    logger.info(f"[compute_campaign_segment_mix] {mix['campaign_key'].nunique()} campaigns, "
+                f"{len(mix)} segment rows for snapshot {snapshot_date_key}")
+    return mix.reset_index(drop=True)
@@ -0,0 +1,576 @@
+"""
+Churn model: feature building, training and batched scoring.
+
+Same features, churn label and risk bands as churn_probability.ipynb, with:
+- a HistGradientBoostingClassifier option (default) that bins every feature
+  once into at most 255 buckets, so training cost grows with rows x bins
+  instead of rows x trees x split candidates; the notebook's RandomForest
+  stays available as estimator="random_forest"
+- batched scoring: the snapshot is read in fixed-size user_key batches,
+  each batch is scored across n_jobs threads and written back before the next
+  one is read, so memory stays bounded by batch_size for millions of users
+- a memory-mapped feature matrix per snapshot (feature_cache), so retraining
+  or rescoring the same snapshot skips the database and the featurization
+"""
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from loguru import logger
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.inspection import permutation_importance
+from sklearn.metrics import (
+    accuracy_score, precision_score, recall_score, f1_score, roc_auc_score, confusion_matrix
+)
+from sklearn.model_selection import train_test_split
+from sqlalchemy import select
+from threadpoolctl import threadpool_limits
+from Database.database import engine
+from Database.models import FactUserAnalyticsSnapshot
+from feature_cache import write_feature_matrix, open_feature_matrix, feature_frame
+from feature_store import load_churn_features
+from helpers import save_results_bulk, update_snapshot_columns, publish_snapshot_columns, stratified_sample_index
+from profiling import profiled
+
+MODEL_TYPE = "churn_prediction"
+MODEL_VERSION = "v2.0"
+DEFAULT_ESTIMATOR = "hist_gradient_boosting"
+
+FEATURE_COLUMNS = [
+    'rfm_recency',
+    'rfm_frequency',
+    'rfm_monetary',
+
+    # Activity features
+    'logins_90d',
+    'sessions_90d',
+    'minutes_watched_90d',
+    'lessons_completed_90d',
+    'quizzes_attempted_90d',
+    'courses_accessed',
+    'avg_active_days_30d',
+    'days_since_last_login',
+    'active_courses',
+    'completed_courses',
+
+    # Derived activity features
+    'avg_session_duration',
+    'login_frequency',
+    'lesson_completion_rate',
+    'quiz_engagement_rate',
+    'course_completion_ratio',
+    'engagement_score',
+
+    # Risk flags
+    'high_recency_risk',
+    'low_activity_risk',
+    'no_lessons_risk',
+    'no_active_courses_risk',
+    'low_watch_time_risk',
+
+    # Subscription features
+    'is_premium_tier',
+    'is_annual',
+    'has_downgraded'
+]
+
+# Fill values for users without activity in the feature store
+ACTIVITY_DEFAULTS = {
+    'logins_90d': 0,
+    'sessions_90d': 0,
+    'minutes_watched_90d': 0,
+    'lessons_completed_90d': 0,
+    'quizzes_attempted_90d': 0,
+    'courses_accessed': 0,
+    'avg_active_days_30d': 0,
+    'days_since_last_login': 999,
+    'inactive_7d_count': 0,
+    'active_courses': 0,
+    'completed_courses': 0,
+    'has_downgraded': 0,
+}
+
+# Engagement score (0-100) weights; each input is scaled by its training-set maximum
+ENGAGEMENT_WEIGHTS = {
+    'logins_90d': 0.2,
+    'minutes_watched_90d': 0.3,
+    'lessons_completed_90d': 0.3,
+    'active_courses': 0.2,
+}
+
+DEFAULT_BATCH_SIZE = 100000
+DEFAULT_TRAIN_SAMPLE_SIZE = 500000
+IMPORTANCE_SAMPLE_SIZE = 10000
+# Snapshot columns written by batched scoring
+SCORE_COLUMNS = ['churn_probability', 'churn_risk_band']
+
+FEATURE_CACHE_NAME = "churn_features"
+# Snapshot columns the cached features and label are derived from
+FEATURE_CACHE_SOURCES = ['subscription_plan_key', 'rfm_recency', 'rfm_frequency', 'rfm_monetary', 'segment_label']
+
+
+def _snapshot_query(snapshot_date_key: int):
+    snap = FactUserAnalyticsSnapshot
+    return select(
+        snap.user_key,
+        snap.subscription_plan_key,
+        snap.rfm_recency,
+        snap.rfm_frequency,
+        snap.rfm_monetary,
+        snap.rfm_r_score,
+        snap.rfm_f_score,
+        snap.rfm_m_score,
+        snap.segment_label,
+    ).where(
+        snap.snapshot_date_key == snapshot_date_key,
+        snap.subscription_plan_key.in_([2, 3, 4, 5]),
+    )
+
+
+def attach_activity_features(rfm_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Merge the feature-store activity features onto snapshot rows and fill
+    users without activity with ACTIVITY_DEFAULTS.
+    """
+    features_df = load_churn_features(user_keys=rfm_df['user_key'].tolist())
+    df = rfm_df.merge(features_df[['user_key', *ACTIVITY_DEFAULTS]], on='user_key', how='left')
+    df = df.fillna(ACTIVITY_DEFAULTS)
+    df['has_downgraded'] = df['has_downgraded'].astype(int)
+    return df
+
+
+def load_training_frame(snapshot_date_key: int) -> pd.DataFrame:
+    """
+    Premium users of one snapshot with activity features and the is_churned label.
+    """
+    with engine.connect() as conn:
+        rfm_df = pd.read_sql(_snapshot_query(snapshot_date_key), conn)
+
+    df = attach_activity_features(rfm_df)
+    df['is_churned'] = label_churn(df)
+
+    logger.info(f"[load_training_frame] Loaded {len(df):,} premium users for snapshot {snapshot_date_key} "
+                f"({df['is_churned'].sum():,} churned)")
+    return df
+
+
+def iter_snapshot_batches(snapshot_date_key: int, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Yield premium users of one snapshot with activity features, batch_size users
+    at a time, paging on user_key so each query is an index range scan.
+    """
+    last_user_key = -1
+    while True:
+        query = (
+            _snapshot_query(snapshot_date_key)
+            .where(FactUserAnalyticsSnapshot.user_key > last_user_key)
+            .order_by(FactUserAnalyticsSnapshot.user_key)
+            .limit(batch_size)
+        )
+        with engine.connect() as conn:
+            rfm_df = pd.read_sql(query, conn)
+        if rfm_df.empty:
+            return
+
+        last_user_key = int(rfm_df['user_key'].iloc[-1])
+        yield attach_activity_features(rfm_df)
+
+
+def label_churn(df: pd.DataFrame) -> pd.Series:
+    """
+    Churned when inactive > 45 days or in 'Recently Churned', downgraded and
+    inactive > 14 days, or without any logins and lessons in 90 days.
+    """
+    is_churned = (
+        (df['rfm_recency'] > 45)
+        | (df['segment_label'] == 'Recently Churned')
+        | ((df['has_downgraded'] == 1) & (df['rfm_recency'] > 14))
+        | ((df['logins_90d'] == 0) & (df['lessons_completed_90d'] == 0))
+    )
+    return is_churned.astype(int)
+
+
+def engagement_scale(df: pd.DataFrame) -> dict:
+    """
+    Per-column maxima used to scale the engagement score; fitted on the
+    training frame and reused when scoring so batches are scored consistently.
+    """
+    return {column: float(df[column].max()) for column in ENGAGEMENT_WEIGHTS}
+
+
+def build_features(df: pd.DataFrame, scale: dict) -> pd.DataFrame:
+    """
+    Derive the model features (ratios, engagement score, risk flags,
+    subscription flags) and return FEATURE_COLUMNS as float32.
+    """
+    out = pd.DataFrame(index=df.index)
+    for column in ['rfm_recency', 'rfm_frequency', 'rfm_monetary', *ACTIVITY_DEFAULTS]:
+        out[column] = df[column]
+
+    sessions = df['sessions_90d']
+    lessons = df['lessons_completed_90d']
+    out['avg_session_duration'] = np.where(sessions > 0, df['minutes_watched_90d'] / sessions.where(sessions > 0, 1), 0)
+    out['login_frequency'] = df['logins_90d'] / 90
+    out['lesson_completion_rate'] = np.where(sessions > 0, lessons / sessions.where(sessions > 0, 1), 0)
+    out['quiz_engagement_rate'] = np.where(lessons > 0, df['quizzes_attempted_90d'] / lessons.where(lessons > 0, 1), 0)
+    out['course_completion_ratio'] = np.where(
+        df['courses_accessed'] > 0,
+        df['completed_courses'] / df['courses_accessed'].where(df['courses_accessed'] > 0, 1),
+        0
+    )
+
+    engagement = 0
+    for column, weight in ENGAGEMENT_WEIGHTS.items():
+        engagement = engagement + (df[column] / scale[column] * 100 if scale[column] else 0) * weight
+    out['engagement_score'] = pd.Series(engagement, index=df.index).fillna(0)
+
+    out['high_recency_risk'] = (df['rfm_recency'] > 45).astype(int)
+    out['low_activity_risk'] = (df['logins_90d'] < 5).astype(int)
+    out['no_lessons_risk'] = (lessons == 0).astype(int)
+    out['no_active_courses_risk'] = (df['active_courses'] == 0).astype(int)
+    out['low_watch_time_risk'] = (df['minutes_watched_90d'] < 120).astype(int)
+
+    out['is_premium_tier'] = df['subscription_plan_key'].isin([4, 5]).astype(int)
+    out['is_annual'] = df['subscription_plan_key'].isin([3, 5]).astype(int)
+
+    X = out[FEATURE_COLUMNS].replace([np.inf, -np.inf], 0).fillna(0)
+    return X.astype(np.float32)
+
+
+def make_estimator(estimator: str = DEFAULT_ESTIMATOR, **params):
+    """
+    Build the churn classifier.
+
+    - "hist_gradient_boosting": HistGradientBoostingClassifier on binned features
+    - "random_forest": the notebook's RandomForestClassifier
+    Extra params override the defaults (used by hyperparameter tuning).
+    """
+    if estimator == "hist_gradient_boosting":
+        defaults = dict(
+            max_iter=200,
+            learning_rate=0.1,
+            max_leaf_nodes=31,
+            min_samples_leaf=20,
+            l2_regularization=0.0,
+            max_bins=255,
+            class_weight='balanced',
+            early_stopping='auto',
+            random_state=42,
+        )
+        return HistGradientBoostingClassifier(**{**defaults, **params})
+    if estimator == "random_forest":
+        defaults = dict(
+            n_estimators=100,
+            max_depth=10,
+            min_samples_split=20,
+            min_samples_leaf=10,
+            random_state=42,
+            class_weight='balanced',
+            n_jobs=-1,
+        )
+        return RandomForestClassifier(**{**defaults, **params})
+    raise ValueError(f"Unknown churn estimator '{estimator}', expected 'hist_gradient_boosting' or 'random_forest'")
+
+
+def evaluate_model(model, X_test: pd.DataFrame, y_test: pd.Series) -> dict:
+    """
+    Test-set metrics in the ModelPerformanceMetrics column layout.
+    """
+    y_proba = model.predict_proba(X_test)[:, 1]
+    y_pred = (y_proba >= 0.5).astype(int)
+    cm = confusion_matrix(y_test, y_pred, labels=[0, 1])
+
+    return {
+        'accuracy': round(accuracy_score(y_test, y_pred), 4),
+        'precision': round(precision_score(y_test, y_pred, zero_division=0), 4),
+        'recall': round(recall_score(y_test, y_pred, zero_division=0), 4),
+        'f1_score': round(f1_score(y_test, y_pred, zero_division=0), 4),
+        'auc_roc': round(roc_auc_score(y_test, y_proba), 4),
+        'test_samples': len(X_test),
+        'true_negatives': int(cm[0, 0]),
+        'false_positives': int(cm[0, 1]),
+        'false_negatives': int(cm[1, 0]),
+        'true_positives': int(cm[1, 1]),
+    }
+
+
+def train_churn_model(
+    df: pd.DataFrame,
+    estimator: str = DEFAULT_ESTIMATOR,
+    train_sample_size: int = DEFAULT_TRAIN_SAMPLE_SIZE,
+    seed: int = 42,
+    **params,
+):
+    """
+    Fit the churn model on a labelled frame (see load_training_frame).
+
+    Above train_sample_size users the training split is subsampled, stratified
+    by the label; the test split is always the full 20% hold-out.
+
+    Returns:
+        (model, scale, metrics, (X_test, y_test)) where scale feeds build_features
+        at scoring time and metrics follows the ModelPerformanceMetrics layout.
+    """
+    scale = engagement_scale(df)
+    X = build_features(df, scale)
+    model, metrics, test_split = fit_churn_model(
+        X, df['is_churned'], estimator=estimator, train_sample_size=train_sample_size, seed=seed, **params
+    )
+    return model, scale, metrics, test_split
+
+
+def fit_churn_model(
+    X: pd.DataFrame,
+    y: pd.Series,
+    estimator: str = DEFAULT_ESTIMATOR,
+    train_sample_size: int = DEFAULT_TRAIN_SAMPLE_SIZE,
+    seed: int = 42,
+    **params,
+):
+    """
+    Fit the churn model on a built feature matrix (FEATURE_COLUMNS) and label.
+
+    Returns:
+        (model, metrics, (X_test, y_test)).
+    """
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=seed, stratify=y)
+    sample_idx = stratified_sample_index(y_train, train_sample_size, seed)
+    X_train, y_train = X_train.iloc[sample_idx], y_train.iloc[sample_idx]
+
+    model = make_estimator(estimator, **params)
+    model.fit(X_train, y_train)
+
+    metrics = evaluate_model(model, X_test, y_test)
+    metrics['train_samples'] = len(X_train)
+
+    logger.info(f"[fit_churn_model] {estimator} trained on {len(X_train):,} users: "
+                f"AUC {metrics['auc_roc']:.3f}, F1 {metrics['f1_score']:.3f}")
+    return model, metrics, (X_test, y_test)
+
+
+def load_feature_matrix(snapshot_date_key: int, use_cache: bool = True):
+    """
+    Built features and churn label of every premium user of a snapshot.
+
+    Served from the memory-mapped feature cache when present; otherwise the
+    training frame is loaded and featurized once and written to the cache.
+
+    Returns:
+        (user_keys, X, y, scale) with X a FEATURE_COLUMNS DataFrame view over
+        the cached matrix and scale the engagement scale it was built with.
+    """
+    cached = open_feature_matrix(FEATURE_CACHE_NAME, snapshot_date_key) if use_cache else None
+    if cached is None:
+        df = load_training_frame(snapshot_date_key)
+        scale = engagement_scale(df)
+        X = build_features(df, scale)
+        X['is_churned'] = df['is_churned'].to_numpy(dtype=np.float32)
+        if not use_cache:
+            return df['user_key'].to_numpy(), X[FEATURE_COLUMNS], df['is_churned'], scale
+
+        write_feature_matrix(
+            FEATURE_CACHE_NAME, snapshot_date_key, df['user_key'].to_numpy(), X,
+            source_columns=FEATURE_CACHE_SOURCES, meta={'scale': scale}
+        )
+        del df, X
+        cached = open_feature_matrix(FEATURE_CACHE_NAME, snapshot_date_key)
+    else:
+        logger.info(f"[load_feature_matrix] Using cached churn features for snapshot {snapshot_date_key}")
+
+    user_keys, matrix, info = cached
+    frame = feature_frame(user_keys, matrix, info['columns'])
+    y = frame['is_churned'].astype(int)
+    return np.asarray(user_keys), frame[FEATURE_COLUMNS], y, info['meta']['scale']
+
+
+def feature_importance(model, X_test: pd.DataFrame, y_test: pd.Series, seed: int = 42) -> pd.DataFrame:
+    """
+    Feature importance normalized to 100, ranked.
+
+    Uses the model's own importances when it has them (RandomForest) and
+    permutation importance on a test sample otherwise (HistGradientBoosting).
+    """
+    if hasattr(model, 'feature_importances_'):
+        scores = model.feature_importances_
+    else:
+        sample_idx = stratified_sample_index(y_test, IMPORTANCE_SAMPLE_SIZE, seed)
+        result = permutation_importance(
+            model, X_test.iloc[sample_idx], y_test.iloc[sample_idx],
+            scoring='roc_auc', n_repeats=5, random_state=seed, n_jobs=-1
+        )
+        scores = np.clip(result.importances_mean, 0, None)
+
+    importance = pd.DataFrame({
+        'feature_name': FEATURE_COLUMNS,
+        'importance_score': scores,
+    }).sort_values('importance_score', ascending=False)
+
+    total = importance['importance_score'].sum()
+    importance['importance_score'] = importance['importance_score'] / total * 100 if total else 0.0
+    importance['importance_rank'] = range(1, len(importance) + 1)
+    return importance
+
+
+def classify_churn_risk(prob) -> np.ndarray:
+    """
+    High (>= 0.7), Medium (>= 0.4), Low (>= 0.2) or Minimal Risk.
+    """
+    prob = np.asarray(prob)
+    return np.select(
+        [prob >= 0.7, prob >= 0.4, prob >= 0.2],
+        ['High Risk', 'Medium Risk', 'Low Risk'],
+        'Minimal Risk'
+    )
+
+
+def _predict_proba_parallel(model, df: pd.DataFrame, n_jobs: int = None, transform=None) -> np.ndarray:
+    """
+    Churn probabilities of df's rows, split into n_jobs slices that are
+    (optionally transformed and) scored concurrently, one native thread each.
+    """
+    n_jobs = max(1, min(n_jobs or os.cpu_count() or 1, len(df)))
+    bounds = np.linspace(0, len(df), n_jobs + 1, dtype=int)
+
+    def run(i):
+        part = df.iloc[bounds[i]:bounds[i + 1]]
+        return model.predict_proba(transform(part) if transform else part)[:, 1]
+
+    if n_jobs == 1:
+        return run(0)
+    with threadpool_limits(limits=1), ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        return np.concatenate(list(pool.map(run, range(n_jobs))))
+
+
+def score_churn(model, df: pd.DataFrame, scale: dict, n_jobs: int = None) -> pd.DataFrame:
+    """
+    Score one batch of users across n_jobs threads.
+
+    The batch is split into n_jobs slices that are featurized and scored
+    concurrently (each model call limited to one native thread).
+
+    Returns:
+        DataFrame with user_key, churn_probability and churn_risk_band.
+    """
+    probabilities = _predict_proba_parallel(model, df, n_jobs, lambda part: build_features(part, scale))
+    return pd.DataFrame({
+        'user_key': df['user_key'].to_numpy(),
+        'churn_probability': probabilities,
+        'churn_risk_band': classify_churn_risk(probabilities),
+    })
+
+
+def score_snapshot(
+    model,
+    scale: dict,
+    snapshot_date_key: int,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    n_jobs: int = None,
+) -> int:
+    """
+    Score every premium user of a snapshot in batches and write churn_probability
+    and churn_risk_band back after each batch. The tables derived from the
+    scores are refreshed once, after the last batch.
+
+    Returns:
+        Number of users scored.
+    """
+    scored = 0
+    for batch_df in iter_snapshot_batches(snapshot_date_key, batch_size):
+        scores_df = score_churn(model, batch_df, scale, n_jobs=n_jobs)
+        update_snapshot_columns(scores_df, snapshot_date_key, SCORE_COLUMNS, publish=False)
+        scored += len(scores_df)
+        logger.info(f"[score_snapshot] Scored {scored:,} users")
+
+    if scored:
+        publish_snapshot_columns(snapshot_date_key, SCORE_COLUMNS)
+    return scored
+
+
+def score_feature_matrix(
+    model,
+    user_keys: np.ndarray,
+    X: pd.DataFrame,
+    snapshot_date_key: int,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    n_jobs: int = None,
+) -> int:
+    """
+    Score a (cached) feature matrix in row batches and write churn_probability
+    and churn_risk_band back after each batch. Only the batch being scored is
+    paged in from the memory-mapped file. The tables derived from the scores
+    are refreshed once, after the last batch.
+
+    Returns:
+        Number of users scored.
+    """
+    for start in range(0, len(X), batch_size):
+        probabilities = _predict_proba_parallel(model, X.iloc[start:start + batch_size], n_jobs)
+        scores_df = pd.DataFrame({
+            'user_key': user_keys[start:start + batch_size],
+            'churn_probability': probabilities,
+            'churn_risk_band': classify_churn_risk(probabilities),
+        })
+        update_snapshot_columns(scores_df, snapshot_date_key, SCORE_COLUMNS, publish=False)
+        logger.info(f"[score_feature_matrix] Scored {min(start + batch_size, len(X)):,} users")
+
+    if len(X):
+        publish_snapshot_columns(snapshot_date_key, SCORE_COLUMNS)
+    return len(X)
+
+
+@profiled()
+def churn_to_snapshot(
+    snapshot_date_key: int = None,
+    estimator: str = DEFAULT_ESTIMATOR,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    n_jobs: int = None,
+    model_version: str = MODEL_VERSION,
+    params: dict = None,
+    use_cache: bool = True,
+):
+    """
+    Train the churn model on one snapshot, save its metrics and feature
+    importance, and score the whole snapshot in batches.
+
+    params overrides the estimator defaults, e.g. the winner of a tuning run
+    (churn_tuning.load_tuned_params). With use_cache the features come from
+    (or are written to) the snapshot's memory-mapped feature matrix and
+    scoring reads the same matrix; otherwise the snapshot is re-read from the
+    database in batches.
+    """
+    if snapshot_date_key is None:
+        snapshot_date_key = int(datetime.now().strftime("%Y%m%d"))
+
+    if use_cache:
+        user_keys, X, y, scale = load_feature_matrix(snapshot_date_key)
+        model, metrics, (X_test, y_test) = fit_churn_model(X, y, estimator=estimator, **(params or {}))
+    else:
+        df = load_training_frame(snapshot_date_key)
+        model, scale, metrics, (X_test, y_test) = train_churn_model(df, estimator=estimator, **(params or {}))
+        del df
+
+    metrics_df = pd.DataFrame([{
+        'snapshot_date_key': snapshot_date_key,
+        'model_type': MODEL_TYPE,
+        'model_version': model_version,
+        **metrics,
+    }])
+    save_results_bulk(metrics_df, 'model_performance_metrics')
+
+    importance_df = feature_importance(model, X_test, y_test)
+    importance_df['snapshot_date_key'] = snapshot_date_key
+    importance_df['model_type'] = MODEL_TYPE
+    importance_df['model_version'] = model_version
+    save_results_bulk(importance_df, 'feature_importance')
+
+    if use_cache:
+        scored = score_feature_matrix(model, user_keys, X, snapshot_date_key, batch_size=batch_size, n_jobs=n_jobs)
+    else:
+        scored = score_snapshot(model, scale, snapshot_date_key, batch_size=batch_size, n_jobs=n_jobs)
+    logger.info(f"[churn_to_snapshot] Churn predictions saved for {scored:,} users.")
+    return model, scale
+
+
+if __name__ == "__main__":
+    churn_to_snapshot()
@@ -0,0 +1,143 @@
+"""
+Churn-reason attribution for at-risk users.
+
+Same reasons, priority order and severity levels as churn_probability.ipynb,
+without the per-row apply:
+- every reason rule is a NumPy boolean mask, stacked into a users x reasons
+  matrix in priority order
+- argmax over the matrix picks the first matching reason per user ('Other'
+  when no rule matches)
+- reason_count, reason_pct and avg_churn_probability come from one bincount
+  pass over the reason codes, and the result is bulk-written to churn_reasons
+"""
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from loguru import logger
+from sqlalchemy import select
+from Database.database import engine
+from Database.models import FactUserAnalyticsSnapshot
+from churn_model import attach_activity_features
+from helpers import save_results_bulk
+from profiling import profiled
+
+AT_RISK_BANDS = ['High Risk', 'Medium Risk']
+
+# (reason_category, reason_display_name), in priority order
+CHURN_REASONS = [
+    ('Inactivity', 'Prolonged Inactivity (30+ days)'),
+    ('Low Engagement', 'Low Platform Engagement'),
+    ('Course Dropped', 'No Lessons Completed'),
+    ('No Active Courses', 'No Active Courses'),
+    ('Low Watch Time', 'Minimal Watch Time'),
+    ('Downgraded Plan', 'Subscription Downgrade'),
+    ('Low Quiz Engagement', 'Low Quiz Participation'),
+]
+OTHER_REASON = ('Other', 'Other Factors')
+
+
+def reason_matrix(df: pd.DataFrame) -> np.ndarray:
+    """
+    Boolean users x reasons matrix, columns in CHURN_REASONS order.
+    """
+    lessons = df['lessons_completed_90d'].to_numpy()
+    quizzes = df['quizzes_attempted_90d'].to_numpy()
+
+    return np.column_stack([
+        df['rfm_recency'].to_numpy() > 30,
+        df['logins_90d'].to_numpy() < 3,
+        lessons == 0,
+        df['active_courses'].to_numpy() == 0,
+        df['minutes_watched_90d'].to_numpy() < 60,
+        df['has_downgraded'].to_numpy() == 1,
+        (quizzes == 0) & (lessons > 0),
+    ])
+
+
+def attribute_primary_reason(df: pd.DataFrame) -> np.ndarray:
+    """
+    Primary reason code per user: index into CHURN_REASONS of the first
+    matching rule, or len(CHURN_REASONS) for 'Other'.
+    """
+    matrix = reason_matrix(df)
+    codes = matrix.argmax(axis=1)
+    codes[~matrix.any(axis=1)] = len(CHURN_REASONS)
+    return codes
+
+
+def assign_severity(avg_prob) -> np.ndarray:
+    """
+    High (>= 0.7), Medium (>= 0.4) or Low severity of a reason's average churn probability.
+    """
+    avg_prob = np.asarray(avg_prob)
+    return np.select([avg_prob >= 0.7, avg_prob >= 0.4], ['High', 'Medium'], 'Low')
+
+
+def aggregate_churn_reasons(df: pd.DataFrame, codes: np.ndarray, snapshot_date_key: int) -> pd.DataFrame:
+    """
+    One row per observed reason with reason_count, reason_pct, avg_churn_probability
+    and severity_level, in the churn_reasons layout.
+    """
+    reasons = CHURN_REASONS + [OTHER_REASON]
+    counts = np.bincount(codes, minlength=len(reasons))
+    prob_sums = np.bincount(codes, weights=df['churn_probability'].to_numpy(dtype=float), minlength=len(reasons))
+
+    observed = np.flatnonzero(counts)
+    avg_prob = prob_sums[observed] / counts[observed]
+    return pd.DataFrame({
+        'snapshot_date_key': snapshot_date_key,
+        'reason_category': [reasons[i][0] for i in observed],
+        'reason_display_name': [reasons[i][1] for i in observed],
+        'reason_count': counts[observed],
+        'reason_pct': np.round(counts[observed] / len(codes) * 100, 1),
+        'avg_churn_probability': avg_prob,
+        'severity_level': assign_severity(avg_prob),
+    })
+
+
+def load_at_risk_users(snapshot_date_key: int) -> pd.DataFrame:
+    """
+    High and Medium risk premium users of a snapshot with their activity features.
+    """
+    snap = FactUserAnalyticsSnapshot
+    query = select(
+        snap.user_key,
+        snap.rfm_recency,
+        snap.churn_probability,
+    ).where(
+        snap.snapshot_date_key == snapshot_date_key,
+        snap.subscription_plan_key.in_([2, 3, 4, 5]),
+        snap.churn_risk_band.in_(AT_RISK_BANDS),
+    )
+    with engine.connect() as conn:
+        rfm_df = pd.read_sql(query, conn)
+
+    if rfm_df.empty:
+        return rfm_df
+    return attach_activity_features(rfm_df)
+
+
+@profiled()
+def churn_reasons_to_snapshot(snapshot_date_key: int = None) -> pd.DataFrame:
+    """
+    Attribute a primary churn reason to every at-risk user of a snapshot and
+    replace the snapshot's churn_reasons rows.
+    """
+    if snapshot_date_key is None:
+        snapshot_date_key = int(datetime.now().strftime("%Y%m%d"))
+
+    df = load_at_risk_users(snapshot_date_key)
+    if df.empty:
+        logger.warning(f"[churn_reasons_to_snapshot] No at-risk users in snapshot {snapshot_date_key}, nothing to do")
+        return df
+
+    codes = attribute_primary_reason(df)
+    reasons_df = aggregate_churn_reasons(df, codes, snapshot_date_key)
+    logger.info(f"[churn_reasons_to_snapshot] Attributed {len(df):,} at-risk users to {len(reasons_df)} reasons")
+
+    save_results_bulk(reasons_df, 'churn_reasons')
+    return reasons_df
+
+
+if __name__ == "__main__":
+    churn_reasons_to_snapshot()
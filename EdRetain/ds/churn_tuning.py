@@ -0,0 +1,193 @@
+"""
+Hyperparameter tuning for the churn model with successive halving.
+
+HalvingRandomSearchCV draws n_candidates configurations, scores all of them on
+a small subsample of the training split, and keeps only the best 1/factor for
+the next round on factor times more rows, until the survivors are scored on
+the whole training split. Candidates in a round are cross-validated in
+parallel worker processes. The winner is evaluated on the 20% hold-out and
+logged to model_performance_metrics (model_type
+'churn_prediction_tuning:<estimator>', so tuning one estimator never replaces
+another's row for the same snapshot) with a version string and its hyperparameters, where
+churn_model.churn_to_snapshot can pick them up.
+"""
+import json
+import pandas as pd
+from datetime import datetime
+from loguru import logger
+from scipy.stats import loguniform, randint, uniform
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import HalvingRandomSearchCV, StratifiedKFold, train_test_split
+from sqlalchemy import select
+from Database.database import engine
+from Database.models import ModelPerformanceMetrics
+from churn_model import (
+    MODEL_VERSION, DEFAULT_ESTIMATOR, load_training_frame, engagement_scale, build_features,
+    make_estimator, evaluate_model
+)
+from helpers import save_results_bulk
+
+TUNING_MODEL_TYPE = "churn_prediction_tuning"
+
+PARAM_DISTRIBUTIONS = {
+    "hist_gradient_boosting": {
+        "learning_rate": loguniform(0.01, 0.3),
+        "max_leaf_nodes": randint(15, 128),
+        "min_samples_leaf": randint(10, 200),
+        "l2_regularization": loguniform(1e-4, 10),
+        "max_features": uniform(0.5, 0.5),
+    },
+    "random_forest": {
+        "n_estimators": randint(50, 300),
+        "max_depth": randint(4, 20),
+        "min_samples_split": randint(2, 50),
+        "min_samples_leaf": randint(1, 30),
+        "max_features": ["sqrt", "log2", 0.5],
+    },
+}
+
+DEFAULT_CANDIDATES = 64
+DEFAULT_MIN_RESOURCES = 2000
+DEFAULT_FACTOR = 3
+
+
+def tune_churn_model(
+    df: pd.DataFrame,
+    estimator: str = DEFAULT_ESTIMATOR,
+    n_candidates: int = DEFAULT_CANDIDATES,
+    min_resources: int = DEFAULT_MIN_RESOURCES,
+    factor: int = DEFAULT_FACTOR,
+    n_jobs: int = -1,
+    seed: int = 42,
+):
+    """
+    Run successive-halving random search on a labelled frame (see load_training_frame).
+
+    Args:
+        df: Premium users with activity features and is_churned.
+        estimator: "hist_gradient_boosting" or "random_forest".
+        n_candidates: Configurations drawn for the first round.
+        min_resources: Training rows per candidate in the first round.
+        factor: Share of candidates kept per round (1/factor) and growth of rows per round.
+        n_jobs: Worker processes for cross-validation (-1: all cores).
+
+    Returns:
+        (search, metrics) with the fitted HalvingRandomSearchCV and the winner's
+        hold-out metrics in the ModelPerformanceMetrics layout.
+    """
+    if estimator not in PARAM_DISTRIBUTIONS:
+        raise ValueError(f"Unknown churn estimator '{estimator}', expected one of {list(PARAM_DISTRIBUTIONS)}")
+
+    X = build_features(df, engagement_scale(df))
+    y = df['is_churned']
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=seed, stratify=y)
+
+    base_params = {"n_jobs": 1} if estimator == "random_forest" else {}
+    search = HalvingRandomSearchCV(
+        make_estimator(estimator, **base_params),
+        PARAM_DISTRIBUTIONS[estimator],
+        n_candidates=n_candidates,
+        resource='n_samples',
+        min_resources=min(min_resources, len(X_train)),
+        factor=factor,
+        scoring='roc_auc',
+        cv=StratifiedKFold(n_splits=3, shuffle=True, random_state=seed),
+        refit=True,
+        n_jobs=n_jobs,
+        random_state=seed,
+    )
+
+    logger.info(f"[tune_churn_model] Successive halving over {n_candidates} {estimator} candidates, "
+                f"starting at {min_resources:,} of {len(X_train):,} training rows, factor {factor}")
+    search.fit(X_train, y_train)
+
+    for i, (resources, candidates) in enumerate(zip(search.n_resources_, search.n_candidates_)):
+        logger.info(f"[tune_churn_model] Round {i}: {candidates} candidates on {resources:,} rows")
+
+    metrics = evaluate_model(search.best_estimator_, X_test, y_test)
+    metrics['train_samples'] = len(X_train)
+
+    logger.info(f"[tune_churn_model] Best CV AUC {search.best_score_:.4f}, hold-out AUC {metrics['auc_roc']:.4f} "
+                f"with {_json_params(search.best_params_)}")
+    return search, metrics
+
+
+def _json_params(params: dict) -> str:
+    return json.dumps({k: (v.item() if hasattr(v, 'item') else v) for k, v in params.items()}, sort_keys=True)
+
+
+def tuning_model_type(estimator: str) -> str:
+    """model_performance_metrics model_type of an estimator's tuning runs."""
+    return f"{TUNING_MODEL_TYPE}:{estimator}"
+
+
+def log_tuning_result(
+    search,
+    metrics: dict,
+    snapshot_date_key: int,
+    estimator: str = DEFAULT_ESTIMATOR,
+    model_version: str = None,
+) -> str:
+    """
+    Save the winning configuration and its hold-out metrics to
+    model_performance_metrics under the estimator's tuning_model_type.
+
+    Returns:
+        The model version string, e.g. 'v2.0-hist_gradient_boosting-tuned-202511201530'.
+    """
+    if model_version is None:
+        model_version = f"{MODEL_VERSION}-{estimator}-tuned-{datetime.now():%Y%m%d%H%M}"
+
+    metrics_df = pd.DataFrame([{
+        'snapshot_date_key': snapshot_date_key,
+        'model_type': tuning_model_type(estimator),
+        'model_version': model_version,
+        'hyperparameters': _json_params({'estimator': estimator, **search.best_params_}),
+        **metrics,
+    }])
+    save_results_bulk(metrics_df, 'model_performance_metrics')
+
+    logger.info(f"[log_tuning_result] Logged {model_version} for snapshot {snapshot_date_key}")
+    return model_version
+
+
+def load_tuned_params(estimator: str = DEFAULT_ESTIMATOR):
+    """
+    Return (model_version, params) of the latest tuning run for estimator,
+    or (None, {}) if it has never been tuned.
+    """
+    metrics = ModelPerformanceMetrics
+    # Rows logged before the per-estimator model types share the bare TUNING_MODEL_TYPE
+    query = (
+        select(metrics.model_version, metrics.hyperparameters)
+        .where(metrics.model_type.in_([tuning_model_type(estimator), TUNING_MODEL_TYPE]),
+               metrics.hyperparameters.isnot(None))
+        .order_by(metrics.snapshot_date_key.desc(), metrics.created_at.desc())
+    )
+    with engine.connect() as conn:
+        for model_version, hyperparameters in conn.execute(query):
+            params = json.loads(hyperparameters)
+            if params.pop('estimator', None) == estimator:
+                return model_version, params
+    return None, {}
+
+
+def tune_to_metrics(
+    snapshot_date_key: int = None,
+    estimator: str = DEFAULT_ESTIMATOR,
+    n_candidates: int = DEFAULT_CANDIDATES,
+    n_jobs: int = -1,
+) -> str:
+    """
+    Tune the churn model on one snapshot and log the winner. Returns its version.
+    """
+    if snapshot_date_key is None:
+        snapshot_date_key = int(datetime.now().strftime("%Y%m%d"))
+
+    df = load_training_frame(snapshot_date_key)
+    search, metrics = tune_churn_model(df, estimator=estimator, n_candidates=n_candidates, n_jobs=n_jobs)
+    return log_tuning_result(search, metrics, snapshot_date_key, estimator=estimator)
+
+
+if __name__ == "__main__":
+    tune_to_metrics()
@@ -0,0 +1,178 @@
+"""
+Set-based dashboard KPIs.
+
+Computes every dashboard_metrics column for a published snapshot with one
+aggregation query (count(*) FILTER (WHERE ...) per KPI) instead of loading
+the snapshot into pandas as RFM_KPI.ipynb does. The previous-period deltas
+come from lag() over the stored dashboard_metrics history in the same
+statement, so a refresh is one server-side scan and returns a single row.
+
+Segment rules match calculate_dashboard_metrics in RFM_KPI.ipynb.
+"""
+import pandas as pd
+from datetime import datetime
+from loguru import logger
+from sqlalchemy import select, func, literal, union_all, Float
+from Database.database import engine
+from Database.models import FactUserAnalyticsSnapshot, DashboardMetrics
+from helpers import save_results_bulk
+from profiling import profiled
+
+# subscription_plan_key: 1 = Free, 2-3 = Standard, 4-5 = Premium
+PREMIUM_PLAN_KEYS = [2, 3, 4, 5]
+ACTIVE_RECENCY_DAYS = 7
+
+AT_RISK_SEGMENTS = ['High-Value at Risk', 'Declining Engagement', 'Dormant Premium']
+RETAINED_SEGMENTS = ['Active High-Value Learners', 'Engaged Subscribers', 'Loyal Long-Term', 'Promising Starters']
+CHURNED_SEGMENT = 'Recently Churned'
+NEW_SEGMENT = 'New Premium Users'
+
+ENGAGEMENT_SEGMENTS = {
+    'highly_engaged': ['Active High-Value Learners', 'Engaged Subscribers', 'Loyal Long-Term'],
+    'medium_engaged': ['Promising Starters', 'New Premium Users', 'Casual Users'],
+    'at_risk': ['Declining Engagement', 'High-Value at Risk'],
+    'dormant': ['Dormant Premium', 'Recently Churned'],
+}
+
+
+def _kpi_counts_query(snapshot_date_key: int):
+    """
+    One aggregation over the premium users of a snapshot.
+    """
+    snap = FactUserAnalyticsSnapshot
+    segment = snap.segment_label
+
+    counts = {
+        'total_premium_learners': func.count(),
+        'active_premium_learners': func.count().filter(snap.rfm_recency <= ACTIVE_RECENCY_DAYS),
+        'at_risk_learners': func.count().filter(segment.in_(AT_RISK_SEGMENTS)),
+        'retained_learners': func.count().filter(segment.in_(RETAINED_SEGMENTS)),
+        'churned_learners': func.count().filter(segment == CHURNED_SEGMENT),
+        'new_premium_learners': func.count().filter(segment == NEW_SEGMENT),
+    }
+    for name, segments in ENGAGEMENT_SEGMENTS.items():
+        counts[f'{name}_count'] = func.count().filter(segment.in_(segments))
+
+    return select(
+        literal(snapshot_date_key).label('snapshot_date_key'),
+        *[expr.label(name) for name, expr in counts.items()],
+    ).where(
+        snap.snapshot_date_key == snapshot_date_key,
+        snap.subscription_plan_key.in_(PREMIUM_PLAN_KEYS),
+    )
+
+
+def _kpi_query(snapshot_date_key: int):
+    """
+    Current counts plus lag() of the previously stored KPIs, as one statement.
+    """
+    metrics = DashboardMetrics
+    current = _kpi_counts_query(snapshot_date_key).cte('current_kpis')
+
+    retention_rate = (
+        100.0 * current.c.retained_learners / func.nullif(current.c.total_premium_learners, 0)
+    ).cast(Float)
+
+    history = union_all(
+        select(
+            metrics.snapshot_date_key,
+            metrics.created_at,
+            metrics.active_premium_learners,
+            metrics.at_risk_learners,
+            metrics.average_retention_rate,
+        ).where(metrics.snapshot_date_key < snapshot_date_key),
+        select(
+            current.c.snapshot_date_key,
+            literal(None, metrics.created_at.type),
+            current.c.active_premium_learners,
+            current.c.at_risk_learners,
+            retention_rate,
+        ),
+    ).subquery('kpi_history')
+
+    order = (history.c.snapshot_date_key, history.c.created_at)
+    lagged = select(
+        history.c.snapshot_date_key,
+        func.lag(history.c.active_premium_learners).over(order_by=order).label('prev_active_premium_learners'),
+        func.lag(history.c.at_risk_learners).over(order_by=order).label('prev_at_risk_learners'),
+        func.lag(history.c.average_retention_rate).over(order_by=order).label('prev_retention_rate'),
+    ).subquery('kpi_lag')
+
+    return select(
+        current,
+        lagged.c.prev_active_premium_learners,
+        lagged.c.prev_at_risk_learners,
+        lagged.c.prev_retention_rate,
+    ).join(
+        lagged, lagged.c.snapshot_date_key == current.c.snapshot_date_key
+    )
+
+
+def compute_dashboard_metrics(snapshot_date_key: int):
+    """
+    Compute the dashboard_metrics row of a published snapshot in SQL.
+
+    Returns:
+        Dict with every DashboardMetrics column (except ids/created_at), or None
+        if the snapshot has no premium learners.
+    """
+    with engine.connect() as conn:
+        row = conn.execute(_kpi_query(snapshot_date_key)).mappings().first()
+
+    total = row['total_premium_learners'] if row else 0
+    if not total:
+        logger.warning(f"[compute_dashboard_metrics] No premium learners in snapshot {snapshot_date_key}")
+        return None
+
+    retention_rate = row['retained_learners'] / total * 100
+    metrics = {
+        'snapshot_date_key': snapshot_date_key,
+        'active_premium_learners': row['active_premium_learners'],
+        'at_risk_learners': row['at_risk_learners'],
+        'average_retention_rate': round(retention_rate, 2),
+        'total_premium_learners': total,
+        'churned_learners': row['churned_learners'],
+        'new_premium_learners': row['new_premium_learners'],
+        'monthly_retention_rate': round(retention_rate, 1),
+        'monthly_churn_rate': round(row['dormant_count'] / total * 100, 1),
+    }
+    for name in ENGAGEMENT_SEGMENTS:
+        metrics[f'{name}_count'] = row[f'{name}_count']
+        metrics[f'{name}_pct'] = round(row[f'{name}_count'] / total * 100, 1)
+
+    prev_active = row['prev_active_premium_learners']
+    prev_at_risk = row['prev_at_risk_learners']
+    prev_retention = row['prev_retention_rate']
+    metrics['active_premium_change_pct'] = (
+        round((metrics['active_premium_learners'] - prev_active) / prev_active * 100, 1) if prev_active else None
+    )
+    metrics['at_risk_change_count'] = (
+        metrics['at_risk_learners'] - prev_at_risk if prev_at_risk is not None else None
+    )
+    metrics['retention_rate_change_pct'] = (
+        round(metrics['average_retention_rate'] - prev_retention, 2) if prev_retention is not None else None
+    )
+
+    logger.info(f"[compute_dashboard_metrics] Snapshot {snapshot_date_key}: {total:,} premium learners, "
+                f"{metrics['active_premium_learners']:,} active, {metrics['at_risk_learners']:,} at risk")
+    return metrics
+
+
+@profiled()
+def refresh_dashboard_metrics(snapshot_date_key: int = None):
+    """
+    Recompute and store (replace) the dashboard_metrics row of a snapshot.
+    """
+    if snapshot_date_key is None:
+        snapshot_date_key = int(datetime.now().strftime("%Y%m%d"))
+
+    metrics = compute_dashboard_metrics(snapshot_date_key)
+    if metrics is None:
+        return None
+
+    save_results_bulk(pd.DataFrame([metrics]), 'dashboard_metrics')
+    return metrics
+
+
+if __name__ == "__main__":
+    refresh_dashboard_metrics()
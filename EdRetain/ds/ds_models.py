@@ -5,7 +5,9 @@ from sqlalchemy.orm import Session
 from Database.database import engine, SessionLocal
 from Database.models import DimDate
 from helpers import load_user_activity_and_subscription_dfs, save_snapshot_to_db, ensure_snapshot_date
+from profiling import profiled
 
+@profiled()
 def compute_basic_rfm(df: pd.DataFrame) -> pd.DataFrame:
     rfm_df = df.groupby('user_key').agg(
         rfm_recency=('days_since_last_login', 'min'),
@@ -15,6 +17,7 @@ def compute_basic_rfm(df: pd.DataFrame) -> pd.DataFrame:
     logger.info(f"[compute_basic_rfm] Computed RFM for {len(rfm_df)} users")
     return rfm_df
 
+@profiled()
 def rfm_to_snapshot():
     merged_df = load_user_activity_and_subscription_dfs()
     rfm_df = compute_basic_rfm(merged_df)
@@ -0,0 +1,280 @@
+"""
+Optional out-of-core execution path for the heavy DS aggregations, backed by DuckDB.
+
+The pandas helpers load the whole fact_user_daily_activity table into memory.
+The functions here push the same aggregations (lifetime revenue, basic RFM,
+90-day churn features, campaign rollups) into an embedded DuckDB that reads
+either Parquet exports or the live PostgreSQL database, runs multi-threaded,
+spills to disk once memory_limit is reached, and returns only the small
+per-user / per-campaign result frames.
+
+Usage:
+    con = connect()                          # attach the PostgreSQL database
+    con = connect(parquet_dir="exports/")    # or read <table>.parquet exports
+    revenue_df = calculate_total_lifetime_revenue(con)
+    rfm_df = compute_basic_rfm(con)
+
+DuckDB is an optional dependency; it is only imported when connect() is called.
+"""
+import os
+import tempfile
+import pandas as pd
+from datetime import datetime, timedelta
+from loguru import logger
+from sqlalchemy.engine import make_url
+from Database.database import DATABASE_URL
+
+# Tables the DS aggregations read
+SOURCE_TABLES = (
+    "fact_user_daily_activity",
+    "dim_subscription_plan",
+    "fact_campaign_interaction",
+    "dim_campaign",
+    "fact_user_analytics_snapshot",
+)
+
+DEFAULT_MEMORY_LIMIT = "4GB"
+
+# Billing periods paid per (user, premium plan): unique months for monthly plans,
+# unique years for yearly/annual ones, as in helpers.calculate_total_lifetime_revenue
+_PLAN_REVENUE_CTE = """
+        plan_periods AS (
+            SELECT a.user_key,
+                   a.subscription_plan_key,
+                   ANY_VALUE(p.base_price) AS base_price,
+                   LOWER(CAST(ANY_VALUE(p.billing_cycle) AS VARCHAR)) AS billing_cycle,
+                   COUNT(DISTINCT a.date_key // 100) AS months,
+                   COUNT(DISTINCT a.date_key // 10000) AS years
+            FROM fact_user_daily_activity a
+            JOIN dim_subscription_plan p USING (subscription_plan_key)
+            WHERE p.base_price > 0
+            GROUP BY a.user_key, a.subscription_plan_key
+        ),
+        plan_revenue AS (
+            SELECT user_key, base_price,
+                   CASE
+                       WHEN billing_cycle LIKE '%month%' THEN months
+                       WHEN billing_cycle LIKE '%year%' OR billing_cycle LIKE '%annual%' THEN years
+                       ELSE months
+                   END AS billing_cycles_paid
+            FROM plan_periods
+        )"""
+
+
+def _import_duckdb():
+    try:
+        import duckdb
+    except ImportError as e:
+        raise ImportError(
+            "The DuckDB engine requires the 'duckdb' package (pip install duckdb)"
+        ) from e
+    return duckdb
+
+
+def _parquet_source(parquet_dir: str, table: str) -> str:
+    """Return the read_parquet() glob for a table exported as a file or a directory of parts."""
+    table_dir = os.path.join(parquet_dir, table)
+    if os.path.isdir(table_dir):
+        return os.path.join(table_dir, "*.parquet")
+    return os.path.join(parquet_dir, f"{table}.parquet")
+
+
+def _postgres_dsn(database_url: str) -> str:
+    """Strip the SQLAlchemy driver suffix so DuckDB's postgres extension accepts the URL."""
+    url = make_url(database_url).set(drivername="postgresql")
+    return url.render_as_string(hide_password=False)
+
+
+def connect(
+    parquet_dir: str = None,
+    database_url: str = None,
+    memory_limit: str = DEFAULT_MEMORY_LIMIT,
+    threads: int = None,
+    temp_directory: str = None,
+):
+    """
+    Open an in-process DuckDB connection exposing the DS source tables as views.
+
+    Args:
+        parquet_dir: Directory of Parquet exports (<table>.parquet or <table>/*.parquet).
+            When omitted, the PostgreSQL database is attached read-only instead.
+        database_url: PostgreSQL URL to attach (default: DATABASE_URL).
+        memory_limit: DuckDB memory budget; larger intermediates spill to temp_directory.
+        threads: Worker threads (default: all cores).
+        temp_directory: Spill directory (default: a folder under the system temp dir).
+
+    Returns:
+        duckdb.DuckDBPyConnection
+    """
+    duckdb = _import_duckdb()
+
+    con = duckdb.connect()
+    temp_directory = temp_directory or os.path.join(tempfile.gettempdir(), "edretain_duckdb")
+    con.execute(f"SET memory_limit = '{memory_limit}'")
+    con.execute(f"SET threads = {int(threads or os.cpu_count() or 1)}")
+    con.execute(f"SET temp_directory = '{temp_directory}'")
+    con.execute("SET preserve_insertion_order = false")
+
+    if parquet_dir is not None:
+        for table in SOURCE_TABLES:
+            source = _parquet_source(parquet_dir, table)
+            con.execute(f"CREATE VIEW {table} AS SELECT * FROM read_parquet('{source}')")
+        logger.info(f"[connect] DuckDB reading Parquet exports from {parquet_dir}")
+    else:
+        con.execute("INSTALL postgres")
+        con.execute("LOAD postgres")
+        con.execute(f"ATTACH '{_postgres_dsn(database_url or DATABASE_URL)}' AS pg (TYPE postgres, READ_ONLY)")
+        for table in SOURCE_TABLES:
+            con.execute(f"CREATE VIEW {table} AS SELECT * FROM pg.public.{table}")
+        logger.info("[connect] DuckDB attached to PostgreSQL")
+
+    return con
+
+
+def export_to_parquet(con, parquet_dir: str, tables=SOURCE_TABLES):
+    """
+    Stream the source tables of a connection to <parquet_dir>/<table>.parquet.
+
+    Run once against an attached database to take a Parquet export that later
+    runs can read with connect(parquet_dir=...).
+    """
+    os.makedirs(parquet_dir, exist_ok=True)
+    for table in tables:
+        path = os.path.join(parquet_dir, f"{table}.parquet")
+        con.execute(f"COPY (SELECT * FROM {table}) TO '{path}' (FORMAT parquet)")
+        logger.info(f"[export_to_parquet] Exported {table} to {path}")
+
+
+def calculate_total_lifetime_revenue(con) -> pd.DataFrame:
+    """
+    Same result as helpers.calculate_total_lifetime_revenue, computed in DuckDB.
+
+    Per (user, premium plan) the unique billing periods are counted (months for
+    monthly plans, years for yearly/annual ones) and multiplied by base_price,
+    then summed per user.
+    """
+    revenue_df = con.execute(f"""
+        WITH {_PLAN_REVENUE_CTE}
+        SELECT user_key,
+               SUM(billing_cycles_paid * base_price) AS total_lifetime_revenue,
+               SUM(billing_cycles_paid) AS total_billing_cycles
+        FROM plan_revenue
+        GROUP BY user_key
+    """).df()
+
+    logger.info(f"[calculate_total_lifetime_revenue] Calculated lifetime revenue for {len(revenue_df)} users (DuckDB)")
+    return revenue_df
+
+
+def compute_basic_rfm(con) -> pd.DataFrame:
+    """
+    Raw RFM metrics per user, matching compute_basic_rfm in RFM_KPI.ipynb.
+
+    - Recency: days_since_last_login from the most recent record
+    - Frequency: active_days_last_30d from the most recent record
+    - Monetary: total lifetime revenue (0 for users without paid periods)
+    """
+    rfm_df = con.execute(f"""
+        WITH latest AS (
+            SELECT user_key, days_since_last_login, active_days_last_30d, subscription_plan_key
+            FROM fact_user_daily_activity
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY user_key ORDER BY date_key DESC) = 1
+        ),
+        {_PLAN_REVENUE_CTE},
+        revenue AS (
+            SELECT user_key, SUM(billing_cycles_paid * base_price) AS total_lifetime_revenue
+            FROM plan_revenue
+            GROUP BY user_key
+        )
+        SELECT l.user_key,
+               l.days_since_last_login AS rfm_recency,
+               l.active_days_last_30d AS rfm_frequency,
+               l.subscription_plan_key,
+               COALESCE(r.total_lifetime_revenue, 0) AS rfm_monetary
+        FROM latest l
+        LEFT JOIN revenue r USING (user_key)
+    """).df()
+
+    logger.info(f"[compute_basic_rfm] Computed RFM for {len(rfm_df)} users (DuckDB)")
+    return rfm_df
+
+
+def compute_churn_features(con, through_date_key: int, window_days: int = 90) -> pd.DataFrame:
+    """
+    90-day activity features for the churn model, named as in churn_probability.ipynb.
+
+    Aggregates the window_days ending at through_date_key; has_downgraded is set
+    when the user's latest plan in the window is below their highest plan.
+    """
+    start_date = datetime.strptime(str(through_date_key), "%Y%m%d") - timedelta(days=window_days - 1)
+    start_date_key = int(start_date.strftime("%Y%m%d"))
+
+    features_df = con.execute("""
+        SELECT user_key,
+               SUM(logins_count) AS logins_90d,
+               SUM(sessions_count) AS sessions_90d,
+               SUM(minutes_watched) AS minutes_watched_90d,
+               SUM(lessons_completed) AS lessons_completed_90d,
+               SUM(quizzes_attempted) AS quizzes_attempted_90d,
+               MAX(distinct_courses_accessed) AS courses_accessed,
+               AVG(active_days_last_30d) AS avg_active_days_30d,
+               MIN(days_since_last_login) AS days_since_last_login,
+               SUM(CASE WHEN is_inactive_7d_flag THEN 1 ELSE 0 END) AS inactive_7d_count,
+               MAX(active_courses_count) AS active_courses,
+               MAX(completed_courses_total) AS completed_courses,
+               CAST(ARG_MAX(subscription_plan_key, date_key) < MAX(subscription_plan_key) AS INTEGER) AS has_downgraded
+        FROM fact_user_daily_activity
+        WHERE date_key BETWEEN ? AND ?
+        GROUP BY user_key
+    """, [start_date_key, through_date_key]).df()
+
+    logger.info(f"[compute_churn_features] Computed {window_days}-day churn features for {len(features_df)} users (DuckDB)")
+    return features_df
+
+
+def compute_campaign_rollups(con, snapshot_date_key: int) -> pd.DataFrame:
+    """
+    Per-campaign interaction funnel plus retention of the reached users in one snapshot.
+
+    Retained follows Campaign Analysis.ipynb: not Dormant Premium / Recently Churned
+    and churn_probability < 0.5.
+    """
+    rollup_df = con.execute("""
+        WITH snapshot AS (
+            SELECT user_key,
+                   CAST(segment_label NOT IN ('Recently Churned', 'Dormant Premium')
+                        AND churn_probability < 0.5 AS INTEGER) AS is_retained
+            FROM fact_user_analytics_snapshot
+            WHERE snapshot_date_key = ?
+        ),
+        funnel AS (
+            SELECT campaign_key,
+                   COUNT(DISTINCT user_key) AS users_reached,
+                   SUM(CAST(sent_flag AS INTEGER)) AS users_sent,
+                   SUM(CAST(opened_flag AS INTEGER)) AS users_opened,
+                   SUM(CAST(clicked_flag AS INTEGER)) AS users_clicked,
+                   SUM(CAST(converted_flag AS INTEGER)) AS users_converted
+            FROM fact_campaign_interaction
+            GROUP BY campaign_key
+        ),
+        retention AS (
+            SELECT i.campaign_key,
+                   COUNT(s.user_key) AS users_in_snapshot,
+                   SUM(s.is_retained) AS users_retained
+            FROM (SELECT DISTINCT campaign_key, user_key FROM fact_campaign_interaction) i
+            JOIN snapshot s USING (user_key)
+            GROUP BY i.campaign_key
+        )
+        SELECT c.campaign_key, c.campaign_name, c.target_risk_segment, c.campaign_type,
+               f.users_reached, f.users_sent, f.users_opened, f.users_clicked, f.users_converted,
+               CASE WHEN f.users_sent > 0 THEN f.users_opened * 100.0 / f.users_sent ELSE 0 END AS open_rate,
+               COALESCE(r.users_in_snapshot, 0) AS users_in_snapshot,
+               COALESCE(r.users_retained, 0) AS users_retained
+        FROM dim_campaign c
+        JOIN funnel f USING (campaign_key)
+        LEFT JOIN retention r USING (campaign_key)
+        ORDER BY c.campaign_key
+    """, [snapshot_date_key]).df()
+
+    logger.info(f"[compute_campaign_rollups] Rolled up {len(rollup_df)} campaigns for snapshot {snapshot_date_key} (DuckDB)")
+    return rollup_df
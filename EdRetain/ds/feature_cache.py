@@ -0,0 +1,166 @@
+"""
+On-disk cache of per-snapshot feature matrices.
+
+Each matrix is stored as three files under FEATURE_CACHE_DIR:
+- <name>_<snapshot>.npy: float32 matrix, one row per user (C order)
+- <name>_<snapshot>_user_key.npy: int64 user_key of every row
+- <name>_<snapshot>.json: column names, shape, the snapshot columns it was
+  built from and any extra metadata (e.g. the churn engagement scale)
+
+open_feature_matrix maps the .npy files read-only (np.load(mmap_mode='r')),
+so repeated stages skip the database and parallel worker processes share one
+page-cache copy of the features instead of each receiving a pickled array.
+
+Files are written to a temporary name and renamed, so readers never see a
+partial matrix. helpers.update_snapshot_columns / save_results_bulk call
+invalidate_feature_cache when snapshot columns a matrix depends on change.
+"""
+import glob
+import json
+import os
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from loguru import logger
+
+FEATURE_CACHE_DIR = os.getenv(
+    "FEATURE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "feature_cache")
+)
+
+
+def _paths(name: str, snapshot_date_key: int) -> dict:
+    base = os.path.join(FEATURE_CACHE_DIR, f"{name}_{snapshot_date_key}")
+    return {
+        'matrix': f"{base}.npy",
+        'user_key': f"{base}_user_key.npy",
+        'meta': f"{base}.json",
+    }
+
+
+def _save_atomic(path: str, array: np.ndarray):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def write_feature_matrix(
+    name: str,
+    snapshot_date_key: int,
+    user_keys,
+    X,
+    columns: list = None,
+    source_columns: list = None,
+    meta: dict = None,
+) -> str:
+    """
+    Store a feature matrix and its user_key index for one snapshot.
+
+    Args:
+        name: Matrix name, e.g. 'churn_features'.
+        user_keys: user_key of every row of X.
+        X: DataFrame or 2-D array (stored as float32).
+        columns: Column names (default: X.columns).
+        source_columns: Snapshot columns the matrix is derived from; updating any
+            of them invalidates the cache (None: only a full snapshot rewrite does).
+        meta: Extra JSON-serializable metadata returned by open_feature_matrix.
+
+    Returns:
+        Path of the matrix file.
+    """
+    if columns is None:
+        columns = list(X.columns)
+    matrix = np.ascontiguousarray(np.asarray(X, dtype=np.float32))
+    if matrix.shape != (len(user_keys), len(columns)):
+        raise ValueError(f"[write_feature_matrix] Matrix shape {matrix.shape} does not match "
+                         f"{len(user_keys)} user keys x {len(columns)} columns")
+
+    os.makedirs(FEATURE_CACHE_DIR, exist_ok=True)
+    paths = _paths(name, snapshot_date_key)
+    _save_atomic(paths['matrix'], matrix)
+    _save_atomic(paths['user_key'], np.asarray(user_keys, dtype=np.int64))
+
+    tmp_meta = f"{paths['meta']}.{os.getpid()}.tmp"
+    with open(tmp_meta, 'w') as f:
+        json.dump({
+            'name': name,
+            'snapshot_date_key': snapshot_date_key,
+            'columns': list(columns),
+            'shape': list(matrix.shape),
+            'source_columns': source_columns,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'meta': meta or {},
+        }, f)
+    # The metadata file is renamed last: it marks the entry as complete
+    os.replace(tmp_meta, paths['meta'])
+
+    logger.info(f"[write_feature_matrix] Cached {name} for snapshot {snapshot_date_key}: "
+                f"{matrix.shape[0]:,} x {matrix.shape[1]} ({matrix.nbytes / 1e6:.1f} MB)")
+    return paths['matrix']
+
+
+def open_feature_matrix(name: str, snapshot_date_key: int):
+    """
+    Memory-map a cached feature matrix read-only.
+
+    Returns:
+        (user_keys, X, info) with X an np.memmap of shape (users, columns) and
+        info the stored metadata (columns, meta, ...), or None on a cache miss.
+    """
+    paths = _paths(name, snapshot_date_key)
+    if not os.path.exists(paths['meta']):
+        return None
+
+    with open(paths['meta']) as f:
+        info = json.load(f)
+    try:
+        X = np.load(paths['matrix'], mmap_mode='r')
+        user_keys = np.load(paths['user_key'], mmap_mode='r')
+    except FileNotFoundError:
+        return None
+
+    if list(X.shape) != info['shape'] or len(user_keys) != X.shape[0]:
+        logger.warning(f"[open_feature_matrix] Inconsistent cache entry {name} for {snapshot_date_key}, ignoring")
+        return None
+    return user_keys, X, info
+
+
+def feature_frame(user_keys, X, columns: list) -> pd.DataFrame:
+    """
+    DataFrame view over a (memory-mapped) matrix, without copying the values.
+    """
+    df = pd.DataFrame(X, columns=columns, copy=False)
+    df.insert(0, 'user_key', np.asarray(user_keys))
+    return df
+
+
+def invalidate_feature_cache(snapshot_date_key: int, columns: list = None) -> int:
+    """
+    Delete a snapshot's cached matrices built from any of columns
+    (all of the snapshot's matrices when columns is None).
+
+    Returns:
+        Number of matrices removed.
+    """
+    removed = 0
+    for meta_path in glob.glob(os.path.join(FEATURE_CACHE_DIR, f"*_{snapshot_date_key}.json")):
+        try:
+            with open(meta_path) as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if info.get('snapshot_date_key') != snapshot_date_key:
+            continue
+
+        sources = info.get('source_columns')
+        if columns is not None and (sources is None or not set(columns) & set(sources)):
+            continue
+
+        # Already-open memmaps keep working after the files are unlinked
+        paths = _paths(info['name'], snapshot_date_key)
+        for path in (paths['meta'], paths['matrix'], paths['user_key']):
+            if os.path.exists(path):
+                os.remove(path)
+        removed += 1
+        logger.info(f"[invalidate_feature_cache] Dropped cached {info['name']} for snapshot {snapshot_date_key}")
+    return removed
@@ -0,0 +1,298 @@
+"""
+Incrementally maintained per-user feature store for the churn model.
+
+user_feature_store keeps one narrow row per user with 7/30/90-day rolling sums
+of the daily activity. Each new day is applied as a delta: the day's activity
+is added and the day that falls out of each window is subtracted, so a daily
+refresh only reads four days of fact_user_daily_activity instead of the whole
+history. Training and scoring both read the store through load_churn_features().
+
+A delta leaves the store with the same features as rebuild_feature_store for
+the same date: the highest plan is re-read over the 90-day window for the
+users whose window gained or lost a day, and users left without activity in
+the window are evicted. Only updated_through_date_key differs: a delta sets it
+on the rows it touched, the watermark in feature_store_state covers the rest.
+"""
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+from loguru import logger
+from sqlalchemy import text, bindparam
+from Database.database import engine
+
+STORE_NAME = "user_feature_store"
+WINDOWS = (7, 30, 90)
+
+# Store column prefix -> per-row expression over fact_user_daily_activity
+WINDOWED_FEATURES = {
+    "logins": "logins_count",
+    "sessions": "sessions_count",
+    "minutes_watched": "minutes_watched",
+    "lessons_completed": "lessons_completed",
+    "quizzes_attempted": "quizzes_attempted",
+    "active_days_sum": "active_days_last_30d",
+    "inactive_flag_days": "CASE WHEN is_inactive_7d_flag THEN 1 ELSE 0 END",
+    "activity_days": "1",
+}
+
+# Latest-row attributes: store column -> aggregate over the newest day's rows
+LATEST_FEATURES = {
+    "days_since_last_login": "MIN(days_since_last_login)",
+    "distinct_courses_accessed": "MAX(distinct_courses_accessed)",
+    "active_courses_count": "MAX(active_courses_count)",
+    "completed_courses_total": "MAX(completed_courses_total)",
+    "subscription_plan_key": "MAX(subscription_plan_key)",
+}
+
+
+def _window_value(expr: str) -> str:
+    """Per-row windowed value; NULL counts as 0 so deltas and rebuilds sum the same way."""
+    return f"COALESCE({expr}, 0)"
+
+
+def _shift_date_key(date_key: int, days: int) -> int:
+    """Return the YYYYMMDD key `days` days after (or before, if negative) date_key."""
+    dt = datetime.strptime(str(date_key), "%Y%m%d") + timedelta(days=days)
+    return int(dt.strftime("%Y%m%d"))
+
+
+def _windowed_columns():
+    return [f"{name}_{w}d" for name in WINDOWED_FEATURES for w in WINDOWS]
+
+
+def _store_columns():
+    return ["user_key", "updated_through_date_key"] + _windowed_columns() + [
+        "last_activity_date_key", *LATEST_FEATURES, "max_subscription_plan_key"
+    ]
+
+
+def _set_watermark(conn, through_date_key: int):
+    conn.execute(text("""
+        INSERT INTO feature_store_state (store_name, through_date_key, updated_at)
+        VALUES (:store_name, :through, :updated_at)
+        ON CONFLICT (store_name) DO UPDATE
+        SET through_date_key = excluded.through_date_key,
+            updated_at = excluded.updated_at
+    """), {"store_name": STORE_NAME, "through": through_date_key, "updated_at": datetime.now(timezone.utc)})
+
+
+def get_watermark() -> int:
+    """Return the last date_key applied to the feature store, or None if never built."""
+    with engine.connect() as conn:
+        return conn.execute(
+            text("SELECT through_date_key FROM feature_store_state WHERE store_name = :store_name"),
+            {"store_name": STORE_NAME},
+        ).scalar()
+
+
+def rebuild_feature_store(through_date_key: int):
+    """
+    Rebuild the whole store from the last 90 days of activity ending at through_date_key.
+
+    Used once to seed the store (or after a backfill of the activity table);
+    daily refreshes go through apply_daily_delta.
+    """
+    window_start = {w: _shift_date_key(through_date_key, -w + 1) for w in WINDOWS}
+    sums = ",\n".join(
+        f"SUM(CASE WHEN a.date_key >= {window_start[w]} THEN {_window_value(expr)} ELSE 0 END) AS {name}_{w}d"
+        for name, expr in WINDOWED_FEATURES.items() for w in WINDOWS
+    )
+    latest = ",\n".join(f"{agg} AS {col}" for col, agg in LATEST_FEATURES.items())
+    columns = ", ".join(_store_columns())
+
+    sql = f"""
+        INSERT INTO user_feature_store ({columns})
+        SELECT w.user_key, :through, {", ".join(_windowed_columns())},
+               l.last_activity_date_key, {", ".join(LATEST_FEATURES)}, w.max_subscription_plan_key
+        FROM (
+            SELECT a.user_key,
+                   {sums},
+                   MAX(a.subscription_plan_key) AS max_subscription_plan_key
+            FROM fact_user_daily_activity a
+            WHERE a.date_key BETWEEN :start AND :through
+            GROUP BY a.user_key
+        ) w
+        JOIN (
+            SELECT a.user_key, a.date_key AS last_activity_date_key,
+                   {latest}
+            FROM fact_user_daily_activity a
+            JOIN (
+                SELECT user_key, MAX(date_key) AS date_key
+                FROM fact_user_daily_activity
+                WHERE date_key <= :through
+                GROUP BY user_key
+            ) m ON m.user_key = a.user_key AND m.date_key = a.date_key
+            GROUP BY a.user_key, a.date_key
+        ) l ON l.user_key = w.user_key
+    """
+
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM user_feature_store"))
+        conn.execute(text(sql), {"start": window_start[max(WINDOWS)], "through": through_date_key})
+        _set_watermark(conn, through_date_key)
+
+    logger.info(f"[rebuild_feature_store] Rebuilt {STORE_NAME} through {through_date_key}")
+
+
+def apply_daily_delta(date_key: int):
+    """
+    Roll every window forward by one day to date_key.
+
+    Reads only the rows for date_key and for the days leaving each window
+    (date_key - 7, - 30, - 90), aggregates them into one signed delta per user
+    and upserts it into the store in a single statement. The users with rows
+    on date_key or date_key - 90 then get their highest plan re-read over the
+    new 90-day window, and those without any activity left in it are removed.
+    """
+    dropped = {w: _shift_date_key(date_key, -w) for w in WINDOWS}
+    window_start = _shift_date_key(date_key, -max(WINDOWS) + 1)
+    deltas = ",\n".join(
+        f"SUM(CASE WHEN date_key = :day THEN {_window_value(expr)} "
+        f"WHEN date_key = {dropped[w]} THEN -({_window_value(expr)}) ELSE 0 END) AS {name}_{w}d"
+        for name, expr in WINDOWED_FEATURES.items() for w in WINDOWS
+    )
+    latest = ",\n".join(f"{agg} AS {col}" for col, agg in LATEST_FEATURES.items())
+    windowed = _windowed_columns()
+    columns = ", ".join(_store_columns())
+
+    set_windowed = ",\n".join(f"{c} = user_feature_store.{c} + excluded.{c}" for c in windowed)
+    # A day with activity replaces the latest-row attributes as a whole (NULLs included)
+    set_latest = ",\n".join(
+        f"{c} = CASE WHEN excluded.last_activity_date_key IS NOT NULL "
+        f"THEN excluded.{c} ELSE user_feature_store.{c} END"
+        for c in [*LATEST_FEATURES, "last_activity_date_key"]
+    )
+
+    sql = f"""
+        INSERT INTO user_feature_store ({columns})
+        SELECT d.user_key, :day, {", ".join(f"d.{c}" for c in windowed)},
+               l.last_activity_date_key, {", ".join(f"l.{c}" for c in LATEST_FEATURES)},
+               l.subscription_plan_key
+        FROM (
+            SELECT user_key,
+                   {deltas}
+            FROM fact_user_daily_activity
+            WHERE date_key IN (:day, {", ".join(str(k) for k in dropped.values())})
+            GROUP BY user_key
+        ) d
+        LEFT JOIN (
+            SELECT user_key, date_key AS last_activity_date_key,
+                   {latest}
+            FROM fact_user_daily_activity
+            WHERE date_key = :day
+            GROUP BY user_key, date_key
+        ) l ON l.user_key = d.user_key
+        WHERE 1 = 1
+        ON CONFLICT (user_key) DO UPDATE SET
+            {set_windowed},
+            {set_latest},
+            updated_through_date_key = excluded.updated_through_date_key
+    """
+
+    # Only the day entering and the day leaving the 90-day window can change a user's highest plan
+    edge_users = """
+        SELECT user_key FROM fact_user_daily_activity WHERE date_key IN (:day, :dropped)
+    """
+    max_plan_sql = f"""
+        UPDATE user_feature_store
+        SET max_subscription_plan_key = (
+            SELECT MAX(a.subscription_plan_key)
+            FROM fact_user_daily_activity a
+            WHERE a.user_key = user_feature_store.user_key
+              AND a.date_key BETWEEN :start AND :day
+        )
+        WHERE user_key IN ({edge_users})
+    """
+    evict_sql = f"""
+        DELETE FROM user_feature_store
+        WHERE activity_days_{max(WINDOWS)}d = 0
+          AND user_key IN (SELECT user_key FROM fact_user_daily_activity WHERE date_key = :dropped)
+    """
+    edge_params = {"day": date_key, "dropped": dropped[max(WINDOWS)], "start": window_start}
+
+    with engine.begin() as conn:
+        result = conn.execute(text(sql), {"day": date_key})
+        conn.execute(text(max_plan_sql), edge_params)
+        evicted = conn.execute(text(evict_sql), {"dropped": dropped[max(WINDOWS)]}).rowcount
+        _set_watermark(conn, date_key)
+
+    logger.info(f"[apply_daily_delta] Applied {date_key} to {STORE_NAME} ({result.rowcount} users touched, "
+                f"{evicted} evicted)")
+
+
+def refresh_feature_store(through_date_key: int = None):
+    """
+    Bring the store up to through_date_key (default: latest activity date).
+
+    Seeds the store with a full rebuild on first use, then applies one daily
+    delta per missing day, so a nightly run costs one day of activity.
+    """
+    if through_date_key is None:
+        with engine.connect() as conn:
+            through_date_key = conn.execute(text("SELECT MAX(date_key) FROM fact_user_daily_activity")).scalar()
+        if through_date_key is None:
+            logger.warning("[refresh_feature_store] No activity rows found, nothing to do")
+            return
+
+    watermark = get_watermark()
+    if watermark is None:
+        rebuild_feature_store(through_date_key)
+        return
+
+    day = _shift_date_key(watermark, 1)
+    while day <= through_date_key:
+        apply_daily_delta(day)
+        day = _shift_date_key(day, 1)
+
+
+def load_churn_features(user_keys=None) -> pd.DataFrame:
+    """
+    Read the store and return the activity features used by the churn model,
+    named as in churn_probability.ipynb (logins_90d, avg_active_days_30d, ...).
+
+    Args:
+        user_keys: Optional iterable of user_key values to restrict the read.
+    """
+    query = text(f"SELECT {', '.join(_store_columns())} FROM user_feature_store")
+    params = {}
+    if user_keys is not None:
+        query = text(f"{query.text} WHERE user_key IN :user_keys").bindparams(
+            bindparam("user_keys", expanding=True)
+        )
+        params = {"user_keys": [int(k) for k in user_keys]}
+
+    with engine.connect() as conn:
+        store_df = pd.read_sql(query, conn, params=params)
+
+    features = pd.DataFrame({
+        'user_key': store_df['user_key'],
+        'logins_90d': store_df['logins_90d'],
+        'sessions_90d': store_df['sessions_90d'],
+        'minutes_watched_90d': store_df['minutes_watched_90d'],
+        'lessons_completed_90d': store_df['lessons_completed_90d'],
+        'quizzes_attempted_90d': store_df['quizzes_attempted_90d'],
+        'courses_accessed': store_df['distinct_courses_accessed'],
+        'avg_active_days_30d': np.where(
+            store_df['activity_days_90d'] > 0,
+            store_df['active_days_sum_90d'] / store_df['activity_days_90d'].where(store_df['activity_days_90d'] > 0, 1),
+            0
+        ),
+        'days_since_last_login': store_df['days_since_last_login'],
+        'inactive_7d_count': store_df['inactive_flag_days_90d'],
+        'active_courses': store_df['active_courses_count'],
+        'completed_courses': store_df['completed_courses_total'],
+        'has_downgraded': (
+            store_df['subscription_plan_key'] < store_df['max_subscription_plan_key']
+        ).astype(int),
+        'logins_7d': store_df['logins_7d'],
+        'logins_30d': store_df['logins_30d'],
+        'minutes_watched_7d': store_df['minutes_watched_7d'],
+        'minutes_watched_30d': store_df['minutes_watched_30d'],
+    })
+
+    logger.info(f"[load_churn_features] Loaded churn features for {len(features):,} users from {STORE_NAME}")
+    return features
+
+
+if __name__ == "__main__":
+    refresh_feature_store()
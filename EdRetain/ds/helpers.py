@@ -1,12 +1,44 @@
+import io
+import json
+import numpy as np
 import pandas as pd
-from sqlalchemy import text
+from sqlalchemy import text, Integer, update, bindparam
 from Database.database import engine
 from loguru import logger
 from sqlalchemy.orm import Session
-from Database.models import DimDate
-from datetime import datetime
+from Database.models import (
+    DimDate, CampaignPerformance, CampaignSegmentMix, ChurnReasons, DashboardMetrics, FeatureImportance, ModelPerformanceMetrics,
+    FactUserAnalyticsSnapshot, SurvivalCurve, RfmQuantileSketch
+)
+from datetime import datetime, timezone
+from feature_cache import invalidate_feature_cache
+from latest_snapshot import (
+    LATEST_SNAPSHOT_TABLE, SOURCE_COLUMNS, refresh_latest_user_snapshot, latest_published_key, published_user_keys
+)
+from risk_histogram import RISK_HISTOGRAM_TABLE, SOURCE_COLUMNS as RISK_SOURCE_COLUMNS, refresh_risk_histogram
+from profiling import profiled
 
 
+# Result tables written once per snapshot, mapped to the extra columns that scope
+# a "replace" (e.g. feature importance of the churn model must not wipe the CLV model's rows)
+RESULT_TABLES = {
+    "campaign_performance": (CampaignPerformance, ()),
+    "campaign_segment_mix": (CampaignSegmentMix, ()),
+    "churn_reasons": (ChurnReasons, ()),
+    "dashboard_metrics": (DashboardMetrics, ()),
+    "fact_user_analytics_snapshot": (FactUserAnalyticsSnapshot, ()),
+    "feature_importance": (FeatureImportance, ("model_type",)),
+    "model_performance_metrics": (ModelPerformanceMetrics, ("model_type",)),
+    "survival_curves": (SurvivalCurve, ()),
+    "rfm_quantile_sketches": (RfmQuantileSketch, ()),
+}
+
+# PostgreSQL NOTIFY channel announcing result-table writes; the API drops its
+# cached responses for the table (must match api/response_cache.py)
+RESULT_TABLES_CHANNEL = "result_tables_updated"
+
+
+@profiled()
 def load_user_activity_and_subscription_dfs():
     """
     Load fact_user_daily_activity and dim_subscription_plan tables into pandas DataFrames.
@@ -31,6 +63,7 @@ def load_user_activity_and_subscription_dfs():
     return merged_df
 
 
+@profiled()
 def calculate_total_lifetime_revenue(merged_df: pd.DataFrame) -> pd.DataFrame:
     """
     Calculate total lifetime monetary value for each user based on unique billing periods
@@ -108,6 +141,49 @@ def calculate_total_lifetime_revenue(merged_df: pd.DataFrame) -> pd.DataFrame:
     return revenue_df
 
 
+def notify_table_updated(conn, table_name: str, snapshot_date_keys=None):
+    """
+    Announce a write to table_name on RESULT_TABLES_CHANNEL. Sent inside the
+    writing transaction, so listeners only hear about committed data.
+    No-op on databases without LISTEN/NOTIFY.
+    """
+    if conn.dialect.name != "postgresql":
+        return
+    payload = json.dumps({
+        "table": table_name,
+        "snapshot_date_keys": sorted(int(k) for k in snapshot_date_keys or []),
+    })
+    conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": RESULT_TABLES_CHANNEL, "payload": payload})
+
+
+def publish_latest_snapshot(conn, snapshot_date_keys, columns: list = None, user_keys=None):
+    """
+    Refresh the latest_user_snapshot rows of user_keys (all users when None)
+    inside the writing transaction when the write touched the newest snapshot
+    (and, for column updates, one of its SOURCE_COLUMNS).
+    Writes to older snapshots (backfills) leave it alone.
+    """
+    if columns is not None and not set(columns) & set(SOURCE_COLUMNS):
+        return
+    published_key = latest_published_key(conn)
+    if published_key is not None and max(int(k) for k in snapshot_date_keys) < published_key:
+        return
+    refresh_latest_user_snapshot(conn, user_keys)
+    notify_table_updated(conn, LATEST_SNAPSHOT_TABLE, snapshot_date_keys)
+
+
+def publish_risk_histogram(conn, snapshot_date_keys, columns: list = None):
+    """
+    Rebuild the written snapshots' risk_histogram rows inside the writing
+    transaction (for column updates, only when one of its SOURCE_COLUMNS changed).
+    """
+    if columns is not None and not set(columns) & set(RISK_SOURCE_COLUMNS):
+        return
+    refresh_risk_histogram(conn, snapshot_date_keys)
+    notify_table_updated(conn, RISK_HISTOGRAM_TABLE, snapshot_date_keys)
+
+
+@profiled()
 def save_snapshot_to_db(snapshot_df: pd.DataFrame, table_name: str = "fact_user_analytics_snapshot"):
     """
     Save the final user analytics snapshot DataFrame to the database.
@@ -115,6 +191,11 @@ def save_snapshot_to_db(snapshot_df: pd.DataFrame, table_name: str = "fact_user_
     try:
         with engine.begin() as conn:
             snapshot_df.to_sql(table_name, con=conn, if_exists="append", index=False, method="multi")
+            snapshot_keys = snapshot_df["snapshot_date_key"].dropna().unique()
+            notify_table_updated(conn, table_name, snapshot_keys)
+            if table_name == "fact_user_analytics_snapshot" and len(snapshot_keys):
+                publish_latest_snapshot(conn, snapshot_keys, user_keys=snapshot_df["user_key"].dropna().unique())
+                publish_risk_histogram(conn, snapshot_keys)
         logger.info(f"Saved analytics snapshot to table: {table_name}")
     except Exception as e:
         logger.error(f"Error saving snapshot to database table {table_name}: {e}")
@@ -144,6 +225,7 @@ def save_dashboard_metrics_to_db(metrics_dict: dict):
                 index=False, 
                 method='multi'
             )
+            notify_table_updated(conn, 'dashboard_metrics', [metrics_dict['snapshot_date_key']])
         logger.info(f"Dashboard metrics saved to database for snapshot {metrics_dict['snapshot_date_key']}")
         
     except Exception as e:
@@ -169,3 +251,199 @@ def ensure_snapshot_date(session: Session, snapshot_date_key: int):
         )
         session.add(dim_date)
         session.commit()
+
+
+def _prepare_bulk_frame(df: pd.DataFrame, table) -> pd.DataFrame:
+    """
+    Align a result DataFrame with the target table: keep only known columns,
+    fill created_at, and use nullable integers so NaN does not turn ints into floats.
+    """
+    columns = [c for c in table.columns if not (c.primary_key and c.autoincrement)]
+    column_names = [c.name for c in columns]
+
+    dropped = [c for c in df.columns if c not in column_names]
+    if dropped:
+        logger.debug(f"[save_results_bulk] Ignoring columns not in {table.name}: {dropped}")
+
+    out = df[[c for c in column_names if c in df.columns]].copy()
+    if "created_at" in column_names and "created_at" not in out.columns:
+        out["created_at"] = datetime.now(timezone.utc)
+
+    for column in columns:
+        if column.name in out.columns and isinstance(column.type, Integer):
+            out[column.name] = pd.to_numeric(out[column.name]).round().astype("Int64")
+
+    return out
+
+
+def _copy_dataframe(conn, table_name: str, df: pd.DataFrame):
+    """
+    Stream a DataFrame into a table with PostgreSQL COPY on the connection's own
+    DBAPI cursor, so it runs inside the caller's transaction.
+    """
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    columns = ", ".join(df.columns)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '')", buffer)
+    finally:
+        cursor.close()
+
+
+def save_results_bulk(df: pd.DataFrame, table_name: str, snapshot_date_key: int = None) -> int:
+    """
+    Replace one snapshot's rows in a DS result table with the given DataFrame.
+
+    Deletes the existing rows for snapshot_date_key (scoped by model_type where the
+    table has one) and inserts the whole DataFrame in a single transaction, using
+    COPY on PostgreSQL and one executemany elsewhere.
+
+    Args:
+        df: Result rows; columns must match the table (extra columns are ignored).
+        table_name: One of RESULT_TABLES.
+        snapshot_date_key: Snapshot to replace. Defaults to the key(s) found in df.
+
+    Returns:
+        Number of rows written.
+    """
+    if table_name not in RESULT_TABLES:
+        raise ValueError(f"Unsupported result table '{table_name}', expected one of {list(RESULT_TABLES)}")
+
+    model, scope_columns = RESULT_TABLES[table_name]
+    table = model.__table__
+
+    df = df.copy()
+    if snapshot_date_key is not None:
+        df["snapshot_date_key"] = snapshot_date_key
+    if "snapshot_date_key" not in df.columns:
+        raise ValueError(f"[save_results_bulk] snapshot_date_key is required for {table_name}")
+
+    bulk_df = _prepare_bulk_frame(df, table)
+    snapshot_keys = [int(k) for k in bulk_df["snapshot_date_key"].dropna().unique()]
+
+    delete_stmt = table.delete().where(table.c.snapshot_date_key.in_(snapshot_keys))
+    for column in scope_columns:
+        if column in bulk_df.columns:
+            delete_stmt = delete_stmt.where(table.c[column].in_(bulk_df[column].dropna().unique().tolist()))
+
+    try:
+        with engine.begin() as conn:
+            deleted = conn.execute(delete_stmt).rowcount
+            if not bulk_df.empty and conn.dialect.name == "postgresql":
+                _copy_dataframe(conn, table_name, bulk_df)
+            elif not bulk_df.empty:
+                records = bulk_df.astype(object).where(bulk_df.notna(), None).to_dict("records")
+                conn.execute(table.insert(), records)
+            notify_table_updated(conn, table_name, snapshot_keys)
+            if table_name == "fact_user_analytics_snapshot" and snapshot_keys:
+                # Users dropped from a replaced snapshot are recomputed along with the written ones
+                touched_users = published_user_keys(conn, snapshot_keys) | set(bulk_df["user_key"].dropna().astype(int))
+                publish_latest_snapshot(conn, snapshot_keys, user_keys=touched_users)
+                publish_risk_histogram(conn, snapshot_keys)
+        logger.info(f"[save_results_bulk] Replaced {deleted} rows with {len(bulk_df)} rows in {table_name} "
+                    f"for snapshot(s) {snapshot_keys}")
+        if table_name == "fact_user_analytics_snapshot":
+            for key in snapshot_keys:
+                invalidate_feature_cache(key)
+    except Exception as e:
+        logger.error(f"Error bulk saving results to database table {table_name}: {e}")
+        raise
+
+    return len(bulk_df)
+
+
+def publish_snapshot_columns(snapshot_date_key: int, columns: list, user_keys=None):
+    """
+    Refresh the tables derived from snapshot columns (latest_user_snapshot,
+    risk_histogram) once, after a batched writer has written every batch with
+    update_snapshot_columns(..., publish=False).
+    """
+    with engine.begin() as conn:
+        publish_latest_snapshot(conn, [snapshot_date_key], columns, user_keys=user_keys)
+        publish_risk_histogram(conn, [snapshot_date_key], columns)
+
+
+def update_snapshot_columns(update_df: pd.DataFrame, snapshot_date_key: int, columns: list,
+                            publish: bool = True) -> int:
+    """
+    Set per-user model outputs (e.g. churn_probability, clv_value) on one snapshot in bulk.
+
+    On PostgreSQL the values are COPYed into a temporary table and applied with a
+    single UPDATE ... FROM join; other databases get one executemany UPDATE.
+
+    Args:
+        update_df: DataFrame with user_key and the columns to write.
+        snapshot_date_key: Snapshot whose rows are updated.
+        columns: Snapshot columns to set from update_df.
+        publish: Refresh latest_user_snapshot / risk_histogram in the same
+            transaction. Writers that update a snapshot in several batches pass
+            False and call publish_snapshot_columns after the last batch.
+
+    Returns:
+        Number of user rows sent.
+    """
+    table = FactUserAnalyticsSnapshot.__table__
+    unknown = [c for c in columns if c not in table.c]
+    if unknown:
+        raise ValueError(f"[update_snapshot_columns] Unknown snapshot columns: {unknown}")
+
+    values_df = _prepare_bulk_frame(update_df[["user_key"] + list(columns)], table)
+    if values_df.empty:
+        return 0
+
+    try:
+        with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                column_defs = ", ".join(
+                    f"{c} {table.c[c].type.compile(dialect=conn.dialect)}" for c in values_df.columns
+                )
+                conn.execute(text(f"CREATE TEMP TABLE tmp_snapshot_update ({column_defs}) ON COMMIT DROP"))
+                _copy_dataframe(conn, "tmp_snapshot_update", values_df)
+                assignments = ", ".join(f"{c} = t.{c}" for c in columns)
+                conn.execute(text(f"""
+                    UPDATE {table.name} AS s
+                    SET {assignments}
+                    FROM tmp_snapshot_update AS t
+                    WHERE s.user_key = t.user_key
+                      AND s.snapshot_date_key = :snapshot_date_key
+                """), {"snapshot_date_key": snapshot_date_key})
+            else:
+                stmt = (
+                    update(table)
+                    .where(table.c.user_key == bindparam("b_user_key"))
+                    .where(table.c.snapshot_date_key == snapshot_date_key)
+                    .values({c: bindparam(f"b_{c}") for c in columns})
+                )
+                records = values_df.astype(object).where(values_df.notna(), None).to_dict("records")
+                conn.execute(stmt, [{f"b_{k}": v for k, v in r.items()} for r in records])
+            notify_table_updated(conn, table.name, [snapshot_date_key])
+            if publish:
+                publish_latest_snapshot(conn, [snapshot_date_key], columns,
+                                        user_keys=values_df["user_key"].dropna().astype(int))
+                publish_risk_histogram(conn, [snapshot_date_key], columns)
+        logger.info(f"[update_snapshot_columns] Updated {columns} for {len(values_df)} users "
+                    f"in snapshot {snapshot_date_key}")
+        invalidate_feature_cache(snapshot_date_key, columns)
+    except Exception as e:
+        logger.error(f"Error updating snapshot {snapshot_date_key} columns {columns}: {e}")
+        raise
+
+    return len(values_df)
+
+
+def stratified_sample_index(strata: pd.Series, sample_size: int, seed: int = 42) -> np.ndarray:
+    """
+    Positional indices of a sample of about sample_size rows that keeps the
+    share of every stratum (e.g. subscription plan). Returns all rows if the
+    population is already smaller than sample_size.
+    """
+    n = len(strata)
+    if sample_size is None or n <= sample_size:
+        return np.arange(n)
+
+    positions = pd.Series(np.arange(n), index=strata.index)
+    sample = positions.groupby(strata.to_numpy()).sample(frac=sample_size / n, random_state=seed)
+    return np.sort(sample.to_numpy())
@@ -0,0 +1,160 @@
+"""
+Latest snapshot per user, materialized for the API.
+
+The learner endpoints need every user's latest analytics snapshot, latest
+daily-activity row and plan tier. Instead of rebuilding the
+max(snapshot_date_key) / max(date_key) GROUP BY user_key subqueries over both
+fact tables on every request, latest_user_snapshot holds one precomputed row
+per user (primary key user_key) that the endpoints read with indexed filters.
+
+Refreshes run in a single transaction (delete + INSERT ... SELECT), so
+readers keep seeing the previous version until the new one commits and are
+never blocked; concurrent refreshes are serialized with an advisory lock on
+PostgreSQL. A refresh is either scoped to the users a write touched (their
+rows are recomputed from their own snapshot and activity rows, through the
+(user_key, date) indexes) or a full rebuild. helpers.save_results_bulk /
+update_snapshot_columns refresh the written users when the latest snapshot
+is written; backfill_snapshots rebuilds the table once at the end.
+"""
+from datetime import datetime, timezone
+from loguru import logger
+from sqlalchemy import select, func, literal, text
+from Database.database import engine
+from Database.models import (
+    DimUser, DimSubscriptionPlan, FactUserDailyActivity, FactUserAnalyticsSnapshot, LatestUserSnapshot
+)
+
+LATEST_SNAPSHOT_TABLE = LatestUserSnapshot.__tablename__
+
+# Snapshot columns copied into latest_user_snapshot; updating any of them on the
+# latest snapshot triggers a refresh
+SOURCE_COLUMNS = [
+    'subscription_plan_key', 'rfm_r_score', 'rfm_f_score', 'rfm_m_score', 'rfm_segment',
+    'engagement_level', 'churn_probability', 'clv_value',
+]
+
+# Users recomputed per statement by a scoped refresh (keeps IN lists within bind-parameter limits)
+USER_KEY_CHUNK_SIZE = 5000
+
+
+def latest_snapshot_select(user_keys: list = None):
+    """
+    SELECT producing the latest_user_snapshot rows: each user's latest snapshot
+    (ties broken by the newest row) with the latest activity row, user and plan.
+    Restricted to user_keys when given.
+    """
+    snap = FactUserAnalyticsSnapshot
+    ranked_snap = select(
+        snap,
+        func.row_number().over(
+            partition_by=snap.user_key,
+            order_by=(snap.snapshot_date_key.desc(), snap.fact_user_analytics_snapshot_id.desc()),
+        ).label("rn"),
+    )
+
+    activity = FactUserDailyActivity
+    ranked_activity = select(
+        activity.user_key,
+        activity.date_key,
+        activity.days_since_last_login,
+        func.row_number().over(
+            partition_by=activity.user_key,
+            order_by=(activity.date_key.desc(), activity.fact_user_daily_activity_id.desc()),
+        ).label("rn"),
+    )
+
+    # Filtered before the windows, so only the given users' rows are ranked
+    if user_keys is not None:
+        ranked_snap = ranked_snap.where(snap.user_key.in_(user_keys))
+        ranked_activity = ranked_activity.where(activity.user_key.in_(user_keys))
+    ranked_snap, ranked_activity = ranked_snap.subquery(), ranked_activity.subquery()
+
+    s, a = ranked_snap.c, ranked_activity.c
+    return (
+        select(
+            s.user_key,
+            s.snapshot_date_key,
+            DimUser.user_id_nk,
+            DimUser.country,
+            s.subscription_plan_key,
+            DimSubscriptionPlan.tier,
+            s.rfm_r_score,
+            s.rfm_f_score,
+            s.rfm_m_score,
+            (func.coalesce(s.rfm_r_score, 0) + func.coalesce(s.rfm_f_score, 0)
+             + func.coalesce(s.rfm_m_score, 0)).label("rfm_score"),
+            s.rfm_segment,
+            s.engagement_level,
+            s.churn_probability,
+            s.clv_value,
+            a.date_key.label("activity_date_key"),
+            a.days_since_last_login,
+            literal(datetime.now(timezone.utc)).label("refreshed_at"),
+        )
+        .select_from(ranked_snap)
+        .join(DimUser, DimUser.user_key == s.user_key, isouter=True)
+        .join(DimSubscriptionPlan, DimSubscriptionPlan.subscription_plan_key == s.subscription_plan_key,
+              isouter=True)
+        .join(ranked_activity, (a.user_key == s.user_key) & (a.rn == 1), isouter=True)
+        .where(s.rn == 1, s.user_key.isnot(None))
+    )
+
+
+def refresh_latest_user_snapshot(conn=None, user_keys=None) -> int:
+    """
+    Recompute the latest_user_snapshot rows of user_keys (the whole table when
+    None) in one transaction (the caller's when conn is given). Users without
+    any snapshot left are removed.
+
+    Returns:
+        Number of rows written.
+    """
+    if conn is None:
+        with engine.begin() as conn:
+            return refresh_latest_user_snapshot(conn, user_keys)
+
+    table = LatestUserSnapshot.__table__
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": LATEST_SNAPSHOT_TABLE})
+
+    if user_keys is None:
+        conn.execute(table.delete())
+        query = latest_snapshot_select()
+        conn.execute(table.insert().from_select([c.name for c in query.selected_columns], query))
+        count = conn.execute(select(func.count()).select_from(table)).scalar()
+        logger.info(f"[refresh_latest_user_snapshot] Rebuilt {LATEST_SNAPSHOT_TABLE} with {count:,} users")
+        return count
+
+    user_keys = sorted({int(k) for k in user_keys})
+    count = 0
+    for start in range(0, len(user_keys), USER_KEY_CHUNK_SIZE):
+        chunk = user_keys[start:start + USER_KEY_CHUNK_SIZE]
+        conn.execute(table.delete().where(table.c.user_key.in_(chunk)))
+        query = latest_snapshot_select(chunk)
+        count += conn.execute(table.insert().from_select([c.name for c in query.selected_columns], query)).rowcount
+
+    logger.info(f"[refresh_latest_user_snapshot] Refreshed {count:,} of {len(user_keys):,} users "
+                f"in {LATEST_SNAPSHOT_TABLE}")
+    return count
+
+
+def published_user_keys(conn, snapshot_date_keys) -> set:
+    """
+    Users whose latest_user_snapshot row comes from one of snapshot_date_keys
+    (the users a replace of those snapshots may have removed).
+    """
+    keys = [int(k) for k in snapshot_date_keys]
+    return set(conn.execute(
+        select(LatestUserSnapshot.user_key).where(LatestUserSnapshot.snapshot_date_key.in_(keys))
+    ).scalars())
+
+
+def latest_published_key(conn) -> int:
+    """
+    Snapshot key of the newest row in latest_user_snapshot (None when empty).
+    """
+    return conn.execute(select(func.max(LatestUserSnapshot.snapshot_date_key))).scalar()
+
+
+if __name__ == "__main__":
+    refresh_latest_user_snapshot()
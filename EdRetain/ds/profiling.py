@@ -0,0 +1,187 @@
+"""
+Stage-level timing and resource instrumentation for the DS pipeline.
+
+profile_stage (context manager) and profiled (decorator) record, per stage:
+- wall time and CPU time of the process
+- peak Python memory via tracemalloc (opt-in, it slows allocation-heavy code)
+  and the process max RSS
+- rows in and rows out
+
+Every stage is logged through loguru with the stats bound as structured
+fields (logger.bind) and inserted into pipeline_run_stats under the current
+run id, so nightly runs can be compared stage by stage. Writing the stats
+never fails the stage itself.
+
+Usage:
+    @profiled("rfm.compute_basic_rfm")
+    def compute_basic_rfm(df): ...
+
+    with profile_stage("rfm.calculate_rfm_scores", snapshot_date_key=key) as stage:
+        stage.rows_in = len(rfm_df)
+        rfm_scored = ...
+        stage.rows_out = len(rfm_scored)
+"""
+import functools
+import inspect
+import os
+import resource
+import sys
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from loguru import logger
+from Database.database import engine
+from Database.models import PipelineRunStats
+
+# One id per process unless set by the scheduler, so a nightly run's stages group together
+PIPELINE_RUN_ID = os.getenv("PIPELINE_RUN_ID") or f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+TRACE_MEMORY = os.getenv("PIPELINE_TRACE_MEMORY", "0") == "1"
+RECORD_STATS = os.getenv("PIPELINE_RECORD_STATS", "1") == "1"
+
+
+class StageStats:
+    """
+    Mutable stats of one running stage; set rows_in / rows_out inside the block.
+    """
+    def __init__(self, stage: str, snapshot_date_key: int = None):
+        self.stage = stage
+        self.snapshot_date_key = snapshot_date_key
+        self.rows_in = None
+        self.rows_out = None
+        self.started_at = datetime.now(timezone.utc)
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.peak_memory_mb = None
+        self.max_rss_mb = None
+        self.status = "running"
+        self.error = None
+
+    def as_record(self) -> dict:
+        return {
+            'run_id': PIPELINE_RUN_ID,
+            'stage': self.stage,
+            'snapshot_date_key': self.snapshot_date_key,
+            'started_at': self.started_at,
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'peak_memory_mb': self.peak_memory_mb,
+            'max_rss_mb': self.max_rss_mb,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'status': self.status,
+            'error': self.error,
+        }
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+
+
+def _row_count(value):
+    """
+    Rows of a DataFrame / array / sized result, or an int result itself.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, tuple) and value:
+        return _row_count(value[0])
+    if hasattr(value, 'shape') and len(getattr(value, 'shape', ())) > 0:
+        return int(value.shape[0])
+    if hasattr(value, '__len__') and not isinstance(value, (str, bytes, dict)):
+        return len(value)
+    return None
+
+
+def record_stage_stats(stats: StageStats):
+    """
+    Insert one stage's stats into pipeline_run_stats (logged, never raised).
+    """
+    if not RECORD_STATS:
+        return
+    try:
+        with engine.begin() as conn:
+            conn.execute(PipelineRunStats.__table__.insert(), [{
+                **stats.as_record(), 'created_at': datetime.now(timezone.utc)
+            }])
+    except Exception as e:
+        logger.warning(f"[record_stage_stats] Could not save stats of stage {stats.stage}: {e}")
+
+
+@contextmanager
+def profile_stage(stage: str, snapshot_date_key: int = None, trace_memory: bool = None):
+    """
+    Time a block and record its stats (see module docstring).
+
+    Args:
+        stage: Stage name, e.g. 'helpers.calculate_total_lifetime_revenue'.
+        snapshot_date_key: Snapshot the stage works on, if any.
+        trace_memory: Track peak Python allocations with tracemalloc
+            (default: PIPELINE_TRACE_MEMORY=1).
+    """
+    stats = StageStats(stage, snapshot_date_key)
+    trace_memory = TRACE_MEMORY if trace_memory is None else trace_memory
+    # Nested stages share the outer trace; their peak is then measured from their own start
+    owns_trace = trace_memory and not tracemalloc.is_tracing()
+    if owns_trace:
+        tracemalloc.start()
+    elif trace_memory:
+        tracemalloc.reset_peak()
+
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield stats
+        stats.status = "success"
+    except BaseException as e:
+        stats.status = "failed"
+        stats.error = f"{type(e).__name__}: {e}"[:500]
+        raise
+    finally:
+        stats.wall_seconds = round(time.perf_counter() - wall_start, 4)
+        stats.cpu_seconds = round(time.process_time() - cpu_start, 4)
+        if trace_memory:
+            stats.peak_memory_mb = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+            if owns_trace:
+                tracemalloc.stop()
+        stats.max_rss_mb = round(_max_rss_mb(), 2)
+
+        logger.bind(**stats.as_record()).info(
+            f"[profile_stage] {stage}: {stats.status} in {stats.wall_seconds:.2f}s wall / "
+            f"{stats.cpu_seconds:.2f}s CPU, rows {stats.rows_in} -> {stats.rows_out}, "
+            f"peak {stats.peak_memory_mb} MB, max RSS {stats.max_rss_mb} MB"
+        )
+        record_stage_stats(stats)
+
+
+def profiled(stage: str = None, trace_memory: bool = None):
+    """
+    Decorator form of profile_stage.
+
+    rows_in is taken from the first positional argument that has rows (e.g. the
+    input DataFrame), rows_out from the return value, and snapshot_date_key from
+    the argument of that name when the function has one.
+    """
+    def decorator(func):
+        name = stage or f"{func.__module__}.{func.__name__}"
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                snapshot_date_key = signature.bind_partial(*args, **kwargs).arguments.get('snapshot_date_key')
+            except TypeError:
+                snapshot_date_key = None
+            with profile_stage(name, snapshot_date_key=snapshot_date_key, trace_memory=trace_memory) as stats:
+                stats.rows_in = next(
+                    (n for n in (_row_count(a) for a in args if not isinstance(a, int)) if n is not None), None
+                )
+                result = func(*args, **kwargs)
+                stats.rows_out = _row_count(result)
+                return result
+        return wrapper
+    return decorator
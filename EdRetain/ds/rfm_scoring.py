@@ -0,0 +1,386 @@
+"""
+Streaming RFM scoring with mergeable quantile sketches.
+
+RFM_KPI.ipynb scores R/F/M with pd.qcut, which sorts the whole population in
+memory. Here every metric gets a KLL quantile sketch instead:
+- sketches are built per chunk or partition (in parallel processes) and merged
+- the quintile breakpoints are read from the merged sketch
+- users are scored against the breakpoints in one streaming pass
+
+Sketches and breakpoints are stored per snapshot in rfm_quantile_sketches, so
+an incremental snapshot can reuse yesterday's breakpoints as-is, or merge
+yesterday's sketch with the new rows instead of re-reading the population.
+"""
+import json
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from loguru import logger
+from sqlalchemy import select
+from Database.database import engine
+from Database.models import RfmQuantileSketch
+from helpers import save_results_bulk
+
+# metric column -> (score column, higher metric means lower score)
+RFM_METRICS = {
+    'rfm_recency': ('rfm_r_score', True),
+    'rfm_frequency': ('rfm_f_score', False),
+    'rfm_monetary': ('rfm_m_score', False),
+}
+
+QUINTILES = [0.2, 0.4, 0.6, 0.8]
+DEFAULT_K = 256
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang, Liberty 2016).
+
+    Keeps a hierarchy of compactors: level h holds items of weight 2**h. When a
+    level exceeds its capacity it is sorted and every other item (random
+    offset) is promoted to the next level. Capacities shrink geometrically
+    towards the lower levels, so the sketch stays O(k) items with rank error of
+    roughly 1.7 / k, and two sketches merge by concatenating levels.
+    """
+    C = 2 / 3
+    MIN_CAPACITY = 8
+
+    def __init__(self, k: int = DEFAULT_K, seed: int = 42):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, h: int) -> int:
+        depth = len(self.levels) - 1 - h
+        return max(self.MIN_CAPACITY, int(np.ceil(self.k * self.C ** depth)))
+
+    def _compress(self):
+        while any(len(level) > self._capacity(h) for h, level in enumerate(self.levels)):
+            for h in range(len(self.levels)):
+                if len(self.levels[h]) <= self._capacity(h):
+                    continue
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+
+                items = np.sort(self.levels[h])
+                keep = items[len(items) - len(items) % 2:]
+                items = items[:len(items) - len(items) % 2]
+                offset = int(self._rng.integers(2))
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], items[offset::2]])
+                self.levels[h] = keep
+
+    def update(self, values):
+        """Add a chunk of values (NaN values are ignored)."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.n += len(values)
+        self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch"):
+        """Fold another sketch into this one."""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, level in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], level])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantiles(self, qs) -> np.ndarray:
+        """Approximate values at the given quantiles (0-1)."""
+        items = np.concatenate(self.levels)
+        if len(items) == 0:
+            return np.full(len(qs), np.nan)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+
+        order = np.argsort(items, kind='stable')
+        items, cumulative = items[order], np.cumsum(weights[order])
+        idx = np.searchsorted(cumulative, np.asarray(qs) * cumulative[-1], side='left')
+        return items[np.minimum(idx, len(items) - 1)]
+
+    def rank_bounds(self, value: float):
+        """
+        Approximate fractions of the values below value and at or below it,
+        on the same weighted items quantiles() reads.
+        """
+        items = np.concatenate(self.levels)
+        if len(items) == 0:
+            return np.nan, np.nan
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        total = weights.sum()
+        return weights[items < value].sum() / total, weights[items <= value].sum() / total
+
+    def to_json(self) -> str:
+        return json.dumps({'k': self.k, 'n': self.n, 'levels': [level.tolist() for level in self.levels]})
+
+    @classmethod
+    def from_json(cls, payload: str) -> "KLLSketch":
+        data = json.loads(payload)
+        sketch = cls(k=data['k'])
+        sketch.n = data['n']
+        sketch.levels = [np.asarray(level, dtype=np.float64) for level in data['levels']]
+        return sketch
+
+
+def sketch_chunk(df: pd.DataFrame, k: int = DEFAULT_K, seed: int = 42) -> dict:
+    """
+    Build one sketch per RFM metric over a chunk of users.
+    """
+    return {metric: KLLSketch(k, seed).update(df[metric].to_numpy()) for metric in RFM_METRICS}
+
+
+def merge_sketches(sketch_sets) -> dict:
+    """
+    Merge an iterable of {metric: KLLSketch} dicts into one.
+    """
+    merged = None
+    for sketches in sketch_sets:
+        if merged is None:
+            merged = sketches
+        else:
+            for metric, sketch in sketches.items():
+                merged[metric].merge(sketch)
+    return merged
+
+
+def build_sketches(chunks, k: int = DEFAULT_K, n_jobs: int = None) -> dict:
+    """
+    Sketch every chunk (DataFrames with the RFM metric columns) in parallel
+    processes and merge the results.
+    """
+    chunks = list(chunks)
+    n_jobs = min(n_jobs or os.cpu_count() or 1, max(len(chunks), 1))
+
+    if n_jobs == 1:
+        sketch_sets = [sketch_chunk(chunk, k, seed) for seed, chunk in enumerate(chunks)]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            sketch_sets = list(pool.map(sketch_chunk, chunks, [k] * len(chunks), range(len(chunks))))
+
+    sketches = merge_sketches(sketch_sets)
+    logger.info(f"[build_sketches] Sketched {sketches['rfm_recency'].n:,} users from {len(chunks)} chunks")
+    return sketches
+
+
+def breakpoints_from_sketches(sketches: dict) -> dict:
+    """
+    Quintile breakpoints (20/40/60/80%) per RFM metric.
+    """
+    return {metric: sketch.quantiles(QUINTILES).tolist() for metric, sketch in sketches.items()}
+
+
+def _stable_unit(user_keys: np.ndarray, salt: int) -> np.ndarray:
+    """
+    Deterministic pseudo-random position in [0, 1) per user (splitmix64 of
+    user_key and salt), independent of row order and chunking.
+    """
+    x = user_keys.astype(np.uint64) + np.uint64(salt * 0x9E3779B97F4A7C15 % 2 ** 64)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x = x ^ (x >> np.uint64(31))
+    return (x >> np.uint64(11)).astype(np.float64) / 2.0 ** 53
+
+
+def _quintile_bins(values: np.ndarray, user_keys: np.ndarray, breakpoints, sketch: KLLSketch,
+                   salt: int) -> np.ndarray:
+    """
+    Quintile (1-5) of each value against the breakpoints, right-closed like pd.qcut.
+
+    A breakpoint value whose mass fills several quintiles on its own (it is
+    several breakpoints, or a breakpoint and the smallest / largest value,
+    where RFM_KPI.ipynb fell back to rank-based scoring) has its users split
+    across those quintiles: each is placed at a stable per-user position
+    inside the value's global rank range from the sketch, so the quintiles
+    stay populated and a user's score does not depend on the chunk or the
+    row order.
+    """
+    bins = np.searchsorted(np.asarray(breakpoints, dtype=float), values, side='left') + 1
+
+    for tied_value in np.unique(breakpoints):
+        tied = values == tied_value
+        if not tied.any():
+            continue
+        below, upto = sketch.rank_bounds(tied_value)
+        edges = sum(below < q <= upto for q in QUINTILES) + (below == 0) + (upto == 1)
+        if edges < 2:
+            continue
+        position = below + _stable_unit(user_keys[tied], salt) * (upto - below)
+        bins[tied] = np.searchsorted(QUINTILES, position, side='left') + 1
+    return bins
+
+
+def score_rfm(df: pd.DataFrame, sketches: dict, breakpoints: dict = None) -> pd.DataFrame:
+    """
+    Assign rfm_r_score, rfm_f_score, rfm_m_score (1-5) and rfm_segment
+    against the breakpoints of sketches (or the given stored breakpoints,
+    read from the same sketches). Bins are right-closed like pd.qcut, and
+    recency is reversed (lower recency gets 5). Users on a tied breakpoint
+    (discrete metrics such as plan-price totals) are split across the tied
+    quintiles like the notebook's rank-based fallback, by user_key rather
+    than row order.
+
+    Works chunk by chunk, so the population never has to be sorted or held
+    in memory at once.
+    """
+    if breakpoints is None:
+        breakpoints = breakpoints_from_sketches(sketches)
+
+    scored = df.copy()
+    user_keys = scored['user_key'].to_numpy()
+    for salt, (metric, (score_column, reverse)) in enumerate(RFM_METRICS.items()):
+        bins = _quintile_bins(scored[metric].to_numpy(dtype=float), user_keys, breakpoints[metric],
+                              sketches[metric], salt)
+        scored[score_column] = 6 - bins if reverse else bins
+
+    scored['rfm_segment'] = (
+        scored['rfm_r_score'].astype(str) +
+        scored['rfm_f_score'].astype(str) +
+        scored['rfm_m_score'].astype(str)
+    )
+    return scored
+
+
+def assign_segment_labels(df: pd.DataFrame) -> pd.Series:
+    """
+    Education-focused segment labels from the R/F/M scores (same rules and
+    order as assign_segment_labels in RFM_KPI.ipynb), vectorized.
+    """
+    r, f, m = df['rfm_r_score'], df['rfm_f_score'], df['rfm_m_score']
+    conditions = [
+        (r >= 4) & (f >= 4) & (m >= 4),
+        (r >= 4) & (f >= 3) & (m >= 3),
+        (r >= 4) & (f <= 2) & (m <= 2),
+        (f >= 4) & (m >= 4) & (r >= 2),
+        (r >= 3) & (f >= 2) & (m >= 2),
+        (f >= 3) & (r <= 2),
+        (m >= 4) & (r <= 2),
+        (r >= 2) & (f <= 2) & (m <= 2),
+        (r <= 2) & (f <= 2),
+    ]
+    labels = [
+        'Active High-Value Learners',
+        'Engaged Subscribers',
+        'New Premium Users',
+        'Loyal Long-Term',
+        'Promising Starters',
+        'Declining Engagement',
+        'High-Value at Risk',
+        'Casual Users',
+        'Dormant Premium',
+    ]
+    return pd.Series(np.select(conditions, labels, 'Recently Churned'), index=df.index)
+
+
+ENGAGEMENT_LEVELS = {
+    'Active High-Value Learners': 'Highly Engaged',
+    'Engaged Subscribers': 'Highly Engaged',
+    'Loyal Long-Term': 'Highly Engaged',
+    'Promising Starters': 'Medium Engaged',
+    'New Premium Users': 'Medium Engaged',
+    'Casual Users': 'Medium Engaged',
+    'Declining Engagement': 'At Risk',
+    'High-Value at Risk': 'At Risk',
+    'Dormant Premium': 'Dormant',
+    'Recently Churned': 'Dormant',
+}
+
+
+def assign_engagement_level(segment_labels: pd.Series) -> pd.Series:
+    """
+    Frontend engagement level of each segment label ('Unknown' if unmapped).
+    """
+    return segment_labels.map(ENGAGEMENT_LEVELS).fillna('Unknown')
+
+
+def save_sketches(sketches: dict, snapshot_date_key: int) -> int:
+    """
+    Store each metric's sketch and breakpoints for a snapshot.
+    """
+    breakpoints = breakpoints_from_sketches(sketches)
+    sketches_df = pd.DataFrame([{
+        'snapshot_date_key': snapshot_date_key,
+        'metric': metric,
+        'sample_count': sketch.n,
+        'breakpoints': json.dumps(breakpoints[metric]),
+        'sketch': sketch.to_json(),
+    } for metric, sketch in sketches.items()])
+    return save_results_bulk(sketches_df, 'rfm_quantile_sketches')
+
+
+def load_sketches(snapshot_date_key: int = None):
+    """
+    Load the stored sketches of the latest snapshot at or before snapshot_date_key
+    (default: latest overall).
+
+    Returns:
+        (snapshot_date_key, {metric: KLLSketch}, {metric: breakpoints}),
+        or (None, {}, {}) if nothing has been stored yet.
+    """
+    table = RfmQuantileSketch
+    latest = select(table.snapshot_date_key).order_by(table.snapshot_date_key.desc()).limit(1)
+    if snapshot_date_key is not None:
+        latest = latest.where(table.snapshot_date_key <= snapshot_date_key)
+
+    with engine.connect() as conn:
+        found_key = conn.execute(latest).scalar()
+        if found_key is None:
+            return None, {}, {}
+        rows = conn.execute(
+            select(table.metric, table.breakpoints, table.sketch).where(table.snapshot_date_key == found_key)
+        ).all()
+
+    sketches = {row.metric: KLLSketch.from_json(row.sketch) for row in rows}
+    breakpoints = {row.metric: json.loads(row.breakpoints) for row in rows}
+    return found_key, sketches, breakpoints
+
+
+def calculate_rfm_scores(
+    rfm_df: pd.DataFrame,
+    snapshot_date_key: int,
+    chunk_size: int = 100000,
+    reuse_breakpoints: bool = False,
+    n_jobs: int = None,
+):
+    """
+    Score a snapshot's raw RFM metrics against sketch breakpoints.
+
+    Args:
+        rfm_df: One row per user with rfm_recency, rfm_frequency, rfm_monetary.
+        snapshot_date_key: Snapshot being scored.
+        chunk_size: Users per sketch partition / scoring chunk.
+        reuse_breakpoints: Score with the latest stored breakpoints before this
+            snapshot instead of sketching the new population (falls back to
+            sketching when none are stored).
+        n_jobs: Worker processes for sketching (default: all cores).
+
+    Returns:
+        (rfm_scored, sketches). sketches is None when stored breakpoints were
+        reused; otherwise pass it to save_sketches once the snapshot is saved.
+    """
+    if rfm_df.empty:
+        logger.warning(f"[calculate_rfm_scores] No users to score for snapshot {snapshot_date_key}")
+        return rfm_df, None
+
+    chunks = [rfm_df.iloc[i:i + chunk_size] for i in range(0, len(rfm_df), chunk_size)]
+
+    sketches, breakpoints = None, {}
+    if reuse_breakpoints:
+        found_key, scoring_sketches, breakpoints = load_sketches(snapshot_date_key - 1)
+        if breakpoints:
+            logger.info(f"[calculate_rfm_scores] Reusing breakpoints of snapshot {found_key}")
+    if not breakpoints:
+        sketches = scoring_sketches = build_sketches(chunks, n_jobs=n_jobs)
+        breakpoints = breakpoints_from_sketches(sketches)
+
+    for metric, values in breakpoints.items():
+        logger.info(f"[calculate_rfm_scores] {metric} breakpoints: {[round(v, 2) for v in values]}")
+
+    rfm_scored = pd.concat([score_rfm(chunk, scoring_sketches, breakpoints) for chunk in chunks])
+    logger.info(f"[calculate_rfm_scores] Scored {len(rfm_scored):,} users for snapshot {snapshot_date_key}")
+    return rfm_scored, sketches
@@ -0,0 +1,113 @@
+"""
+Churn-risk histogram, materialized for the high-risk summary.
+
+/high-risk/summary counts snapshot rows with churn_probability >= a slider
+threshold (optionally for one plan tier), split into all snapshots and the
+last 7 snapshot dates. risk_histogram holds those rows pre-counted per
+(snapshot_date_key, subscription_plan_key, churn_bucket), where churn_bucket
+k is the largest integer with churn_probability >= k / RISK_HISTOGRAM_BUCKETS.
+For any threshold on that grid, "churn_probability >= threshold" is exactly
+"churn_bucket >= threshold * RISK_HISTOGRAM_BUCKETS", so the API sums at most
+plans x buckets rows per snapshot instead of scanning the fact table.
+
+Rows are rebuilt per snapshot inside the transaction that writes
+churn_probability or the plan key (helpers.publish_risk_histogram), once per
+snapshot: batched scoring writes its batches unpublished and refreshes the
+histogram after the last one (helpers.publish_snapshot_columns). Run this
+module once to build the histogram for snapshots stored before it existed.
+
+Usage (from ds/):
+    python risk_histogram.py
+"""
+from datetime import datetime, timezone
+from loguru import logger
+from sqlalchemy import select, func, case, cast, literal, Float, Integer
+from Database.database import engine
+from Database.models import DimSubscriptionPlan, FactUserAnalyticsSnapshot, RiskHistogram
+
+RISK_HISTOGRAM_TABLE = RiskHistogram.__tablename__
+
+# Must match RISK_HISTOGRAM_BUCKETS in api/main.py
+RISK_HISTOGRAM_BUCKETS = 100
+
+# Snapshot columns the histogram is built from; updating any of them triggers a refresh
+SOURCE_COLUMNS = ['churn_probability', 'subscription_plan_key']
+
+
+def churn_bucket_expr(probability):
+    """
+    Largest k with probability >= k / RISK_HISTOGRAM_BUCKETS, NULL for NULL.
+
+    The truncated (SQLite) or rounded (PostgreSQL) product is corrected by one
+    step either way, comparing against the same float k / RISK_HISTOGRAM_BUCKETS
+    the API compares thresholds with.
+    """
+    approx = cast(probability * RISK_HISTOGRAM_BUCKETS, Integer)
+    return case(
+        (probability < cast(approx, Float) / RISK_HISTOGRAM_BUCKETS, approx - 1),
+        (probability >= cast(approx + 1, Float) / RISK_HISTOGRAM_BUCKETS, approx + 1),
+        else_=approx,
+    )
+
+
+def risk_histogram_select(snapshot_date_keys: list = None):
+    """
+    SELECT producing the risk_histogram rows, for the given snapshots (all when None).
+    """
+    snap = FactUserAnalyticsSnapshot
+    # Buckets are computed in a subquery so GROUP BY only references plain columns
+    bucketed = (
+        select(
+            snap.snapshot_date_key,
+            DimSubscriptionPlan.subscription_plan_key,
+            churn_bucket_expr(snap.churn_probability).label("churn_bucket"),
+        )
+        .select_from(snap)
+        .join(DimSubscriptionPlan, DimSubscriptionPlan.subscription_plan_key == snap.subscription_plan_key,
+              isouter=True)
+        .where(snap.snapshot_date_key.isnot(None))
+    )
+    if snapshot_date_keys is not None:
+        bucketed = bucketed.where(snap.snapshot_date_key.in_([int(k) for k in snapshot_date_keys]))
+    b = bucketed.subquery().c
+
+    return (
+        select(
+            b.snapshot_date_key,
+            b.subscription_plan_key,
+            b.churn_bucket,
+            func.count().label("learner_count"),
+            literal(datetime.now(timezone.utc)).label("refreshed_at"),
+        )
+        .group_by(b.snapshot_date_key, b.subscription_plan_key, b.churn_bucket)
+    )
+
+
+def refresh_risk_histogram(conn=None, snapshot_date_keys: list = None) -> int:
+    """
+    Rebuild the histogram rows of the given snapshots (all when None) in one
+    transaction (the caller's when conn is given).
+
+    Returns:
+        Number of histogram rows written.
+    """
+    if conn is None:
+        with engine.begin() as conn:
+            return refresh_risk_histogram(conn, snapshot_date_keys)
+
+    table = RiskHistogram.__table__
+    delete_stmt = table.delete()
+    if snapshot_date_keys is not None:
+        delete_stmt = delete_stmt.where(table.c.snapshot_date_key.in_([int(k) for k in snapshot_date_keys]))
+    conn.execute(delete_stmt)
+
+    query = risk_histogram_select(snapshot_date_keys)
+    written = conn.execute(table.insert().from_select([c.name for c in query.selected_columns], query)).rowcount
+
+    scope = "all snapshots" if snapshot_date_keys is None else f"snapshot(s) {sorted(int(k) for k in snapshot_date_keys)}"
+    logger.info(f"[refresh_risk_histogram] Wrote {written} {RISK_HISTOGRAM_TABLE} rows for {scope}")
+    return written
+
+
+if __name__ == "__main__":
+    refresh_risk_histogram()
@@ -0,0 +1,277 @@
+"""
+K-Means segmentation of the analytics snapshot (free + premium users).
+
+Same features, scaling and business labels as kmeans.ipynb, made to scale past
+~100k users:
+- MiniBatchKMeans mode (default) instead of full-batch KMeans(n_init=10)
+- silhouette and Davies-Bouldin computed on a stratified sample, since the exact
+  silhouette is O(n^2) in the number of users
+- the k sweep runs one k per worker process
+- inputs and the scaled matrix are kept in the memory-mapped feature cache, so
+  reruns skip the database and sweep workers map one shared copy of X instead
+  of each unpickling their own
+
+Final labels are written to kmeans_cluster and kmeans_segment_label.
+"""
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from loguru import logger
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score, davies_bouldin_score
+from sklearn.preprocessing import StandardScaler
+from sqlalchemy import select
+from threadpoolctl import threadpool_limits
+from Database.database import engine
+from Database.models import FactUserAnalyticsSnapshot
+from feature_cache import write_feature_matrix, open_feature_matrix, feature_frame
+from helpers import update_snapshot_columns, stratified_sample_index
+from profiling import profiled
+
+CLUSTERING_FEATURES = [
+    'rfm_recency',
+    'rfm_frequency',
+    'rfm_monetary',
+    'churn_probability',
+    'is_free_tier',
+    'is_premium_tier'
+]
+
+K_RANGE = range(2, 11)
+RECOMMENDED_K = 5
+
+DEFAULT_MODE = "minibatch"
+DEFAULT_BATCH_SIZE = 4096
+DEFAULT_METRIC_SAMPLE_SIZE = 20000
+
+FEATURE_CACHE_NAME = "segmentation_features"
+SCALED_CACHE_NAME = "segmentation_scaled"
+# Snapshot columns the cached inputs are derived from
+FEATURE_CACHE_SOURCES = ['subscription_plan_key', 'rfm_recency', 'rfm_frequency', 'rfm_monetary', 'churn_probability']
+
+# Worker-process state for the k sweep, set once per process by _init_sweep_worker
+_SWEEP_X = None
+_SWEEP_SAMPLE_IDX = None
+_SWEEP_THREAD_LIMIT = None
+
+
+def load_segmentation_inputs(snapshot_date_key: int, use_cache: bool = False) -> pd.DataFrame:
+    """
+    Load every user of one snapshot with the clustering inputs and tier flags.
+
+    With use_cache the inputs are read from (or written to) the snapshot's
+    memory-mapped feature matrix.
+    """
+    cache_columns = ['subscription_plan_key'] + CLUSTERING_FEATURES
+    if use_cache:
+        cached = open_feature_matrix(FEATURE_CACHE_NAME, snapshot_date_key)
+        if cached is not None:
+            user_keys, X, info = cached
+            df = feature_frame(user_keys, X, info['columns'])
+            df['is_standard_tier'] = (df['subscription_plan_key'].isin([2, 3])).astype(int)
+            logger.info(f"[load_segmentation_inputs] Loaded {len(df):,} users for snapshot {snapshot_date_key} from cache")
+            return df
+
+    snap = FactUserAnalyticsSnapshot
+    query = select(
+        snap.user_key,
+        snap.subscription_plan_key,
+        snap.rfm_recency,
+        snap.rfm_frequency,
+        snap.rfm_monetary,
+        snap.churn_probability,
+    ).where(snap.snapshot_date_key == snapshot_date_key)
+
+    with engine.connect() as conn:
+        df = pd.read_sql(query, conn)
+
+    df['churn_probability'] = df['churn_probability'].fillna(0.0)
+    df['is_free_tier'] = (df['subscription_plan_key'] == 1).astype(int)
+    df['is_premium_tier'] = (df['subscription_plan_key'].isin([4, 5])).astype(int)
+    df['is_standard_tier'] = (df['subscription_plan_key'].isin([2, 3])).astype(int)
+
+    logger.info(f"[load_segmentation_inputs] Loaded {len(df):,} users for snapshot {snapshot_date_key}")
+    if use_cache and not df.empty:
+        write_feature_matrix(
+            FEATURE_CACHE_NAME, snapshot_date_key, df['user_key'].to_numpy(), df[cache_columns],
+            source_columns=FEATURE_CACHE_SOURCES
+        )
+    return df
+
+
+def prepare_features(df: pd.DataFrame) -> np.ndarray:
+    """
+    Standardize CLUSTERING_FEATURES (mean=0, std=1).
+    """
+    X = df[CLUSTERING_FEATURES].fillna(0)
+    return StandardScaler().fit_transform(X)
+
+
+def make_kmeans(k: int, mode: str = DEFAULT_MODE, seed: int = 42, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Build the clustering estimator: MiniBatchKMeans ("minibatch") or the
+    notebook's full-batch KMeans ("full").
+    """
+    if mode == "minibatch":
+        return MiniBatchKMeans(n_clusters=k, batch_size=batch_size, n_init=3, random_state=seed)
+    if mode == "full":
+        return KMeans(n_clusters=k, n_init=10, random_state=seed)
+    raise ValueError(f"Unknown K-Means mode '{mode}', expected 'minibatch' or 'full'")
+
+
+def _init_sweep_worker(X, sample_idx):
+    global _SWEEP_X, _SWEEP_SAMPLE_IDX, _SWEEP_THREAD_LIMIT
+    # A path is a cached matrix: map it instead of receiving a pickled copy
+    _SWEEP_X = np.load(X, mmap_mode='r') if isinstance(X, str) else X
+    _SWEEP_SAMPLE_IDX = sample_idx
+    # One process per k already uses the cores; avoid BLAS/OpenMP oversubscription
+    _SWEEP_THREAD_LIMIT = threadpool_limits(limits=1)
+
+
+def _evaluate_k(k, mode, seed, batch_size):
+    model = make_kmeans(k, mode=mode, seed=seed, batch_size=batch_size).fit(_SWEEP_X)
+    X_sample = _SWEEP_X[_SWEEP_SAMPLE_IDX]
+    labels_sample = model.labels_[_SWEEP_SAMPLE_IDX]
+
+    if len(np.unique(labels_sample)) > 1:
+        silhouette = silhouette_score(X_sample, labels_sample)
+        davies_bouldin = davies_bouldin_score(X_sample, labels_sample)
+    else:
+        silhouette, davies_bouldin = np.nan, np.nan
+
+    return {
+        'K': k,
+        'Inertia': model.inertia_,
+        'Silhouette_Score': silhouette,
+        'Davies_Bouldin_Score': davies_bouldin,
+    }
+
+
+def sweep_k(
+    X: np.ndarray,
+    strata: pd.Series,
+    k_range=K_RANGE,
+    mode: str = DEFAULT_MODE,
+    sample_size: int = DEFAULT_METRIC_SAMPLE_SIZE,
+    n_jobs: int = None,
+    seed: int = 42,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> pd.DataFrame:
+    """
+    Fit one model per k in parallel processes and score it on a stratified sample.
+
+    Args:
+        X: Scaled feature matrix (all users); a memory-mapped matrix is shared
+            with the workers by path.
+        strata: Per-row stratum used for the metric sample (e.g. subscription_plan_key).
+        k_range: Cluster counts to test.
+        mode: "minibatch" or "full".
+        sample_size: Rows used for silhouette / Davies-Bouldin.
+        n_jobs: Worker processes (default: all cores).
+
+    Returns:
+        DataFrame with K, Inertia, Silhouette_Score and Davies_Bouldin_Score per k.
+    """
+    sample_idx = stratified_sample_index(strata, sample_size, seed)
+    k_values = list(k_range)
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(k_values))
+
+    logger.info(f"[sweep_k] Testing K={k_values[0]}..{k_values[-1]} ({mode}) on {len(X):,} users, "
+                f"metrics on {len(sample_idx):,} sampled users, {n_jobs} processes")
+
+    X_arg = X.filename if isinstance(X, np.memmap) and X.filename else X
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_sweep_worker,
+                             initargs=(X_arg, sample_idx)) as pool:
+        futures = [pool.submit(_evaluate_k, k, mode, seed, batch_size) for k in k_values]
+        results = [f.result() for f in futures]
+
+    results_df = pd.DataFrame(results)
+    for row in results_df.itertuples():
+        logger.info(f"[sweep_k] K={row.K}: Inertia={row.Inertia:.2f}, "
+                    f"Silhouette={row.Silhouette_Score:.3f}, DB={row.Davies_Bouldin_Score:.3f}")
+    return results_df
+
+
+def assign_cluster_labels(df: pd.DataFrame) -> pd.Series:
+    """
+    Business labels for free vs premium users (same rules as kmeans.ipynb), vectorized.
+    """
+    recency = df['rfm_recency']
+    frequency = df['rfm_frequency']
+    monetary = df['rfm_monetary']
+    churn_prob = df['churn_probability']
+    is_free = df['is_free_tier'] == 1
+
+    conditions = [
+        is_free & (recency < 15) & (frequency > 50),
+        is_free & (recency < 30) & (frequency > 20),
+        is_free & ((recency > 60) | (frequency < 5)),
+        is_free,
+        (recency < 15) & (frequency > 100) & (monetary > 200) & (churn_prob < 0.3),
+        (recency < 30) & (frequency > 50) & (monetary > 100) & (churn_prob < 0.5),
+        (recency < 30) & (churn_prob < 0.5),
+        (churn_prob > 0.6) | (recency > 60),
+    ]
+    labels = [
+        'Active Free Users (High Conversion Potential)',
+        'Engaged Free Users',
+        'Dormant Free Users',
+        'Casual Free Users',
+        'Champions (Premium)',
+        'Loyal Customers (Premium)',
+        'Promising Premium Users',
+        'At Risk Premium (Retention Focus)',
+    ]
+    return pd.Series(np.select(conditions, labels, 'Standard Premium Users'), index=df.index)
+
+
+@profiled()
+def segment_to_snapshot(
+    snapshot_date_key: int = None,
+    k: int = RECOMMENDED_K,
+    mode: str = DEFAULT_MODE,
+    run_sweep: bool = False,
+    sample_size: int = DEFAULT_METRIC_SAMPLE_SIZE,
+    n_jobs: int = None,
+    use_cache: bool = True,
+):
+    """
+    Cluster one snapshot and write kmeans_cluster and kmeans_segment_label.
+
+    With run_sweep=True the k sweep is run first and its metrics are logged;
+    the business segmentation still uses k (RECOMMENDED_K by default).
+    With use_cache the inputs come from the feature cache and the sweep
+    workers share the scaled matrix through a memory-mapped file.
+    """
+    if snapshot_date_key is None:
+        snapshot_date_key = int(datetime.now().strftime("%Y%m%d"))
+
+    df = load_segmentation_inputs(snapshot_date_key, use_cache=use_cache)
+    if df.empty:
+        logger.warning(f"[segment_to_snapshot] No users in snapshot {snapshot_date_key}, nothing to do")
+        return df
+
+    X_scaled = prepare_features(df)
+    if run_sweep and use_cache:
+        write_feature_matrix(
+            SCALED_CACHE_NAME, snapshot_date_key, df['user_key'].to_numpy(), X_scaled,
+            columns=CLUSTERING_FEATURES, source_columns=FEATURE_CACHE_SOURCES
+        )
+        X_scaled = open_feature_matrix(SCALED_CACHE_NAME, snapshot_date_key)[1]
+    if run_sweep:
+        sweep_k(X_scaled, df['subscription_plan_key'], mode=mode, sample_size=sample_size, n_jobs=n_jobs)
+
+    model = make_kmeans(k, mode=mode).fit(X_scaled)
+    df['kmeans_cluster'] = model.labels_
+    df['kmeans_segment_label'] = assign_cluster_labels(df)
+    logger.info(f"[segment_to_snapshot] K={k} ({mode}) inertia {model.inertia_:.2f}")
+
+    update_snapshot_columns(df, snapshot_date_key, ['kmeans_cluster', 'kmeans_segment_label'])
+    logger.info("[segment_to_snapshot] K-Means segments saved to database.")
+    return df
+
+
+if __name__ == "__main__":
+    segment_to_snapshot(run_sweep=True)
@@ -0,0 +1,215 @@
+"""
+Survival stage: Kaplan-Meier curves per engagement level and Cox-based
+per-user survival metrics.
+
+Same inputs and churn-event definition as survival_analysis.ipynb, with:
+- the per-segment Kaplan-Meier fits run in parallel processes and stored as
+  compact step functions (segment, t, S(t)) in survival_curves, which the API's
+  /models/survival-curve endpoint reads directly
+- the Cox model fitted on a stratified sample once the population exceeds
+  cox_sample_size, then applied to every user in closed form
+  (S(t | x) = S0(t) ** partial_hazard(x)) instead of materializing one
+  survival function per user
+"""
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from lifelines import KaplanMeierFitter, CoxPHFitter
+from loguru import logger
+from sqlalchemy import select
+from Database.database import engine
+from Database.models import FactUserAnalyticsSnapshot, DimUser
+from helpers import save_results_bulk, update_snapshot_columns, stratified_sample_index
+from profiling import profiled
+
+OVERALL_SEGMENT = "All Users"
+SEGMENT_COLUMN = "engagement_level"
+
+COX_FEATURES = [
+    'rfm_frequency',
+    'rfm_monetary',
+    'churn_probability'
+]
+
+DEFAULT_COX_SAMPLE_SIZE = 50000
+RISK_HORIZON_DAYS = 90
+
+
+def load_survival_inputs(snapshot_date_key: int) -> pd.DataFrame:
+    """
+    Load premium users (plans 2-5) of one snapshot with signup dates and derive
+    duration (days since signup) and the churn event.
+    """
+    snap = FactUserAnalyticsSnapshot
+    query = select(
+        snap.user_key,
+        snap.subscription_plan_key,
+        snap.rfm_recency,
+        snap.rfm_frequency,
+        snap.rfm_monetary,
+        snap.segment_label,
+        snap.engagement_level,
+        snap.churn_probability,
+        DimUser.signup_date_key,
+    ).join(
+        DimUser, snap.user_key == DimUser.user_key
+    ).where(
+        snap.snapshot_date_key == snapshot_date_key,
+        snap.subscription_plan_key.in_([2, 3, 4, 5]),
+    )
+    with engine.connect() as conn:
+        df = pd.read_sql(query, conn)
+
+    signup_date = pd.to_datetime(df['signup_date_key'].astype(str), format='%Y%m%d')
+    snapshot_date = pd.to_datetime(str(snapshot_date_key), format='%Y%m%d')
+    df['duration'] = (snapshot_date - signup_date).dt.days
+    df['event'] = define_churn_event(df)
+    df = df[df['duration'] > 0].reset_index(drop=True)
+
+    logger.info(f"[load_survival_inputs] Loaded {len(df):,} premium users for snapshot {snapshot_date_key} "
+                f"({df['event'].sum():,} churn events)")
+    return df
+
+
+def define_churn_event(df: pd.DataFrame) -> pd.Series:
+    """
+    Churn event (1) when the user is inactive (recency > 60), has a high predicted
+    churn probability (> 0.7), never really engaged (frequency < 7) or sits in an
+    explicitly churned segment.
+    """
+    event = (
+        (df['rfm_recency'] > 60)
+        | (df['churn_probability'] > 0.7)
+        | (df['rfm_frequency'] < 7)
+        | df['segment_label'].isin(['Recently Churned', 'Dormant Premium'])
+    )
+    return event.astype(int)
+
+
+def _fit_km_curve(segment: str, durations: np.ndarray, events: np.ndarray) -> pd.DataFrame:
+    """
+    Fit one Kaplan-Meier curve and keep only the points where S(t) changes.
+    """
+    kmf = KaplanMeierFitter()
+    kmf.fit(durations=durations, event_observed=events, label=segment)
+
+    sf = kmf.survival_function_.iloc[:, 0]
+    sf = sf[sf.ne(sf.shift())]
+    return pd.DataFrame({
+        'segment': segment,
+        't': sf.index.to_numpy().round().astype(int),
+        'survival_prob': sf.to_numpy(),
+    })
+
+
+def fit_km_curves(df: pd.DataFrame, segment_column: str = SEGMENT_COLUMN, n_jobs: int = None) -> pd.DataFrame:
+    """
+    Fit the overall curve and one curve per segment in parallel processes.
+
+    Returns:
+        DataFrame with segment, t and survival_prob (the stored step function).
+    """
+    groups = [(OVERALL_SEGMENT, df)] + [
+        (segment, segment_df) for segment, segment_df in df.groupby(segment_column) if len(segment_df) > 0
+    ]
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(groups))
+
+    logger.info(f"[fit_km_curves] Fitting {len(groups)} Kaplan-Meier curves on {n_jobs} processes")
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        futures = [
+            pool.submit(_fit_km_curve, str(segment), g['duration'].to_numpy(), g['event'].to_numpy())
+            for segment, g in groups
+        ]
+        curves = [f.result() for f in futures]
+
+    curves_df = pd.concat(curves, ignore_index=True)
+    logger.info(f"[fit_km_curves] Stored {len(curves_df):,} curve points for {len(curves)} segments")
+    return curves_df
+
+
+def fit_cox(df: pd.DataFrame, sample_size: int = DEFAULT_COX_SAMPLE_SIZE, seed: int = 42) -> CoxPHFitter:
+    """
+    Fit the Cox proportional hazards model on COX_FEATURES.
+
+    Above sample_size users the model is fitted on a sample stratified by
+    engagement level and event, which keeps the event rate of every segment.
+    """
+    cox_df = df[['duration', 'event', SEGMENT_COLUMN] + COX_FEATURES].dropna(subset=COX_FEATURES)
+    strata = cox_df[SEGMENT_COLUMN].astype(str) + '|' + cox_df['event'].astype(str)
+    cox_df = cox_df.iloc[stratified_sample_index(strata, sample_size, seed)]
+
+    cph = CoxPHFitter()
+    cph.fit(cox_df[['duration', 'event'] + COX_FEATURES], duration_col='duration', event_col='event')
+
+    logger.info(f"[fit_cox] Fitted Cox model on {len(cox_df):,} users, "
+                f"concordance {cph.concordance_index_:.4f}")
+    return cph
+
+
+def predict_survival_metrics(cph: CoxPHFitter, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Median time to downgrade and RISK_HORIZON_DAYS churn risk for every user.
+
+    Uses S(t | x) = S0(t) ** partial_hazard(x) on the baseline survival step
+    function, so no per-user survival curve is built. Users whose curve never
+    reaches 0.5 get the last observed time as median.
+    """
+    X = df[COX_FEATURES].fillna(df[COX_FEATURES].median())
+    partial_hazard = cph.predict_partial_hazard(X).to_numpy()
+
+    baseline = cph.baseline_survival_.iloc[:, 0]
+    times = baseline.index.to_numpy()
+    s0 = baseline.to_numpy()
+
+    # First t with S0(t) ** h <= 0.5  <=>  S0(t) <= 0.5 ** (1 / h); S0 is non-increasing
+    thresholds = 0.5 ** (1 / partial_hazard)
+    median_idx = np.searchsorted(-s0, -thresholds, side='left')
+    median_time = times[np.minimum(median_idx, len(times) - 1)]
+
+    horizon_idx = np.searchsorted(times, RISK_HORIZON_DAYS, side='right') - 1
+    s0_horizon = s0[horizon_idx] if horizon_idx >= 0 else 1.0
+    risk = 1 - s0_horizon ** partial_hazard
+
+    return pd.DataFrame({
+        'user_key': df['user_key'].to_numpy(),
+        'survival_median_time_to_downgrade': np.round(median_time).astype(int),
+        'survival_risk_90d': risk,
+    })
+
+
+@profiled()
+def survival_to_snapshot(
+    snapshot_date_key: int = None,
+    cox_sample_size: int = DEFAULT_COX_SAMPLE_SIZE,
+    n_jobs: int = None,
+):
+    """
+    Run the survival stage for one snapshot: store the Kaplan-Meier curves in
+    survival_curves and write survival_median_time_to_downgrade and
+    survival_risk_90d to the snapshot.
+    """
+    if snapshot_date_key is None:
+        snapshot_date_key = int(datetime.now().strftime("%Y%m%d"))
+
+    df = load_survival_inputs(snapshot_date_key)
+    if df.empty:
+        logger.warning(f"[survival_to_snapshot] No premium users in snapshot {snapshot_date_key}, nothing to do")
+        return df
+
+    curves_df = fit_km_curves(df, n_jobs=n_jobs)
+    save_results_bulk(curves_df, 'survival_curves', snapshot_date_key)
+
+    cph = fit_cox(df, sample_size=cox_sample_size)
+    metrics_df = predict_survival_metrics(cph, df)
+    update_snapshot_columns(
+        metrics_df, snapshot_date_key, ['survival_median_time_to_downgrade', 'survival_risk_90d']
+    )
+    logger.info("[survival_to_snapshot] Survival curves and metrics saved to database.")
+    return metrics_df
+
+
+if __name__ == "__main__":
+    survival_to_snapshot()
@@ -0,0 +1,30 @@
+"""
+Test setup for the DS modules.
+
+The modules import flat (from helpers import ...) from ds/ and bind their
+engine to DATABASE_URL at import time, so both are set here, before any test
+module is collected: every run gets a throwaway SQLite database.
+
+Usage (from ds/):
+    python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+import pytest
+
+DS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DS_DIR)
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="edretain-ds-tests-"), "ds.db")
+
+from Database.database import Base, engine  # noqa: E402
+import Database.models  # noqa: E402,F401  (registers the tables on Base)
+
+
+@pytest.fixture
+def db():
+    """Engine over an empty schema, recreated for every test."""
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
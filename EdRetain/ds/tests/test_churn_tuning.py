@@ -0,0 +1,30 @@
+"""
+Tuning results of different estimators must not replace each other.
+"""
+from types import SimpleNamespace
+from churn_tuning import load_tuned_params, log_tuning_result
+
+METRICS = {"accuracy": 0.8, "precision": 0.7, "recall": 0.6, "f1_score": 0.65, "auc_roc": 0.85}
+
+
+def _log(estimator: str, params: dict, snapshot_date_key: int = 20251120, version: str = None) -> str:
+    search = SimpleNamespace(best_params_=params)
+    return log_tuning_result(search, METRICS, snapshot_date_key, estimator=estimator, model_version=version)
+
+
+def test_two_estimators_tuned_on_one_snapshot_are_both_loaded(db):
+    hgb_version = _log("hist_gradient_boosting", {"learning_rate": 0.05, "max_leaf_nodes": 31})
+    rf_version = _log("random_forest", {"n_estimators": 200, "max_depth": 8})
+
+    assert load_tuned_params("hist_gradient_boosting") == (hgb_version, {"learning_rate": 0.05, "max_leaf_nodes": 31})
+    assert load_tuned_params("random_forest") == (rf_version, {"n_estimators": 200, "max_depth": 8})
+
+
+def test_retuning_an_estimator_replaces_its_row_for_the_snapshot(db):
+    _log("hist_gradient_boosting", {"learning_rate": 0.05}, version="first")
+    _log("random_forest", {"n_estimators": 100}, version="rf")
+    _log("hist_gradient_boosting", {"learning_rate": 0.1}, version="second")
+
+    assert load_tuned_params("hist_gradient_boosting") == ("second", {"learning_rate": 0.1})
+    assert load_tuned_params("random_forest") == ("rf", {"n_estimators": 100})
+    assert load_tuned_params("logistic_regression") == (None, {})
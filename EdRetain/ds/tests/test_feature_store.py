@@ -0,0 +1,91 @@
+"""
+Daily deltas of the feature store must leave it equal to a rebuild for the same date.
+"""
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from feature_store import apply_daily_delta, get_watermark, load_churn_features, rebuild_feature_store, refresh_feature_store
+
+FIRST_DAY = date(2025, 1, 1)
+N_DAYS = 150
+
+
+def _date_key(day: int) -> int:
+    return int((FIRST_DAY + timedelta(days=day)).strftime("%Y%m%d"))
+
+
+def _insert_activity(db, rows: list):
+    pd.DataFrame(rows).to_sql("fact_user_daily_activity", db, if_exists="append", index=False)
+
+
+def _random_activity(seed: int = 7, n_users: int = 40) -> list:
+    """
+    Users with gaps, plan changes, NULL counters and activity that stops or
+    starts part-way through the period.
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    for user_key in range(1, n_users + 1):
+        first, last = sorted(rng.integers(0, N_DAYS, size=2))
+        plan = int(rng.integers(1, 4))
+        for day in range(first, last + 1):
+            if rng.random() < 0.4:
+                continue
+            if rng.random() < 0.05:
+                plan = int(rng.integers(1, 4))
+            rows.append({
+                "user_key": user_key,
+                "date_key": _date_key(day),
+                "subscription_plan_key": plan,
+                "logins_count": None if rng.random() < 0.05 else int(rng.integers(0, 5)),
+                "sessions_count": int(rng.integers(0, 5)),
+                "minutes_watched": int(rng.integers(0, 120)),
+                "lessons_completed": int(rng.integers(0, 3)),
+                "quizzes_attempted": int(rng.integers(0, 3)),
+                "active_days_last_30d": int(rng.integers(0, 30)),
+                "is_inactive_7d_flag": bool(rng.random() < 0.2),
+                "days_since_last_login": None if rng.random() < 0.05 else int(rng.integers(0, 10)),
+                "distinct_courses_accessed": int(rng.integers(0, 6)),
+                "active_courses_count": int(rng.integers(0, 4)),
+                "completed_courses_total": int(rng.integers(0, 10)),
+            })
+    return rows
+
+
+def _read_store(db) -> pd.DataFrame:
+    with db.connect() as conn:
+        store = pd.read_sql(text("SELECT * FROM user_feature_store ORDER BY user_key"), conn)
+    # The only column allowed to differ: deltas stamp just the rows they touched
+    return store.drop(columns="updated_through_date_key")
+
+
+def test_daily_deltas_match_rebuild(db):
+    _insert_activity(db, _random_activity())
+
+    rebuild_feature_store(_date_key(60))
+    refresh_feature_store(_date_key(N_DAYS - 1))
+    assert get_watermark() == _date_key(N_DAYS - 1)
+    incremental = _read_store(db)
+
+    rebuild_feature_store(_date_key(N_DAYS - 1))
+    pd.testing.assert_frame_equal(incremental, _read_store(db))
+
+
+def test_delta_expires_highest_plan_and_evicts_idle_users(db):
+    _insert_activity(db, [
+        # Downgraded on day 10, active until day 100
+        {"user_key": 1, "date_key": _date_key(0), "subscription_plan_key": 3, "logins_count": 1},
+        *({"user_key": 1, "date_key": _date_key(d), "subscription_plan_key": 1, "logins_count": 1}
+          for d in range(10, 101)),
+        # Only active on day 0
+        {"user_key": 2, "date_key": _date_key(0), "subscription_plan_key": 2, "logins_count": 1},
+    ])
+    rebuild_feature_store(_date_key(89))
+    assert load_churn_features().set_index("user_key")["has_downgraded"].to_dict() == {1: 1, 2: 0}
+
+    apply_daily_delta(_date_key(90))
+
+    features = load_churn_features().set_index("user_key")
+    assert list(features.index) == [1]
+    assert features.loc[1, "has_downgraded"] == 0
@@ -0,0 +1,62 @@
+"""
+RFM quintile scoring against sketch breakpoints, including tied breakpoints.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from rfm_scoring import breakpoints_from_sketches, score_rfm, sketch_chunk
+
+SCORES = ['rfm_r_score', 'rfm_f_score', 'rfm_m_score']
+
+
+@pytest.fixture
+def rfm_df():
+    rng = np.random.default_rng(3)
+    n = 1000
+    # Monetary is a handful of plan-price totals, 60% of users on one of them
+    monetary = np.where(rng.random(n) < 0.6, 584.92, rng.choice([0.0, 99.99, 1169.84, 1754.76], n))
+    return pd.DataFrame({
+        'user_key': rng.permutation(np.arange(10_000, 10_000 + n)),
+        'rfm_recency': rng.integers(0, 90, n),
+        'rfm_frequency': rng.integers(1, 40, n),
+        'rfm_monetary': monetary,
+    })
+
+
+def test_tied_breakpoints_keep_every_quintile_populated(rfm_df):
+    sketches = sketch_chunk(rfm_df)
+    assert len(set(breakpoints_from_sketches(sketches)['rfm_monetary'])) < 4
+
+    scored = score_rfm(rfm_df, sketches)
+
+    for column in SCORES:
+        counts = scored[column].value_counts()
+        assert sorted(counts.index) == [1, 2, 3, 4, 5]
+        assert counts.min() >= 150, (column, counts.to_dict())
+    # Higher monetary never scores lower
+    by_value = scored.sort_values('rfm_monetary')
+    assert (by_value.groupby('rfm_monetary')['rfm_m_score'].min().diff().dropna() >= 0).all()
+
+
+def test_scores_do_not_depend_on_chunks_or_row_order(rfm_df):
+    sketches = sketch_chunk(rfm_df)
+    whole = score_rfm(rfm_df, sketches).set_index('user_key')[SCORES]
+
+    shuffled = rfm_df.sample(frac=1, random_state=11)
+    chunked = pd.concat([score_rfm(shuffled.iloc[i:i + 137], sketches) for i in range(0, len(shuffled), 137)])
+
+    pd.testing.assert_frame_equal(chunked.set_index('user_key')[SCORES].loc[whole.index], whole)
+
+
+def test_untied_metrics_match_qcut():
+    rng = np.random.default_rng(5)
+    n = 2000
+    df = pd.DataFrame({'user_key': np.arange(n), 'rfm_recency': rng.normal(size=n),
+                       'rfm_frequency': rng.normal(size=n), 'rfm_monetary': rng.normal(size=n)})
+
+    scored = score_rfm(df, sketch_chunk(df, k=4096))
+
+    expected = pd.qcut(df['rfm_monetary'], 5, labels=[1, 2, 3, 4, 5]).astype(int)
+    assert (scored['rfm_m_score'] == expected).mean() > 0.99
+    expected_r = pd.qcut(df['rfm_recency'], 5, labels=[5, 4, 3, 2, 1]).astype(int)
+    assert (scored['rfm_r_score'] == expected_r).mean() > 0.99
@@ -0,0 +1,73 @@
+"""
+save_results_bulk on a non-PostgreSQL database (delete + one executemany insert).
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import text
+from helpers import save_results_bulk
+
+
+def _importance(model_type: str, scores: list, ranks: list = None) -> pd.DataFrame:
+    return pd.DataFrame({
+        "model_type": model_type,
+        "model_version": "v1",
+        "feature_name": [f"f{i}" for i in range(len(scores))],
+        "importance_score": scores,
+        "importance_rank": ranks if ranks is not None else list(range(1, len(scores) + 1)),
+    })
+
+
+def _read(db, table: str) -> pd.DataFrame:
+    with db.connect() as conn:
+        return pd.read_sql(text(f"SELECT * FROM {table}"), conn)
+
+
+def test_replaces_only_the_written_snapshot_and_model_type(db):
+    save_results_bulk(_importance("churn_prediction", [0.5, 0.3]), "feature_importance", 20250101)
+    save_results_bulk(_importance("clv", [0.9]), "feature_importance", 20250101)
+    save_results_bulk(_importance("churn_prediction", [0.7]), "feature_importance", 20250102)
+
+    written = save_results_bulk(_importance("churn_prediction", [0.6, 0.2, 0.1]), "feature_importance", 20250101)
+
+    assert written == 3
+    stored = _read(db, "feature_importance")
+    counts = stored.groupby(["snapshot_date_key", "model_type"]).size().to_dict()
+    assert counts == {(20250101, "churn_prediction"): 3, (20250101, "clv"): 1, (20250102, "churn_prediction"): 1}
+    replaced = stored[(stored.snapshot_date_key == 20250101) & (stored.model_type == "churn_prediction")]
+    assert sorted(replaced.importance_score) == [0.1, 0.2, 0.6]
+
+
+def test_writes_nan_as_null_and_keeps_integer_columns(db):
+    df = _importance("churn_prediction", [0.4, np.nan], ranks=[1.0, np.nan])
+    df["not_a_column"] = "ignored"
+
+    save_results_bulk(df, "feature_importance", 20250101)
+
+    with db.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT importance_score, importance_rank, typeof(importance_rank), created_at "
+            "FROM feature_importance ORDER BY feature_name"
+        )).all()
+    assert rows[0][:3] == (0.4, 1, "integer")
+    assert rows[1][:3] == (None, None, "null")
+    assert all(row[3] is not None for row in rows)
+
+
+def test_snapshot_key_is_taken_from_the_frame(db):
+    df = pd.DataFrame({"snapshot_date_key": [20250101, 20250101, 20250102], "segment": "All Users",
+                       "t": [0, 30, 0], "survival_prob": [1.0, 0.8, 1.0]})
+    save_results_bulk(df, "survival_curves")
+    save_results_bulk(df.iloc[[2]].assign(survival_prob=0.5), "survival_curves")
+
+    stored = _read(db, "survival_curves").sort_values(["snapshot_date_key", "t"])
+    assert stored[["snapshot_date_key", "t", "survival_prob"]].values.tolist() == [
+        [20250101, 0, 1.0], [20250101, 30, 0.8], [20250102, 0, 0.5],
+    ]
+
+
+def test_rejects_unknown_tables_and_missing_snapshot_key(db):
+    with pytest.raises(ValueError):
+        save_results_bulk(_importance("clv", [0.1]), "dim_user", 20250101)
+    with pytest.raises(ValueError):
+        save_results_bulk(_importance("clv", [0.1]), "feature_importance")
@@ -1,5 +1,5 @@
 from loguru import logger
-from sqlalchemy import Boolean, Date, create_engine, Column, Integer, String, Float, DATE, DateTime, ForeignKey
+from sqlalchemy import Boolean, Date, create_engine, Column, Integer, String, Float, DATE, DateTime, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime, timezone 
@@ -74,6 +74,10 @@ class DimChannel(Base):
 
 class FactUserDailyActivity(Base):
     __tablename__ = "fact_user_daily_activity"
+    __table_args__ = (
+        # Per-user latest activity (incremental latest_user_snapshot refresh)
+        Index("ix_fact_user_daily_activity_user_date", "user_key", "date_key"),
+    )
     fact_user_daily_activity_id = Column(Integer, primary_key=True, autoincrement=True)
     user_key = Column(Integer, ForeignKey("dim_user.user_key"))
     date_key = Column(Integer, ForeignKey("dim_date.date_key"))
@@ -112,6 +116,12 @@ class FactCampaignInteraction(Base):
 
 class FactUserAnalyticsSnapshot(Base):
     __tablename__ = "fact_user_analytics_snapshot"
+    __table_args__ = (
+        # High-risk summary: churn_probability range, counts split by snapshot_date_key
+        Index("ix_fact_user_analytics_snapshot_churn_probability_date", "churn_probability", "snapshot_date_key"),
+        # Per-user latest snapshot (incremental latest_user_snapshot refresh)
+        Index("ix_fact_user_analytics_snapshot_user_date", "user_key", "snapshot_date_key"),
+    )
     fact_user_analytics_snapshot_id = Column(Integer, primary_key=True, autoincrement=True)
     user_key = Column(Integer, ForeignKey("dim_user.user_key"))
     snapshot_date_key = Column(Integer, ForeignKey("dim_date.date_key"))
@@ -142,12 +152,13 @@ class FactUserAnalyticsSnapshot(Base):
     
     # CLV
     clv_value = Column(Float)
+    clv_p10 = Column(Float)
+    clv_p90 = Column(Float)
     clv_band = Column(String)
     
     # Metadata
     model_version = Column(String)
 
-<<<<<<< HEAD
 
 class FeatureImportance(Base):
     __tablename__ = "feature_importance"
@@ -263,10 +274,193 @@ class ModelPerformanceMetrics(Base):
     false_positives = Column(Integer, nullable=True)
     false_negatives = Column(Integer, nullable=True)
     true_positives = Column(Integer, nullable=True)
+
+    # Tuned hyperparameters (JSON), set by the tuning entry point
+    hyperparameters = Column(String, nullable=True)
     
     # Metadata
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
-=======
->>>>>>> main
+
+class UserFeatureStore(Base):
+    __tablename__ = "user_feature_store"
+    
+    user_key = Column(Integer, ForeignKey("dim_user.user_key"), primary_key=True)
+    updated_through_date_key = Column(Integer)
+    
+    # Rolling sums, maintained incrementally (add new day, subtract the day leaving the window)
+    logins_7d = Column(Integer, default=0)
+    logins_30d = Column(Integer, default=0)
+    logins_90d = Column(Integer, default=0)
+    
+    sessions_7d = Column(Integer, default=0)
+    sessions_30d = Column(Integer, default=0)
+    sessions_90d = Column(Integer, default=0)
+    
+    minutes_watched_7d = Column(Integer, default=0)
+    minutes_watched_30d = Column(Integer, default=0)
+    minutes_watched_90d = Column(Integer, default=0)
+    
+    lessons_completed_7d = Column(Integer, default=0)
+    lessons_completed_30d = Column(Integer, default=0)
+    lessons_completed_90d = Column(Integer, default=0)
+    
+    quizzes_attempted_7d = Column(Integer, default=0)
+    quizzes_attempted_30d = Column(Integer, default=0)
+    quizzes_attempted_90d = Column(Integer, default=0)
+    
+    active_days_sum_7d = Column(Integer, default=0)
+    active_days_sum_30d = Column(Integer, default=0)
+    active_days_sum_90d = Column(Integer, default=0)
+    
+    inactive_flag_days_7d = Column(Integer, default=0)
+    inactive_flag_days_30d = Column(Integer, default=0)
+    inactive_flag_days_90d = Column(Integer, default=0)
+    
+    activity_days_7d = Column(Integer, default=0)
+    activity_days_30d = Column(Integer, default=0)
+    activity_days_90d = Column(Integer, default=0)
+    
+    # Latest activity row (not windowed)
+    last_activity_date_key = Column(Integer)
+    days_since_last_login = Column(Integer)
+    distinct_courses_accessed = Column(Integer)
+    active_courses_count = Column(Integer)
+    completed_courses_total = Column(Integer)
+    subscription_plan_key = Column(Integer, ForeignKey("dim_subscription_plan.subscription_plan_key"))
+    max_subscription_plan_key = Column(Integer)  # Highest plan within the 90-day window
+
+
+class FeatureStoreState(Base):
+    __tablename__ = "feature_store_state"
+    
+    store_name = Column(String, primary_key=True)
+    through_date_key = Column(Integer)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class SurvivalCurve(Base):
+    __tablename__ = "survival_curves"
+    __table_args__ = (
+        Index("ix_survival_curves_snapshot_segment_t", "snapshot_date_key", "segment", "t"),
+    )
+    
+    survival_curve_id = Column(Integer, primary_key=True, autoincrement=True)
+    snapshot_date_key = Column(Integer, ForeignKey("dim_date.date_key"))
+    
+    # Kaplan-Meier step function: one row per time where S(t) changes
+    segment = Column(String)  # engagement_level, or 'All Users' for the overall curve
+    t = Column(Integer)  # days since signup
+    survival_prob = Column(Float)  # S(t)
+    
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class RfmQuantileSketch(Base):
+    __tablename__ = "rfm_quantile_sketches"
+    
+    rfm_quantile_sketch_id = Column(Integer, primary_key=True, autoincrement=True)
+    snapshot_date_key = Column(Integer, ForeignKey("dim_date.date_key"))
+    
+    metric = Column(String)  # rfm_recency, rfm_frequency, rfm_monetary
+    sample_count = Column(Integer)  # users summarized by the sketch
+    breakpoints = Column(String)  # JSON list of the 20/40/60/80% quintile values
+    sketch = Column(String)  # serialized KLL sketch (JSON), mergeable with later snapshots
+    
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+class PipelineRunStats(Base):
+    __tablename__ = "pipeline_run_stats"
+    __table_args__ = (
+        Index("ix_pipeline_run_stats_stage_started_at", "stage", "started_at"),
+    )
+    
+    pipeline_run_stats_id = Column(Integer, primary_key=True, autoincrement=True)
+    run_id = Column(String)  # groups the stages of one pipeline run
+    stage = Column(String)
+    snapshot_date_key = Column(Integer, nullable=True)
+    
+    started_at = Column(DateTime)
+    wall_seconds = Column(Float)
+    cpu_seconds = Column(Float)
+    peak_memory_mb = Column(Float, nullable=True)  # tracemalloc peak, when enabled
+    max_rss_mb = Column(Float, nullable=True)  # process high-water mark at stage end
+    rows_in = Column(Integer, nullable=True)
+    rows_out = Column(Integer, nullable=True)
+    status = Column(String)  # success / failed
+    error = Column(String, nullable=True)
+    
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+class LatestUserSnapshot(Base):
+    __tablename__ = "latest_user_snapshot"
+    __table_args__ = (
+        # (sort column, user_key) indexes back the keyset-paginated learner lists
+        Index("ix_latest_user_snapshot_churn_probability_user", "churn_probability", "user_key"),
+        Index("ix_latest_user_snapshot_clv_value_user", "clv_value", "user_key"),
+        Index("ix_latest_user_snapshot_rfm_score_user", "rfm_score", "user_key"),
+        Index("ix_latest_user_snapshot_days_since_login_user", "days_since_last_login", "user_key"),
+        Index("ix_latest_user_snapshot_tier_churn_probability", "tier", "churn_probability", "user_key"),
+        Index("ix_latest_user_snapshot_country", "country"),
+    )
+    
+    # One row per user: the user's latest analytics snapshot joined with the
+    # latest daily-activity row and plan tier (rebuilt by ds/latest_snapshot.py)
+    user_key = Column(Integer, ForeignKey("dim_user.user_key"), primary_key=True, autoincrement=False)
+    snapshot_date_key = Column(Integer)
+    user_id_nk = Column(String)
+    country = Column(String)
+    subscription_plan_key = Column(Integer, nullable=True)
+    tier = Column(String, nullable=True)
+    
+    rfm_r_score = Column(Integer)
+    rfm_f_score = Column(Integer)
+    rfm_m_score = Column(Integer)
+    rfm_score = Column(Integer)  # r + f + m, missing scores count as 0
+    rfm_segment = Column(String)
+    engagement_level = Column(String)
+    churn_probability = Column(Float)
+    clv_value = Column(Float)
+    
+    activity_date_key = Column(Integer, nullable=True)  # None when the user has no activity rows
+    days_since_last_login = Column(Integer, nullable=True)
+    
+    refreshed_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class RiskHistogram(Base):
+    __tablename__ = "risk_histogram"
+    __table_args__ = (
+        Index("ix_risk_histogram_bucket_snapshot", "churn_bucket", "snapshot_date_key"),
+    )
+    
+    # Learner counts per snapshot, plan and 0.01-wide churn_probability bucket
+    # (rebuilt by ds/risk_histogram.py), so the high-risk summary can be answered
+    # for slider thresholds on the 0.01 grid without scanning the snapshot fact table
+    risk_histogram_id = Column(Integer, primary_key=True, autoincrement=True)
+    snapshot_date_key = Column(Integer)
+    subscription_plan_key = Column(Integer, nullable=True)  # None when the snapshot's plan is unknown
+    churn_bucket = Column(Integer, nullable=True)  # k: k/100 <= churn_probability < (k+1)/100, None when unscored
+    learner_count = Column(Integer)
+    refreshed_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class CampaignSegmentMix(Base):
+    __tablename__ = "campaign_segment_mix"
+    __table_args__ = (
+        Index("ix_campaign_segment_mix_snapshot_campaign", "snapshot_date_key", "campaign_key"),
+    )
+    
+    # Engagement mix of each campaign's learners (written by the DS campaign stage),
+    # one row per (snapshot, campaign, engagement_level)
+    campaign_segment_mix_id = Column(Integer, primary_key=True, autoincrement=True)
+    snapshot_date_key = Column(Integer, ForeignKey("dim_date.date_key"))
+    campaign_key = Column(Integer, ForeignKey("dim_campaign.campaign_key"))
+    
+    engagement_level = Column(String, nullable=True)
+    learner_count = Column(Integer)
+    learner_pct = Column(Float)
+    is_dominant = Column(Boolean)  # the campaign's most common engagement_level
+    
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 #Base.metadata.create_all(engine)